@@ -0,0 +1 @@
+"""Auto-Moderation benchmarks"""
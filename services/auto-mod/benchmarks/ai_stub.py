@@ -0,0 +1,104 @@
+"""
+Local stand-in for the ai-personality chat endpoint
+
+Answers POST /api/v1/chat the way auto-mod expects ("SAFE" or
+"TOXIC: <reason>") after a configurable delay, so benchmarks never depend
+on a real model.
+
+Usage (from services/auto-mod):
+    python -m benchmarks.ai_stub [--port 8200] [--latency-ms 50]
+"""
+import argparse
+import asyncio
+import random
+import socket
+import threading
+import time
+from typing import Iterable
+
+import uvicorn
+from fastapi import FastAPI
+from pydantic import BaseModel
+
+TOXIC_MARKERS = ("idiot", "stupid", "trash", "kill")
+
+
+class ChatRequest(BaseModel):
+    message: str
+    platform: str = "moderation"
+
+
+def create_app(latency_ms: float = 50.0, jitter_ms: float = 10.0, markers: Iterable[str] = TOXIC_MARKERS) -> FastAPI:
+    app = FastAPI(title="ai-personality stub")
+    markers = tuple(m.lower() for m in markers)
+    app.state.requests = 0
+
+    @app.post("/api/v1/chat")
+    async def chat(request: ChatRequest):
+        app.state.requests += 1
+        delay = max(0.0, latency_ms + random.uniform(-jitter_ms, jitter_ms)) / 1000
+        await asyncio.sleep(delay)
+
+        # Only the quoted user message counts, not the moderation prompt
+        text = request.message.rsplit(": \"", 1)[-1].lower()
+        marker = next((m for m in markers if m in text), None)
+        return {"response": f"TOXIC: contains '{marker}'" if marker else "SAFE"}
+
+    @app.get("/health")
+    async def health():
+        return {"status": "ok", "requests": app.state.requests}
+
+    return app
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class StubServer:
+    """Run the stub on a background thread for the life of a benchmark"""
+
+    def __init__(self, port: int = 0, latency_ms: float = 50.0, jitter_ms: float = 10.0):
+        self.port = port or free_port()
+        self.app = create_app(latency_ms, jitter_ms)
+        self._server = uvicorn.Server(
+            uvicorn.Config(self.app, host="127.0.0.1", port=self.port, log_level="warning")
+        )
+        self._thread = threading.Thread(target=self._server.run, daemon=True)
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    @property
+    def requests(self) -> int:
+        return self.app.state.requests
+
+    def start(self, timeout: float = 10.0) -> "StubServer":
+        self._thread.start()
+        deadline = time.monotonic() + timeout
+        while not self._server.started:
+            if time.monotonic() > deadline:
+                raise RuntimeError("ai-personality stub did not start")
+            time.sleep(0.01)
+        return self
+
+    def stop(self):
+        self._server.should_exit = True
+        self._thread.join(timeout=5)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--port", type=int, default=8200)
+    parser.add_argument("--latency-ms", type=float, default=50.0)
+    parser.add_argument("--jitter-ms", type=float, default=10.0)
+    args = parser.parse_args()
+
+    uvicorn.run(create_app(args.latency_ms, args.jitter_ms), host="0.0.0.0", port=args.port)
+
+
+if __name__ == "__main__":
+    main()
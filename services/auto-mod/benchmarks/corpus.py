@@ -0,0 +1,71 @@
+"""
+Chat corpus loading for benchmarks
+"""
+import json
+import random
+from pathlib import Path
+from typing import Dict, List, Optional
+
+
+SAMPLE_MESSAGES = [
+    "gg",
+    "lol that was close",
+    "anyone know what song this is?",
+    "POGGERS",
+    "W stream today 🔥🔥",
+    "@streamer can you play ranked next?",
+    "hiiiiiiiii chat",
+    "first time here, love the vibes",
+    "check out my channel https://twitch.tv/someone",
+    "BUY CHEAP FOLLOWERS NOW at https://cheap-followers.biz",
+    "click here to visit the website https://free-gift.example/link",
+    "free money!!! claim your gift card reward",
+    "dm me on telegram for a deal",
+    "that play was insane 😂😂😂😂😂😂😂😂😂😂😂😂",
+    "@a @b @c @d @e @f look at this",
+    "why is the audio so quiet",
+    "KEKW KEKW KEKW",
+    "bro really said that",
+    "is this a replay or live?",
+    "https://youtu.be/dQw4w9WgXcQ",
+]
+
+
+def load_corpus(path: Optional[str] = None, size: int = 10000, seed: int = 7) -> List[Dict]:
+    """
+    Load chat messages from a file or synthesize a corpus
+
+    Files may be plain text (one message per line) or JSONL with at least a
+    "message" field and optionally user_id/username/platform/channel_id.
+    """
+    if path:
+        items = []
+        for line in Path(path).read_text(encoding="utf-8").splitlines():
+            if not line.strip():
+                continue
+            if path.endswith(".jsonl"):
+                items.append(json.loads(line))
+            else:
+                items.append({"message": line})
+        for i, item in enumerate(items):
+            _fill_defaults(item, i)
+        return items
+
+    rng = random.Random(seed)
+    items = []
+    for i in range(size):
+        message = rng.choice(SAMPLE_MESSAGES)
+        # Light mutation so caches and repeat detection see realistic variety
+        if rng.random() < 0.3:
+            message = f"{message} {rng.randint(0, 999)}"
+        items.append(_fill_defaults({"message": message}, rng.randint(0, size // 10)))
+    return items
+
+
+def _fill_defaults(item: Dict, n: int) -> Dict:
+    item.setdefault("user_id", f"user{n}")
+    item.setdefault("username", f"user{n}")
+    item.setdefault("platform", "twitch")
+    item.setdefault("channel_id", "bench")
+    item.setdefault("user_roles", None)
+    return item
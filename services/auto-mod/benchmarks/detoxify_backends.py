@@ -0,0 +1,86 @@
+"""
+Parity and throughput: PyTorch Detoxify vs the quantized ONNX Runtime backend
+
+Usage (from services/auto-mod):
+    python -m benchmarks.detoxify_backends [--corpus chat.txt] [--threads 4] [--batch-size 32]
+"""
+import argparse
+import os
+import time
+
+os.environ.setdefault("USE_DETOXIFY", "false")
+os.environ.setdefault("STATE_BACKEND", "memory")
+
+from src.config import settings  # noqa: E402
+from src.moderation.onnx_backend import OnnxDetoxify  # noqa: E402
+
+from .corpus import load_corpus  # noqa: E402
+
+
+def score_all(model, messages, batch_size: int):
+    """Scores per category for every message, plus messages/sec"""
+    scores = {}
+    start = time.perf_counter()
+    for i in range(0, len(messages), batch_size):
+        for category, values in model.predict(messages[i:i + batch_size]).items():
+            scores.setdefault(category, []).extend(float(v) for v in values)
+    elapsed = time.perf_counter() - start
+    return scores, len(messages) / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--corpus", help="Chat corpus (.txt one message per line, or .jsonl)")
+    parser.add_argument("--size", type=int, default=2000, help="Synthetic corpus size")
+    parser.add_argument("--model", default=settings.DETOXIFY_MODEL)
+    parser.add_argument("--export-dir", default=settings.DETOXIFY_ONNX_DIR)
+    parser.add_argument("--no-quantize", action="store_true", help="Compare the fp32 export instead")
+    parser.add_argument("--threads", type=int, default=settings.DETOXIFY_THREADS)
+    parser.add_argument("--batch-size", type=int, default=settings.DETOXIFY_BATCH_SIZE)
+    parser.add_argument("--threshold", type=float, default=settings.TOXICITY_THRESHOLD)
+    args = parser.parse_args()
+
+    import torch
+    from detoxify import Detoxify
+
+    if args.threads > 0:
+        torch.set_num_threads(args.threads)
+
+    messages = [item["message"] for item in load_corpus(args.corpus, args.size)]
+    reference = Detoxify(args.model)
+    candidate = OnnxDetoxify.load(args.model, args.export_dir, not args.no_quantize, args.threads)
+
+    # Warm up both paths so one-time graph setup is not timed
+    reference.predict(messages[:args.batch_size])
+    candidate.predict(messages[:args.batch_size])
+
+    torch_scores, torch_rate = score_all(reference, messages, args.batch_size)
+    onnx_scores, onnx_rate = score_all(candidate, messages, args.batch_size)
+
+    if list(torch_scores) != list(onnx_scores):
+        raise SystemExit(f"Category mismatch: {list(torch_scores)} vs {list(onnx_scores)}")
+
+    print(f"messages:      {len(messages)} (batch size {args.batch_size}, threads {args.threads or 'default'})")
+    print(f"pytorch:       {torch_rate:.1f} msgs/sec")
+    print(f"onnx:          {onnx_rate:.1f} msgs/sec ({'fp32' if args.no_quantize else 'int8'})")
+    print(f"speedup:       {onnx_rate / torch_rate:.2f}x")
+    print()
+    print(f"{'category':<18} {'max drift':>10} {'mean drift':>11} {'flips':>6}")
+
+    flipped = set()
+    for category, expected in torch_scores.items():
+        actual = onnx_scores[category]
+        drift = [abs(a - b) for a, b in zip(expected, actual)]
+        flips = [
+            i for i, (a, b) in enumerate(zip(expected, actual))
+            if (a >= args.threshold) != (b >= args.threshold)
+        ]
+        flipped.update(flips)
+        print(f"{category:<18} {max(drift):>10.4f} {sum(drift) / len(drift):>11.5f} {len(flips):>6}")
+
+    print()
+    print(f"decision flips at {args.threshold}: {len(flipped)} messages ({len(flipped) / len(messages):.2%})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,308 @@
+"""
+Replay a chat corpus through moderation and report throughput and latency
+
+Runs in-process against ModerationEngine or over HTTP against the service
+(started locally unless --url is given), with a local ai-personality stub.
+Reports p50/p95/p99 end to end and per stage, messages/sec, and writes
+the numbers as JSON. With --compare, exits non-zero when throughput or p95
+latency regresses past --max-regression.
+
+Usage (from services/auto-mod):
+    python -m benchmarks.replay [--mode inprocess|http] [--concurrency 32]
+        [--corpus chat.jsonl] [--output results.json] [--compare baseline.json]
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from .ai_stub import StubServer, free_port
+from .corpus import load_corpus
+
+PERCENTILES = (50, 95, 99)
+REQUEST_FIELDS = ("message", "user_id", "username", "platform", "channel_id", "user_roles")
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(math.ceil(pct * len(sorted_values) / 100) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+
+def summarize(values: List[float]) -> Dict[str, float]:
+    values = sorted(values)
+    summary = {f"p{p}": round(percentile(values, p), 3) for p in PERCENTILES}
+    summary["max"] = round(values[-1], 3) if values else 0.0
+    summary["mean"] = round(sum(values) / len(values), 3) if values else 0.0
+    summary["count"] = len(values)
+    return summary
+
+
+class Recorder:
+    """Collects client-side latency and the per-stage timings each result reports"""
+
+    def __init__(self):
+        self.latencies: List[float] = []
+        self.stages: Dict[str, List[float]] = {}
+        self.skipped: Dict[str, int] = {}
+        self.flagged = 0
+        self.errors = 0
+
+    def add(self, latency_ms: float, result: Dict):
+        self.latencies.append(latency_ms)
+        for stage, ms in result.get("timings", {}).items():
+            self.stages.setdefault(stage, []).append(ms)
+        for stage in result.get("skipped_stages", []):
+            self.skipped[stage] = self.skipped.get(stage, 0) + 1
+        if result.get("violations"):
+            self.flagged += 1
+
+
+async def replay(items: List[Dict], concurrency: int, moderate) -> Recorder:
+    """Feed items to moderate(item) from concurrency workers, in corpus order"""
+    recorder = Recorder()
+    queue: asyncio.Queue = asyncio.Queue()
+    for item in items:
+        queue.put_nowait(item)
+
+    async def worker():
+        while True:
+            try:
+                item = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            started = time.perf_counter()
+            try:
+                result = await moderate(item)
+            except Exception:
+                recorder.errors += 1
+                continue
+            recorder.add((time.perf_counter() - started) * 1000, result)
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return recorder
+
+
+async def run_inprocess(items: List[Dict], concurrency: int) -> Dict:
+    from src.moderation.engine import moderation_engine
+    from src.moderation.pipeline import moderation_pipeline
+    from src.moderation.spam import spam_detector
+    from src.moderation.toxicity import toxicity_detector
+
+    async def moderate(item):
+        return await moderation_engine.moderate_message(**item)
+
+    try:
+        await replay(items[:concurrency], concurrency, moderate)  # Warm-up
+        started = time.perf_counter()
+        recorder = await replay(items, concurrency, moderate)
+        wall = time.perf_counter() - started
+        service_metrics = {
+            "stages": moderation_pipeline.get_metrics(),
+            "toxicity": toxicity_detector.get_metrics(),
+            "spam": spam_detector.get_metrics(),
+        }
+    finally:
+        await toxicity_detector.close()
+
+    return {"recorder": recorder, "wall": wall, "service_metrics": service_metrics}
+
+
+async def run_http(items: List[Dict], concurrency: int, url: str) -> Dict:
+    import httpx
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=30.0) as client:
+        async def moderate(item):
+            response = await client.post("/api/v1/moderate/check", json=item)
+            response.raise_for_status()
+            return response.json()
+
+        await replay(items[:concurrency], concurrency, moderate)  # Warm-up
+        started = time.perf_counter()
+        recorder = await replay(items, concurrency, moderate)
+        wall = time.perf_counter() - started
+
+        response = await client.get("/api/v1/moderate/metrics")
+        service_metrics = response.json() if response.status_code == 200 else None
+
+    return {"recorder": recorder, "wall": wall, "service_metrics": service_metrics}
+
+
+def start_service(env: Dict[str, str], timeout: float = 120.0):
+    """Start the auto-mod service in a subprocess; returns (process, url)"""
+    import httpx
+
+    port = free_port()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "src.main:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        env={**os.environ, **env},
+    )
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError("auto-mod service exited during startup")
+        try:
+            if httpx.get(f"{url}/", timeout=1.0).status_code == 200:
+                return process, url
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError("auto-mod service did not become ready")
+
+
+def build_report(args, run: Dict, messages: int, stub_requests: Optional[int]) -> Dict:
+    recorder: Recorder = run["recorder"]
+    completed = len(recorder.latencies)
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "mode": args.mode,
+        "config": {
+            "concurrency": args.concurrency,
+            "corpus": args.corpus,
+            "messages": messages,
+            "detoxify": os.environ.get("USE_DETOXIFY"),
+            "ai_moderation": os.environ.get("USE_AI_MODERATION"),
+            "ai_stub_latency_ms": None if args.no_ai else args.ai_latency_ms,
+        },
+        "completed": completed,
+        "errors": recorder.errors,
+        "flagged": recorder.flagged,
+        "wall_seconds": round(run["wall"], 3),
+        "messages_per_sec": round(completed / run["wall"], 1) if run["wall"] else 0.0,
+        "latency_ms": {
+            "end_to_end": summarize(recorder.latencies),
+            "stages": {stage: summarize(values) for stage, values in recorder.stages.items()},
+        },
+        "skipped_stages": recorder.skipped,
+        "ai_stub_requests": stub_requests,
+        "service_metrics": run["service_metrics"],
+    }
+
+
+def print_report(report: Dict):
+    print(f"mode:          {report['mode']} (concurrency {report['config']['concurrency']})")
+    print(f"messages:      {report['completed']} ok, {report['errors']} errors, {report['flagged']} flagged")
+    print(f"throughput:    {report['messages_per_sec']} msgs/sec over {report['wall_seconds']}s")
+    print()
+    print(f"{'latency ms':<14} {'p50':>9} {'p95':>9} {'p99':>9} {'max':>9}")
+    rows = {"end to end": report["latency_ms"]["end_to_end"], **report["latency_ms"]["stages"]}
+    for name, s in rows.items():
+        print(f"{name:<14} {s['p50']:>9.3f} {s['p95']:>9.3f} {s['p99']:>9.3f} {s['max']:>9.3f}")
+    if report["skipped_stages"]:
+        print()
+        print(f"skipped:       {report['skipped_stages']}")
+
+
+def compare(report: Dict, baseline: Dict, max_regression: float, min_delta_ms: float = 1.0) -> List[str]:
+    """
+    Regressions of throughput and p95 latency (end to end and per stage)
+
+    Latency changes smaller than min_delta_ms are ignored so that noise in
+    sub-millisecond stages does not fail a run.
+    """
+    problems = []
+    before, after = baseline["messages_per_sec"], report["messages_per_sec"]
+    if before and after < before * (1 - max_regression):
+        problems.append(f"throughput {before} -> {after} msgs/sec")
+
+    rows = [("end to end", baseline["latency_ms"]["end_to_end"], report["latency_ms"]["end_to_end"])]
+    for stage, old in baseline["latency_ms"]["stages"].items():
+        new = report["latency_ms"]["stages"].get(stage)
+        if new:
+            rows.append((stage, old, new))
+    for name, old, new in rows:
+        slower = new["p95"] - old["p95"]
+        if old["p95"] and new["p95"] > old["p95"] * (1 + max_regression) and slower >= min_delta_ms:
+            problems.append(f"{name} p95 {old['p95']} -> {new['p95']} ms")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--mode", choices=("inprocess", "http"), default="inprocess")
+    parser.add_argument("--url", help="Benchmark a running service instead of starting one (http mode)")
+    parser.add_argument("--corpus", help="Chat corpus (.txt one message per line, or .jsonl)")
+    parser.add_argument("--size", type=int, default=5000, help="Synthetic corpus size")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--detoxify", action="store_true", help="Load Detoxify (off by default)")
+    parser.add_argument("--no-ai", action="store_true", help="Disable AI moderation instead of stubbing it")
+    parser.add_argument("--ai-latency-ms", type=float, default=50.0, help="ai-personality stub latency")
+    parser.add_argument("--output", help="Write results as JSON")
+    parser.add_argument("--compare", help="Baseline results JSON to check for regressions")
+    parser.add_argument("--max-regression", type=float, default=0.2, help="Allowed fractional regression")
+    parser.add_argument("--min-delta-ms", type=float, default=1.0, help="Ignore smaller p95 changes")
+    args = parser.parse_args()
+
+    stub = None
+    if not args.no_ai and not args.url:
+        stub = StubServer(latency_ms=args.ai_latency_ms).start()
+
+    # Settings are read at import time, so configure before importing src
+    env = {
+        "USE_DETOXIFY": "true" if args.detoxify else "false",
+        "USE_AI_MODERATION": "false" if args.no_ai else "true",
+        "STATE_BACKEND": os.environ.get("STATE_BACKEND", "memory"),
+        "RESULT_CACHE_REDIS": os.environ.get("RESULT_CACHE_REDIS", "false"),
+        "RULES_BACKEND": os.environ.get("RULES_BACKEND", "memory"),
+        "POLICY_BACKEND": os.environ.get("POLICY_BACKEND", "memory"),
+        "LOG_LEVEL": os.environ.get("LOG_LEVEL", "WARNING"),
+    }
+    if stub:
+        env["AI_PERSONALITY_URL"] = stub.url
+    os.environ.update(env)
+
+    items = [
+        {field: item[field] for field in REQUEST_FIELDS}
+        for item in load_corpus(args.corpus, args.size)
+    ]
+
+    service = None
+    try:
+        if args.mode == "inprocess":
+            run = asyncio.run(run_inprocess(items, args.concurrency))
+        else:
+            url = args.url
+            if not url:
+                service, url = start_service(env)
+            run = asyncio.run(run_http(items, args.concurrency, url))
+    finally:
+        if service:
+            service.terminate()
+            service.wait(timeout=10)
+        if stub:
+            stub.stop()
+
+    report = build_report(args, run, len(items), stub.requests if stub else None)
+    print_report(report)
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2))
+        print(f"\nresults written to {args.output}")
+
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text())
+        if baseline["mode"] != report["mode"] or baseline["config"] != report["config"]:
+            print(f"\nwarning: {args.compare} was recorded with a different mode or config")
+        problems = compare(report, baseline, args.max_regression, args.min_delta_ms)
+        if problems:
+            print(f"\nregressions beyond {args.max_regression:.0%}:")
+            for problem in problems:
+                print(f"  {problem}")
+            sys.exit(1)
+        print(f"\nno regressions beyond {args.max_regression:.0%} against {args.compare}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Micro-benchmark: spam feature extraction before/after precompiled features
+
+Usage (from services/auto-mod):
+    python -m benchmarks.spam_features [--corpus chat.txt] [--repeat 5]
+"""
+import argparse
+import os
+import re
+import time
+
+os.environ.setdefault("USE_DETOXIFY", "false")
+os.environ.setdefault("STATE_BACKEND", "memory")
+
+from src.moderation.features import extract_features  # noqa: E402
+
+from .corpus import load_corpus  # noqa: E402
+
+
+def legacy_features(message: str):
+    """The multi-pass implementation check_spam used before the scanner"""
+    caps_ratio = sum(1 for c in message if c.isupper()) / max(len(message), 1)
+    emoji_count = len(re.findall(r'[\U0001F600-\U0001F64F\U0001F300-\U0001F5FF\U0001F680-\U0001F6FF\U0001F1E0-\U0001F1FF]', message))
+    mention_count = len(re.findall(r'@\w+', message))
+    links = re.findall(r'https?://[^\s]+', message)
+    has_run = re.search(r'(.)\1{5,}', message) is not None
+
+    spam_patterns = [
+        r'(?i)(buy|sell|cheap|discount|offer|deal).*(now|today|limited)',
+        r'(?i)(click here|check out|visit|go to).*(link|website)',
+        r'(?i)(free|prize|winner|won|claim).*(money|gift|reward)',
+        r'(?i)(dm me|message me|add me).*(discord|telegram|whatsapp)',
+    ]
+    has_pattern = False
+    for pattern in spam_patterns:
+        if re.search(pattern, message):
+            has_pattern = True
+            break
+
+    return caps_ratio, emoji_count, mention_count, links, has_run, has_pattern
+
+
+def scanner_features(message: str):
+    f = extract_features(message)
+    return f.caps_ratio, f.emoji_count, f.mention_count, f.links, f.has_repeated_chars, f.has_spam_pattern
+
+
+def bench(fn, messages, repeat: int) -> float:
+    """Best per-message time in microseconds over repeat runs"""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for message in messages:
+            fn(message)
+        best = min(best, time.perf_counter() - start)
+    return best / len(messages) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--corpus", help="Chat corpus (.txt one message per line, or .jsonl)")
+    parser.add_argument("--size", type=int, default=20000, help="Synthetic corpus size")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    messages = [item["message"] for item in load_corpus(args.corpus, args.size)]
+
+    mismatches = sum(
+        1 for m in messages
+        if legacy_features(m)[1:] != scanner_features(m)[1:]
+        or abs(legacy_features(m)[0] - scanner_features(m)[0]) > 1e-9
+    )
+
+    before = bench(legacy_features, messages, args.repeat)
+    after = bench(scanner_features, messages, args.repeat)
+
+    print(f"messages:      {len(messages)}")
+    print(f"before:        {before:.2f} us/msg")
+    print(f"after:         {after:.2f} us/msg")
+    print(f"speedup:       {before / after:.2f}x")
+    print(f"feature drift: {mismatches} messages ({mismatches / len(messages):.2%})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,367 @@
+"""
+Offline threshold tuning: score a chat corpus once, then sweep thresholds
+
+`score` runs every moderation stage over a corpus (nothing skipped) and
+stores each message's stage outputs as columns in a .npz file. `sweep`
+evaluates a grid of toxicity/spam thresholds and severity cutoffs against
+those columns with NumPy, reproducing ModerationEngine's action decision,
+and reports action rates and - for labelled corpora - confusion matrices.
+No model runs during a sweep.
+
+Labels come from a JSONL "label" field (true/1/"toxic"/"spam" = should be
+actioned, false/0/"clean" = should not); unlabelled messages only count
+toward action rates.
+
+Usage (from services/auto-mod):
+    python -m benchmarks.thresholds score --output scores.npz [--corpus chat.jsonl]
+        [--no-detoxify] [--ai]
+    python -m benchmarks.thresholds sweep scores.npz [--toxicity 0.5:0.95:0.05]
+        [--spam 0.4:1.6:0.1] [--severe 0.9] [--moderate 0.7] [--minor 0.5]
+        [--severe-violations 3] [--top 20] [--output sweep.csv]
+"""
+import argparse
+import asyncio
+import csv
+import itertools
+import json
+import os
+import sys
+import time
+from typing import Dict, List
+
+import numpy as np
+
+from .corpus import load_corpus
+
+# Stage outputs stored per message
+COLUMNS = {
+    "filter_violations": np.int16,  # Banned words/phrases matched
+    "toxicity": np.float32,  # Highest Detoxify category score
+    "ai_toxic": np.bool_,  # AI verdict
+    "spam_score": np.float32,
+    "spam_reasons": np.int16,
+    "label": np.int8,  # 1 = should be actioned, 0 = should not, -1 = unlabelled
+}
+
+# Threshold parameters a sweep can vary, with the setting each one tunes
+PARAMS = {
+    "toxicity": "TOXICITY_THRESHOLD",
+    "spam": "SPAM_THRESHOLD",
+    "severe": "SEVERE_SCORE",
+    "moderate": "MODERATE_SCORE",
+    "minor": "MINOR_SCORE",
+    "severe_violations": "SEVERE_VIOLATIONS",
+}
+
+POSITIVE_LABELS = {"1", "true", "yes", "toxic", "spam", "violation", "flagged"}
+NEGATIVE_LABELS = {"0", "false", "no", "clean", "safe", "ok"}
+
+
+def parse_label(value) -> int:
+    if value is None:
+        return -1
+    if isinstance(value, bool) or isinstance(value, (int, float)):
+        return int(bool(value))
+    value = str(value).strip().lower()
+    if value in POSITIVE_LABELS:
+        return 1
+    if value in NEGATIVE_LABELS:
+        return 0
+    return -1
+
+
+async def score_corpus(items: List[Dict], batch_size: int, use_ai: bool) -> Dict[str, np.ndarray]:
+    """Run every stage over the corpus in order; returns one array per column"""
+    from src.moderation.pipeline import ModerationContext, StagePolicy, moderation_pipeline
+    from src.moderation.toxicity import toxicity_detector
+
+    # AI verdicts are kept apart from Detoxify's score, so run that stage here
+    stages = StagePolicy([name for name in moderation_pipeline.stage_names if name != "ai"])
+    columns = {name: np.zeros(len(items), dtype=dtype) for name, dtype in COLUMNS.items()}
+
+    try:
+        for start in range(0, len(items), batch_size):
+            batch = items[start:start + batch_size]
+            contexts = [
+                ModerationContext(
+                    message=item["message"],
+                    user_id=item["user_id"],
+                    user_roles=item.get("user_roles"),
+                    platform=item.get("platform"),
+                    channel_id=item.get("channel_id"),
+                )
+                for item in batch
+            ]
+            await moderation_pipeline.run(contexts, stages)
+            verdicts = [None] * len(contexts)
+            if use_ai:
+                verdicts = await asyncio.gather(*(toxicity_detector.check_ai(ctx.message) for ctx in contexts))
+
+            for i, (item, ctx, verdict) in enumerate(zip(batch, contexts, verdicts), start):
+                columns["filter_violations"][i] = len(ctx.filter_result["violations"]) if ctx.filter_result["has_violation"] else 0
+                columns["toxicity"][i] = ctx.toxicity_result["toxicity_score"] if ctx.toxicity_result else 0.0
+                columns["ai_toxic"][i] = bool(verdict and verdict["is_toxic"])
+                columns["spam_score"][i] = ctx.spam_result["spam_score"]
+                columns["spam_reasons"][i] = len(ctx.spam_result["reasons"])
+                columns["label"][i] = parse_label(item.get("label"))
+    finally:
+        await toxicity_detector.close()
+
+    return columns
+
+
+def parse_values(spec: str, integer: bool = False) -> np.ndarray:
+    """"0.5:0.95:0.05" (inclusive range), "0.6,0.7,0.8" or a single value"""
+    if ":" in spec:
+        start, stop, step = (float(part) for part in spec.split(":"))
+        values = np.arange(start, stop + step / 2, step)
+    else:
+        values = np.array([float(part) for part in spec.split(",")])
+    return values.round().astype(np.int32) if integer else values.round(6).astype(np.float32)
+
+
+def build_grid(specs: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+    """Every combination of the given values, minus those with unordered severity cutoffs"""
+    combos = np.array(list(itertools.product(*specs.values())), dtype=np.float32)
+    grid = {name: combos[:, i] for i, name in enumerate(specs)}
+    valid = (grid["minor"] <= grid["moderate"]) & (grid["moderate"] <= grid["severe"])
+    return {name: values[valid] for name, values in grid.items()}
+
+
+def evaluate(columns: Dict[str, np.ndarray], grid: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+    """
+    Action tier counts for every grid row
+
+    Mirrors ModerationEngine._decide: a message's violations are its filter
+    matches, a toxicity verdict and one per spam reason; its severity is the
+    highest score among the stages that flagged it. Only the toxicity and
+    spam thresholds change which messages are flagged, so each distinct pair
+    is evaluated once over the corpus; the severity cutoffs are then counted
+    for all rows sharing that pair by binary search over sorted scores.
+    """
+    toxicity = columns["toxicity"]
+    ai_toxic = columns["ai_toxic"]
+    spam_score = columns["spam_score"]
+    spam_reasons = columns["spam_reasons"]
+    filter_violations = columns["filter_violations"]
+    filter_score = (filter_violations > 0).astype(np.float32)
+    groups = {
+        "all": np.ones(len(columns["label"]), dtype=bool),
+        "positive": columns["label"] == 1,
+        "negative": columns["label"] == 0,
+    }
+
+    rows = len(grid["toxicity"])
+    out = {name: np.zeros(rows, dtype=np.int64) for name in (
+        "flagged", "minor", "moderate", "severe", "actioned", "tp", "fp", "fn", "tn",
+    )}
+
+    pairs, pair_of_row = np.unique(
+        np.stack([grid["toxicity"], grid["spam"]], axis=1), axis=0, return_inverse=True
+    )
+    for p, (toxicity_threshold, spam_threshold) in enumerate(pairs):
+        toxic = (toxicity >= toxicity_threshold) | ai_toxic
+        spam = spam_score >= spam_threshold
+        violations = filter_violations + toxic + spam * spam_reasons
+        max_score = np.maximum(
+            filter_score,
+            np.maximum(np.where(toxic, toxicity, 0.0), np.where(spam, spam_score, 0.0)),
+        ).astype(np.float32)
+        flagged = violations > 0
+
+        at = np.flatnonzero(pair_of_row.ravel() == p)
+        severe_cut, moderate_cut, minor_cut = grid["severe"][at], grid["moderate"][at], grid["minor"][at]
+        severe_violations = grid["severe_violations"][at]
+
+        for group, mask in groups.items():
+            selected = flagged & mask
+            scores = np.sort(max_score[selected])
+            counts = violations[selected]
+
+            # Flagged messages scoring at least each cut
+            above = {
+                name: len(scores) - np.searchsorted(scores, cut)
+                for name, cut in (("severe", severe_cut), ("moderate", moderate_cut), ("minor", minor_cut))
+            }
+            # ... and those below it that are severe by violation count alone
+            below = {name: np.zeros(len(at), dtype=np.int64) for name in above}
+            for minimum in np.unique(severe_violations):
+                same = severe_violations == minimum
+                many = np.sort(max_score[selected][counts >= minimum])
+                for name, cut in (("severe", severe_cut), ("moderate", moderate_cut), ("minor", minor_cut)):
+                    below[name][same] = np.searchsorted(many, cut[same])
+
+            severe = above["severe"] + below["severe"]
+            actioned = above["minor"] + below["minor"]
+            moderate = above["moderate"] - above["severe"] - (below["severe"] - below["moderate"])
+
+            if group == "all":
+                out["flagged"][at] = len(scores)
+                out["severe"][at] = severe
+                out["moderate"][at] = moderate
+                out["minor"][at] = actioned - severe - moderate
+                out["actioned"][at] = actioned
+            elif group == "positive":
+                out["tp"][at] = actioned
+                out["fn"][at] = mask.sum() - actioned
+            else:
+                out["fp"][at] = actioned
+                out["tn"][at] = mask.sum() - actioned
+
+    return out
+
+
+def summarize(grid: Dict[str, np.ndarray], counts: Dict[str, np.ndarray], messages: int) -> List[Dict]:
+    tp, fp, fn = (counts[name].astype(np.float64) for name in ("tp", "fp", "fn"))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        precision = np.where(tp + fp > 0, tp / (tp + fp), 0.0)
+        recall = np.where(tp + fn > 0, tp / (tp + fn), 0.0)
+        f1 = np.where(precision + recall > 0, 2 * precision * recall / (precision + recall), 0.0)
+
+    rows = []
+    for i in range(len(grid["toxicity"])):
+        row = {name: round(float(values[i]), 4) for name, values in grid.items()}
+        row["severe_violations"] = int(row["severe_violations"])
+        for tier in ("flagged", "minor", "moderate", "severe", "actioned"):
+            row[f"{tier}_rate"] = round(counts[tier][i] / messages, 4) if messages else 0.0
+        for name in ("tp", "fp", "fn", "tn"):
+            row[name] = int(counts[name][i])
+        row["precision"] = round(float(precision[i]), 4)
+        row["recall"] = round(float(recall[i]), 4)
+        row["f1"] = round(float(f1[i]), 4)
+        rows.append(row)
+    return rows
+
+
+def print_rows(rows: List[Dict], labelled: bool):
+    header = f"{'toxicity':>8} {'spam':>6} {'severe':>6} {'mod':>6} {'minor':>6} {'sv':>3} {'flagged':>8} {'actioned':>8} {'severe%':>8}"
+    if labelled:
+        header += f" {'prec':>6} {'recall':>6} {'f1':>6}"
+    print(header)
+    for r in rows:
+        line = (
+            f"{r['toxicity']:>8.3f} {r['spam']:>6.2f} {r['severe']:>6.2f} {r['moderate']:>6.2f} "
+            f"{r['minor']:>6.2f} {r['severe_violations']:>3} {r['flagged_rate']:>8.2%} "
+            f"{r['actioned_rate']:>8.2%} {r['severe_rate']:>8.2%}"
+        )
+        if labelled:
+            line += f" {r['precision']:>6.3f} {r['recall']:>6.3f} {r['f1']:>6.3f}"
+        print(line)
+
+
+def print_confusion(title: str, row: Dict):
+    print(f"\n{title}")
+    print(f"{'':>16} {'actioned':>10} {'not':>10}")
+    print(f"{'should action':>16} {row['tp']:>10} {row['fn']:>10}")
+    print(f"{'should not':>16} {row['fp']:>10} {row['tn']:>10}")
+
+
+def cmd_score(args):
+    # Settings are read at import time, so configure before importing src.
+    # Replay compresses time, so rate-based flood detection is off by default.
+    os.environ["USE_DETOXIFY"] = "false" if args.no_detoxify else "true"
+    os.environ["USE_AI_MODERATION"] = "true" if args.ai else "false"
+    for name, value in (
+        ("STATE_BACKEND", "memory"),
+        ("RESULT_CACHE_REDIS", "false"),
+        ("RULES_BACKEND", "memory"),
+        ("POLICY_BACKEND", "memory"),
+        ("FLOOD_DETECTION", "false"),
+        ("LOG_LEVEL", "WARNING"),
+    ):
+        os.environ.setdefault(name, value)
+
+    items = load_corpus(args.corpus, args.size)
+    started = time.perf_counter()
+    columns = asyncio.run(score_corpus(items, args.batch_size, args.ai))
+    elapsed = time.perf_counter() - started
+
+    meta = {
+        "corpus": args.corpus,
+        "messages": len(items),
+        "detoxify": not args.no_detoxify,
+        "ai": args.ai,
+        "flood_detection": os.environ["FLOOD_DETECTION"],
+    }
+    np.savez_compressed(args.output, meta=np.array(json.dumps(meta)), **columns)
+    labelled = int((columns["label"] >= 0).sum())
+    print(f"scored {len(items)} messages ({labelled} labelled) in {elapsed:.1f}s -> {args.output}")
+
+
+def cmd_sweep(args):
+    from src.config import settings
+
+    with np.load(args.scores) as data:
+        columns = {name: data[name] for name in COLUMNS}
+        meta = json.loads(str(data["meta"]))
+    messages = len(columns["label"])
+    labelled = bool((columns["label"] >= 0).any())
+
+    current = {name: getattr(settings, setting) for name, setting in PARAMS.items()}
+    specs = {
+        name: parse_values(getattr(args, name) or str(current[name]), integer=name == "severe_violations")
+        for name in PARAMS
+    }
+    grid = build_grid(specs)
+    if not len(grid["toxicity"]):
+        sys.exit("no valid combinations (need minor <= moderate <= severe)")
+
+    started = time.perf_counter()
+    counts = evaluate(columns, grid)
+    elapsed = time.perf_counter() - started
+    rows = summarize(grid, counts, messages)
+
+    baseline_grid = {name: np.array([value], dtype=np.float32) for name, value in current.items()}
+    baseline = summarize(baseline_grid, evaluate(columns, baseline_grid), messages)[0]
+
+    print(f"corpus:      {meta['corpus'] or 'synthetic'} ({messages} messages, detoxify={meta['detoxify']}, ai={meta['ai']})")
+    print(f"evaluated:   {len(rows)} combinations in {elapsed:.2f}s")
+    print("\ncurrent settings")
+    print_rows([baseline], labelled)
+
+    ranked = sorted(rows, key=lambda r: (r["f1"], -r["fp"]), reverse=True) if labelled else rows
+    print(f"\n{'best by f1' if labelled else 'grid'} (top {min(args.top, len(ranked))})")
+    print_rows(ranked[:args.top], labelled)
+
+    if labelled:
+        print_confusion("confusion matrix: current settings", baseline)
+        print_confusion("confusion matrix: best", ranked[0])
+
+    if args.output:
+        with open(args.output, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+            writer.writeheader()
+            writer.writerows(ranked)
+        print(f"\nall combinations written to {args.output}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    score = commands.add_parser("score", help="Score a corpus once and store per-stage columns")
+    score.add_argument("--corpus", help="Chat corpus (.txt one message per line, or .jsonl with labels)")
+    score.add_argument("--size", type=int, default=5000, help="Synthetic corpus size")
+    score.add_argument("--batch-size", type=int, default=64)
+    score.add_argument("--no-detoxify", action="store_true", help="Skip Detoxify (toxicity column stays 0)")
+    score.add_argument("--ai", action="store_true", help="Also ask ai-personality for a verdict on every message")
+    score.add_argument("--output", required=True, help="Columns file (.npz)")
+    score.set_defaults(func=cmd_score)
+
+    sweep = commands.add_parser("sweep", help="Evaluate threshold combinations against stored columns")
+    sweep.add_argument("scores", help="Columns file written by score")
+    for name, setting in PARAMS.items():
+        sweep.add_argument(
+            f"--{name.replace('_', '-')}", dest=name,
+            help=f"{setting} values: start:stop:step or a,b,c (default: current setting)",
+        )
+    sweep.add_argument("--top", type=int, default=20, help="Combinations to print")
+    sweep.add_argument("--output", help="Write every combination as CSV")
+    sweep.set_defaults(func=cmd_sweep)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
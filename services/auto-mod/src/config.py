@@ -18,13 +18,49 @@ class Settings(BaseSettings):
     # Redis
     REDIS_URL: str = "redis://redis:6379"
 
+    # Pipeline (stages run in order; skip-if-decided stages are skipped once
+    # a message already warrants the most severe action)
+    MODERATION_STAGES: List[str] = ["filter", "spam", "detoxify", "ai"]
+    SKIP_IF_DECIDED_STAGES: List[str] = ["detoxify", "ai"]
+
+    # Shared State (sliding windows for repeat spam and violations)
+    STATE_BACKEND: str = "redis"  # redis, memory
+    STATE_KEY_PREFIX: str = "automod"
+    STATE_MAX_ENTRIES: int = 1000  # Max events kept per window key
+    STATE_MAX_KEYS: int = 100000  # Max keys held by the in-process fallback
+
     # AI Personality Integration
     AI_PERSONALITY_URL: str = "http://ai-personality:8200"
     USE_AI_MODERATION: bool = True  # Use AI for contextual moderation
+    AI_MAX_CONNECTIONS: int = 20  # Pooled keep-alive connections
+    AI_CONCURRENCY: int = 16  # Max AI checks in flight
+    AI_TIMEOUT: float = 3.0  # Seconds per AI check
+    MODERATION_BUDGET_MS: float = 1500.0  # Per-message deadline; AI gets what is left
+    AI_BREAKER_WINDOW: int = 50  # Recent calls considered by the circuit breaker
+    AI_BREAKER_MIN_REQUESTS: int = 20  # Calls needed before the circuit may open
+    AI_BREAKER_ERROR_RATE: float = 0.5  # Open above this failure rate
+    AI_BREAKER_LATENCY_MS: float = 1500.0  # Open above this average latency
+    AI_BREAKER_COOLDOWN: float = 30.0  # Seconds open before a probe call
 
     # Toxicity Detection
     TOXICITY_THRESHOLD: float = 0.7  # 0-1, higher = stricter
     USE_DETOXIFY: bool = True  # Use Detoxify model for toxicity detection
+    DETOXIFY_MODEL: str = "original"
+    DETOXIFY_BACKEND: str = "torch"  # torch, onnx
+    DETOXIFY_ONNX_DIR: str = "models/detoxify-onnx"  # Exported model (created on first load)
+    DETOXIFY_ONNX_QUANTIZE: bool = True  # int8 dynamic quantization
+    DETOXIFY_THREADS: int = 0  # ONNX intra-op threads (0 = all cores)
+    DETOXIFY_BATCH_SIZE: int = 32  # Max messages per Detoxify batch
+    DETOXIFY_BATCH_WAIT_MS: float = 5.0  # Max time a message waits for its batch
+    DETOXIFY_WORKERS: int = 1  # Inference threads (batches in flight)
+    DETOXIFY_MAX_QUEUE: int = 1000  # Queue depth considered saturated
+
+    # Result Cache (toxicity scores and AI verdicts keyed by normalized message)
+    RESULT_CACHE_ENABLED: bool = True
+    RESULT_CACHE_REDIS: bool = True  # Share results across workers via Redis
+    RESULT_CACHE_SIZE: int = 50000  # In-process entries
+    TOXICITY_CACHE_TTL: int = 3600  # Seconds
+    AI_VERDICT_CACHE_TTL: int = 900  # Seconds
 
     # Spam Detection
     SPAM_THRESHOLD: float = 0.6  # 0-1
@@ -39,14 +75,40 @@ class Settings(BaseSettings):
     REPEAT_MESSAGE_COUNT: int = 3  # Same message X times = spam
     REPEAT_MESSAGE_WINDOW: int = 60  # Within X seconds
 
+    # Raid Detection (near-identical messages from many users in one channel)
+    RAID_DETECTION: bool = True
+    RAID_MIN_USERS: int = 5  # Distinct users posting near-duplicates = raid
+    RAID_WINDOW: int = 120  # Within X seconds
+    RAID_SIMILARITY: float = 0.5  # Estimated Jaccard similarity of 4-char shingles
+    RAID_MIN_LENGTH: int = 20  # Shorter messages (gg, emotes) are never fingerprinted
+    RAID_MAX_CHANNELS: int = 10000  # Channels tracked in-process
+    RAID_MAX_CLUSTERS: int = 5000  # Message clusters tracked per channel
+    FLOOD_DETECTION: bool = True
+    FLOOD_USER_BURST: int = 8  # Messages a user may send at once
+    FLOOD_USER_RATE: float = 1.0  # Sustained messages/sec per user
+    FLOOD_CHANNEL_BURST: int = 200  # Messages a channel may receive at once
+    FLOOD_CHANNEL_RATE: float = 50.0  # Sustained messages/sec per channel
+    FLOOD_BUSY_USER_BURST: int = 3  # Per-user burst while the channel is over its rate
+    FLOOD_BUSY_USER_RATE: float = 0.2  # Per-user messages/sec while the channel is over its rate
+
     # Link Moderation
     ALLOWED_DOMAINS: List[str] = ["youtube.com", "youtu.be", "twitch.tv", "twitter.com", "x.com"]
     BLOCKED_DOMAINS: List[str] = []  # Explicitly blocked domains
     CHECK_LINK_SAFETY: bool = True
+    LINK_CACHE_SIZE: int = 10000  # Max cached domain verdicts
+    LINK_CACHE_TTL: int = 3600  # Seconds a domain verdict stays cached
+    PUBLIC_SUFFIX_LIST_FILE: Optional[str] = None  # Local PSL file (defaults to bundled snapshot)
 
     # Banned Words/Phrases
     BANNED_WORDS: List[str] = []  # Load from database/config
     BANNED_PHRASES: List[str] = []
+    RULES_BACKEND: str = "redis"  # redis (shared, versioned), memory (per process)
+    RULES_POLL_INTERVAL: float = 5.0  # Seconds between version checks if a notification is missed
+
+    # Batch API
+    MAX_BATCH_MESSAGES: int = 500  # Max messages per /check-batch call
+    WS_MAX_IN_FLIGHT: int = 64  # Concurrent checks per /stream connection
+    WS_BACKPRESSURE_POLL_MS: float = 10.0  # Recheck interval while Detoxify is saturated
 
     # Actions
     AUTO_DELETE: bool = True  # Auto-delete flagged messages
@@ -54,11 +116,22 @@ class Settings(BaseSettings):
     AUTO_BAN: bool = False  # Auto-ban users (requires multiple violations)
     TIMEOUT_DURATION: int = 300  # Timeout duration in seconds (5 min default)
     VIOLATIONS_FOR_BAN: int = 5  # Number of violations before ban
+    VIOLATION_WINDOW: int = 86400  # Violations count toward a ban for X seconds
+    SEVERE_SCORE: float = 0.9  # Max violation score for delete + double timeout (+ ban check)
+    SEVERE_VIOLATIONS: int = 3  # Or this many violations in one message
+    MODERATE_SCORE: float = 0.7  # Delete + timeout
+    MINOR_SCORE: float = 0.5  # Delete only
 
     # Whitelist
     WHITELIST_ROLES: List[str] = ["mod", "vip", "broadcaster", "admin"]  # Exempt from moderation
     WHITELIST_USERS: List[str] = []  # Specific exempt users
 
+    # Per-Channel Policies
+    POLICY_BACKEND: str = "redis"  # redis (shared, versioned), memory (per process)
+    POLICY_CACHE_SIZE: int = 10000  # Max compiled channel policies kept in memory
+    POLICY_CACHE_TTL: int = 300  # Seconds before a cached policy is reloaded anyway
+    POLICY_LINK_CACHE_SIZE: int = 1000  # Domain verdicts cached per channel with its own domain lists
+
     # Logging
     LOG_ALL_MESSAGES: bool = False  # Log all messages (privacy concern)
     LOG_VIOLATIONS: bool = True  # Log only violations
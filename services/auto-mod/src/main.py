@@ -9,6 +9,10 @@ from pathlib import Path
 
 from .config import settings
 from .routes import moderation
+from .moderation.policy import policy_registry
+from .moderation.rules import rule_sync
+from .moderation.toxicity import toxicity_detector
+from .moderation.state import close_redis, window_store
 
 logging.basicConfig(
     level=getattr(logging, settings.LOG_LEVEL),
@@ -45,6 +49,10 @@ async def startup_event():
     logger.info("  ✅ Repeat message detection")
     logger.info("  ✅ Role-based whitelisting")
 
+    if rule_sync:
+        await rule_sync.start()
+    await policy_registry.start()
+
     logger.info(f"Toxicity threshold: {settings.TOXICITY_THRESHOLD}")
     logger.info(f"Spam threshold: {settings.SPAM_THRESHOLD}")
     logger.info(f"Auto-delete: {settings.AUTO_DELETE}")
@@ -53,6 +61,16 @@ async def startup_event():
     logger.info("✅ Auto-Moderation ready")
 
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    if rule_sync:
+        await rule_sync.close()
+    await policy_registry.close()
+    await toxicity_detector.close()
+    await window_store.close()
+    await close_redis()
+
+
 @app.get("/")
 async def root():
     return {
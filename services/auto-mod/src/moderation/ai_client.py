@@ -0,0 +1,242 @@
+"""
+Pooled client for AI contextual moderation (ai-personality)
+"""
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Dict, Optional, Set
+
+import httpx
+
+from ..config import settings
+
+logger = logging.getLogger(__name__)
+
+PROMPT = (
+    "Analyze if this message is toxic, hateful, harassing, or inappropriate. "
+    "Reply ONLY with 'TOXIC: <reason>' if it is, or 'SAFE' if it's not: \"{message}\""
+)
+
+
+class CircuitBreaker:
+    """
+    Open when recent calls fail or slow down too much
+
+    While open, callers skip the AI check entirely (moderation falls back to
+    Detoxify only). After cooldown one probe call is let through; its outcome
+    closes the circuit again or restarts the cooldown.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+        self,
+        window: int = 50,
+        min_requests: int = 20,
+        max_error_rate: float = 0.5,
+        max_latency: float = 1.5,
+        cooldown: float = 30.0,
+    ):
+        self.window = deque(maxlen=window)  # (ok, latency)
+        self.min_requests = min_requests
+        self.max_error_rate = max_error_rate
+        self.max_latency = max_latency
+        self.cooldown = cooldown
+
+        self.state = self.CLOSED
+        self._opened_at = 0.0
+        self._probing = False
+        self.times_opened = 0
+        self._open_seconds = 0.0
+
+    def allow(self) -> bool:
+        if self.state == self.CLOSED:
+            return True
+        if self.state == self.OPEN and time.monotonic() - self._opened_at >= self.cooldown:
+            self.state = self.HALF_OPEN
+        if self.state == self.HALF_OPEN and not self._probing:
+            self._probing = True
+            return True
+        return False
+
+    def release_probe(self):
+        """Give back a half-open probe that was never sent, so the next call can probe"""
+        if self.state == self.HALF_OPEN:
+            self._probing = False
+
+    def record(self, ok: bool, latency: float):
+        if self.state == self.HALF_OPEN:
+            self._probing = False
+            if ok and latency <= self.max_latency:
+                self._close()
+            else:
+                self._open()
+            return
+
+        self.window.append((ok, latency))
+        if self.state == self.CLOSED and len(self.window) >= self.min_requests:
+            errors = sum(1 for success, _ in self.window if not success)
+            avg_latency = sum(lat for _, lat in self.window) / len(self.window)
+            if errors / len(self.window) > self.max_error_rate or avg_latency > self.max_latency:
+                self._open()
+
+    def _open(self):
+        if self.state != self.OPEN:
+            self.times_opened += 1
+            logger.warning("AI moderation circuit opened, using Detoxify only")
+        self.state = self.OPEN
+        self._opened_at = time.monotonic()
+
+    def _close(self):
+        self._open_seconds += time.monotonic() - self._opened_at
+        self.state = self.CLOSED
+        self.window.clear()
+        logger.info("AI moderation circuit closed")
+
+    @property
+    def open_seconds(self) -> float:
+        """Total time spent open (including the current open period)"""
+        if self.state == self.CLOSED:
+            return self._open_seconds
+        return self._open_seconds + time.monotonic() - self._opened_at
+
+
+class AIModerationClient:
+    """
+    Shared keep-alive client with bounded concurrency and per-call deadlines
+
+    A message waits for its verdict only until its deadline (capped at
+    AI_TIMEOUT), including time spent waiting for a concurrency slot, so a
+    slow ai-personality can never hold a message longer than its budget.
+    A call that already holds a slot keeps running up to AI_TIMEOUT after
+    the message gave up on it: the breaker records the upstream's real
+    latency and outcome, measured from the moment the call got its slot, so
+    local queueing and short message budgets never count against a healthy
+    upstream.
+    """
+
+    def __init__(self):
+        self._client: Optional[httpx.AsyncClient] = None
+        self._slots = asyncio.Semaphore(settings.AI_CONCURRENCY)
+        self._calls: Set[asyncio.Task] = set()
+        self.breaker = CircuitBreaker(
+            window=settings.AI_BREAKER_WINDOW,
+            min_requests=settings.AI_BREAKER_MIN_REQUESTS,
+            max_error_rate=settings.AI_BREAKER_ERROR_RATE,
+            max_latency=settings.AI_BREAKER_LATENCY_MS / 1000,
+            cooldown=settings.AI_BREAKER_COOLDOWN,
+        )
+        self.counters = {
+            "requests": 0,
+            "timeouts": 0,
+            "errors": 0,
+            "short_circuited": 0,
+            "budget_exhausted": 0,
+        }
+
+    def _get_client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                base_url=settings.AI_PERSONALITY_URL,
+                limits=httpx.Limits(
+                    max_connections=settings.AI_MAX_CONNECTIONS,
+                    max_keepalive_connections=settings.AI_MAX_CONNECTIONS,
+                ),
+                timeout=settings.AI_TIMEOUT,
+            )
+        return self._client
+
+    async def classify(self, message: str, deadline: Optional[float] = None) -> Optional[Dict[str, any]]:
+        """
+        Ask ai-personality whether a message is toxic
+
+        deadline is an event-loop time; returns None when the circuit is open,
+        the budget is spent, or the call fails.
+        """
+        if not self.breaker.allow():
+            self.counters["short_circuited"] += 1
+            return None
+
+        loop = asyncio.get_running_loop()
+        budget = settings.AI_TIMEOUT
+        if deadline is not None:
+            budget = min(budget, deadline - loop.time())
+        if budget <= 0:
+            self.counters["budget_exhausted"] += 1
+            self.breaker.release_probe()
+            return None
+
+        self.counters["requests"] += 1
+        sent = asyncio.Event()
+        call = asyncio.create_task(self._call(message, sent))
+        self._calls.add(call)
+        call.add_done_callback(self._calls.discard)
+        try:
+            return await asyncio.wait_for(asyncio.shield(call), budget)
+        except asyncio.TimeoutError:
+            self.counters["budget_exhausted"] += 1
+            if not sent.is_set():
+                # Still queued for a slot: the upstream never saw it
+                call.cancel()
+                self.breaker.release_probe()
+            return None
+
+    async def _call(self, message: str, sent: asyncio.Event) -> Optional[Dict[str, any]]:
+        """One upstream call, timed from when it gets a concurrency slot"""
+        async with self._slots:
+            sent.set()
+            started = time.monotonic()
+            try:
+                verdict = await asyncio.wait_for(self._post(message), settings.AI_TIMEOUT)
+            except asyncio.TimeoutError:
+                self.counters["timeouts"] += 1
+                self.breaker.record(False, time.monotonic() - started)
+                return None
+            except Exception as e:
+                self.counters["errors"] += 1
+                self.breaker.record(False, time.monotonic() - started)
+                logger.warning(f"AI moderation check failed: {e}")
+                return None
+
+        self.breaker.record(verdict is not None, time.monotonic() - started)
+        return verdict
+
+    async def _post(self, message: str) -> Optional[Dict[str, any]]:
+        response = await self._get_client().post(
+            "/api/v1/chat",
+            json={
+                "message": PROMPT.format(message=message),
+                "platform": "moderation",
+            },
+        )
+
+        if response.status_code != 200:
+            return None
+
+        ai_response = response.json().get("response", "").strip()
+        if ai_response.startswith("TOXIC"):
+            reason = ai_response.replace("TOXIC:", "").strip()
+            return {
+                "is_toxic": True,
+                "reason": f"AI: {reason}",
+            }
+
+        return {"is_toxic": False, "reason": None}
+
+    def get_metrics(self) -> Dict[str, any]:
+        return {
+            **self.counters,
+            "circuit_state": self.breaker.state,
+            "circuit_opened": self.breaker.times_opened,
+            "circuit_open_seconds": round(self.breaker.open_seconds, 3),
+        }
+
+    async def close(self):
+        for call in list(self._calls):
+            call.cancel()
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
@@ -0,0 +1,170 @@
+"""
+Micro-batching scheduler for blocking model inference
+"""
+import asyncio
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class InferenceBatcher:
+    """
+    Collect concurrent inference requests into batches
+
+    Requests queue up for at most max_wait_ms (or until max_batch_size items
+    are waiting) and are then handed to predict_fn as one list on a dedicated
+    thread pool, so the event loop never blocks on the model. While every
+    worker is busy the queue keeps filling and the next batch grows, which is
+    what keeps throughput up under load.
+    """
+
+    def __init__(
+        self,
+        predict_fn: Callable[[List[Any]], List[Any]],
+        max_batch_size: int = 32,
+        max_wait_ms: float = 5.0,
+        workers: int = 1,
+        max_queue: int = 0,
+        name: str = "inference",
+    ):
+        self._predict = predict_fn
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000
+        self.workers = max(1, workers)
+        self.max_queue = max_queue
+        self.name = name
+
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix=name)
+        self._queue: Optional[asyncio.Queue] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._collector: Optional[asyncio.Task] = None
+        self._in_flight = set()
+
+        # Metrics
+        self._batches = 0
+        self._items = 0
+        self._max_batch = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self._infer_total = 0.0
+        self._errors = 0
+
+    @property
+    def queue_depth(self) -> int:
+        """Requests waiting to be batched"""
+        return self._queue.qsize() if self._queue else 0
+
+    @property
+    def saturated(self) -> bool:
+        """True when the queue has reached max_queue (never, if unbounded)"""
+        return bool(self.max_queue) and self.queue_depth >= self.max_queue
+
+    async def submit(self, item: Any) -> Any:
+        """Queue one item and wait for its result"""
+        return await self._enqueue(item)
+
+    async def submit_many(self, items: List[Any]) -> List[Any]:
+        """Queue several items; results come back in order"""
+        futures = [self._enqueue(item) for item in items]
+        return list(await asyncio.gather(*futures))
+
+    def _enqueue(self, item: Any) -> asyncio.Future:
+        self._ensure_started()
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((item, future, time.perf_counter()))
+        return future
+
+    def _ensure_started(self):
+        if self._collector is None or self._collector.done():
+            self._queue = self._queue or asyncio.Queue()
+            self._slots = asyncio.Semaphore(self.workers)
+            self._collector = asyncio.get_running_loop().create_task(self._collect())
+
+    async def _collect(self):
+        """Form batches and dispatch them, one per free worker"""
+        loop = asyncio.get_running_loop()
+        queue = self._queue
+
+        while True:
+            batch = [await queue.get()]
+            deadline = loop.time() + self.max_wait
+
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+
+            # Wait for a free worker, then sweep up whatever arrived meanwhile
+            await self._slots.acquire()
+            while len(batch) < self.max_batch_size and not queue.empty():
+                batch.append(queue.get_nowait())
+
+            task = loop.create_task(self._dispatch(batch))
+            self._in_flight.add(task)
+            task.add_done_callback(self._in_flight.discard)
+
+    async def _dispatch(self, batch: List[tuple]):
+        loop = asyncio.get_running_loop()
+        started = time.perf_counter()
+        items = [item for item, _, _ in batch]
+
+        for _, _, enqueued in batch:
+            waited = started - enqueued
+            self._wait_total += waited
+            self._wait_max = max(self._wait_max, waited)
+
+        try:
+            results = await loop.run_in_executor(self._executor, self._predict, items)
+        except Exception as e:
+            self._errors += 1
+            logger.error(f"{self.name} batch of {len(items)} failed: {e}")
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+        else:
+            for (_, future, _), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+        finally:
+            self._slots.release()
+            self._batches += 1
+            self._items += len(items)
+            self._max_batch = max(self._max_batch, len(items))
+            self._infer_total += time.perf_counter() - started
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Batch size, queue depth and wait-time metrics"""
+        batches = max(self._batches, 1)
+        items = max(self._items, 1)
+        return {
+            "batches": self._batches,
+            "messages": self._items,
+            "errors": self._errors,
+            "avg_batch_size": round(self._items / batches, 2),
+            "max_batch_size": self._max_batch,
+            "queue_depth": self.queue_depth,
+            "in_flight_batches": len(self._in_flight),
+            "avg_wait_ms": round(self._wait_total / items * 1000, 3),
+            "max_wait_ms": round(self._wait_max * 1000, 3),
+            "avg_batch_ms": round(self._infer_total / batches * 1000, 3),
+        }
+
+    async def close(self):
+        """Stop collecting and release the worker pool"""
+        if self._collector:
+            self._collector.cancel()
+            try:
+                await self._collector
+            except asyncio.CancelledError:
+                pass
+            self._collector = None
+        if self._in_flight:
+            await asyncio.gather(*self._in_flight, return_exceptions=True)
+        self._executor.shutdown(wait=False)
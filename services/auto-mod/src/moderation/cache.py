@@ -0,0 +1,222 @@
+"""
+Bounded result caches
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class TTLCache:
+    """LRU cache whose entries also expire after ttl seconds"""
+
+    def __init__(self, maxsize: int = 10000, ttl: float = 3600):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        entry = self._data.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        value, expires = entry
+        if expires < time.monotonic():
+            del self._data[key]
+            self.misses += 1
+            return None
+
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        self._data[key] = (value, time.monotonic() + (self.ttl if ttl is None else ttl))
+        self._data.move_to_end(key)
+        if len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def pop(self, key: Hashable):
+        self._data.pop(key, None)
+
+    def clear(self):
+        self._data.clear()
+
+    def get_metrics(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+class ResultCache:
+    """
+    Two-tier result cache: in-process LRU in front of a shared Redis tier
+
+    Lookups go local -> Redis -> compute. Concurrent misses for the same key
+    share one computation, so a raid of identical messages is scored once
+    even before the first result lands in the cache. None results are never
+    cached.
+    """
+
+    def __init__(self, prefix: str, maxsize: int = 50000, ttl: float = 3600, redis_client=None):
+        self.prefix = prefix
+        self.local = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._redis = redis_client
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+        self.local_hits = 0
+        self.redis_hits = 0
+        self.coalesced = 0
+        self.misses = 0
+        self.redis_errors = 0
+
+    @staticmethod
+    def digest(text: str) -> str:
+        return hashlib.blake2b(text.encode(), digest_size=16).hexdigest()
+
+    async def get_or_compute(
+        self,
+        namespace: str,
+        keys: List[str],
+        items: List[Any],
+        compute: Callable[[List[Any]], Awaitable[List[Any]]],
+        ttl: Optional[float] = None,
+    ) -> List[Any]:
+        """
+        Resolve one value per key, computing misses with compute(items)
+
+        keys and items are parallel lists; compute receives the items for
+        distinct missing keys and must return values in the same order.
+        """
+        ttl = self.local.ttl if ttl is None else ttl
+        full_keys = [f"{self.prefix}:{namespace}:{key}" for key in keys]
+        results: List[Any] = [None] * len(keys)
+        pending = []
+
+        # 1. In-process tier
+        for i, key in enumerate(full_keys):
+            value = self.local.get(key)
+            if value is None:
+                pending.append(i)
+            else:
+                results[i] = value
+                self.local_hits += 1
+
+        # 2. Shared Redis tier
+        if pending and self._redis is not None:
+            try:
+                raw = await self._redis.mget([full_keys[i] for i in pending])
+            except Exception as e:
+                self.redis_errors += 1
+                logger.debug(f"Result cache Redis lookup failed: {e}")
+                raw = [None] * len(pending)
+
+            still_pending = []
+            for i, value in zip(pending, raw):
+                if value is None:
+                    still_pending.append(i)
+                    continue
+                results[i] = json.loads(value)
+                self.local.set(full_keys[i], results[i], ttl)
+                self.redis_hits += 1
+            pending = still_pending
+
+        if not pending:
+            return results
+
+        # 3. Join in-flight computations, compute the rest once per key
+        waiting: Dict[int, asyncio.Future] = {}
+        to_compute: Dict[str, Any] = {}
+        for i in pending:
+            key = full_keys[i]
+            future = self._inflight.get(key)
+            if future is not None:
+                waiting[i] = future
+                self.coalesced += 1
+            elif key in to_compute:
+                self.coalesced += 1
+            else:
+                to_compute[key] = items[i]
+                self.misses += 1
+
+        if to_compute:
+            loop = asyncio.get_running_loop()
+            owned = {}
+            for key in to_compute:
+                owned[key] = loop.create_future()
+                self._inflight[key] = owned[key]
+
+            try:
+                values = await compute(list(to_compute.values()))
+            except BaseException as e:
+                for key, future in owned.items():
+                    self._inflight.pop(key, None)
+                    if isinstance(e, Exception):
+                        future.set_exception(e)
+                        future.exception()  # Mark retrieved; joiners re-raise it
+                    else:
+                        future.cancel()
+                raise
+
+            computed = dict(zip(to_compute, values))
+            for key, future in owned.items():
+                self._inflight.pop(key, None)
+                future.set_result(computed[key])
+            await self._store(computed, ttl)
+
+            for i in pending:
+                if i not in waiting:
+                    results[i] = computed[full_keys[i]]
+
+        for i, future in waiting.items():
+            results[i] = await future
+
+        return results
+
+    async def _store(self, values: Dict[str, Any], ttl: float):
+        cacheable = {key: value for key, value in values.items() if value is not None}
+        if not cacheable:
+            return
+
+        for key, value in cacheable.items():
+            self.local.set(key, value, ttl)
+
+        if self._redis is None:
+            return
+        try:
+            pipe = self._redis.pipeline(transaction=False)
+            for key, value in cacheable.items():
+                pipe.set(key, json.dumps(value), ex=max(1, int(ttl)))
+            await pipe.execute()
+        except Exception as e:
+            self.redis_errors += 1
+            logger.debug(f"Result cache Redis write failed: {e}")
+
+    def get_metrics(self) -> Dict[str, Any]:
+        lookups = self.local_hits + self.redis_hits + self.coalesced + self.misses
+        hits = self.local_hits + self.redis_hits + self.coalesced
+        return {
+            "local_size": len(self.local),
+            "local_hits": self.local_hits,
+            "redis_hits": self.redis_hits,
+            "coalesced": self.coalesced,
+            "misses": self.misses,
+            "redis_errors": self.redis_errors,
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+        }
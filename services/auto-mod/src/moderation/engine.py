@@ -1,14 +1,14 @@
 """
 Main Moderation Engine
 """
+import asyncio
 import logging
 from typing import Dict, List, Optional
-from datetime import datetime
 
 from ..config import settings
-from .toxicity import toxicity_detector
-from .spam import spam_detector
-from .filter import content_filter
+from .pipeline import ModerationContext, moderation_pipeline
+from .policy import policy_registry
+from .state import window_store
 
 logger = logging.getLogger(__name__)
 
@@ -17,7 +17,9 @@ class ModerationEngine:
     """Main moderation engine combining all checks"""
 
     def __init__(self):
-        self.violations_log = {}  # user_id -> [violation_timestamp, ...]
+        self.store = window_store  # Shared violation windows (Redis or in-process)
+        self.pipeline = moderation_pipeline
+        self.policies = policy_registry  # Compiled per-channel overrides
 
     async def moderate_message(
         self,
@@ -40,48 +42,80 @@ class ModerationEngine:
                 "violations": list,
                 "scores": dict,
                 "actions": list,
-                "reason": str
+                "reason": str,
+                "timings": dict,  # stage -> ms
+                "skipped_stages": list
             }
         """
-        # Check whitelist
-        if user_roles and any(role in settings.WHITELIST_ROLES for role in user_roles):
-            return self._create_response(
-                should_delete=False,
-                should_timeout=False,
-                should_ban=False,
-                violations=[],
-                reason="Whitelisted user"
-            )
+        results = await self.moderate_batch([{
+            "message": message,
+            "user_id": user_id,
+            "username": username,
+            "platform": platform,
+            "channel_id": channel_id,
+            "user_roles": user_roles,
+        }])
+        return results[0]
+
+    async def moderate_batch(self, messages: List[Dict]) -> List[Dict[str, any]]:
+        """
+        Moderate many messages at once
+
+        Each item carries the same fields as moderate_message(). Messages go
+        through the staged pipeline together, so filter scans and toxicity
+        scoring run as batches. Results are returned in input order.
 
-        if user_id in settings.WHITELIST_USERS:
-            return self._create_response(
-                should_delete=False,
-                should_timeout=False,
-                should_ban=False,
-                violations=[],
-                reason="Whitelisted user"
+        Each message is checked against its channel's compiled policy;
+        messages from channels with the same policy share a pipeline run.
+        """
+        results: List[Optional[Dict]] = [None] * len(messages)
+        pending = []
+        contexts = []
+        groups: Dict[int, List[ModerationContext]] = {}
+
+        for i, item in enumerate(messages):
+            policy = await self.policies.get(item.get("platform"), item.get("channel_id"))
+            if policy.is_whitelisted(item["user_id"], item.get("user_roles")):
+                results[i] = self._whitelisted_response()
+                continue
+
+            ctx = ModerationContext(
+                message=item["message"],
+                user_id=item["user_id"],
+                user_roles=item.get("user_roles"),
+                platform=item.get("platform"),
+                channel_id=item.get("channel_id"),
+                policy=policy,
             )
+            pending.append(i)
+            contexts.append(ctx)
+            groups.setdefault(id(policy.stages), []).append(ctx)
+
+        if not pending:
+            return results
 
-        violations = []
-        scores = {}
+        await asyncio.gather(*(
+            self.pipeline.run(group, group[0].policy.stages) for group in groups.values()
+        ))
 
-        # 1. Check banned words/phrases
-        filter_result = content_filter.check_content(message)
-        if filter_result["has_violation"]:
-            violations.extend(filter_result["violations"])
-            scores["filter"] = 1.0
+        for i, ctx in zip(pending, contexts):
+            results[i] = await self._decide(ctx)
 
-        # 2. Check toxicity
-        toxicity_result = await toxicity_detector.check_toxicity(message)
-        if toxicity_result["is_toxic"]:
-            violations.append(f"Toxic content: {toxicity_result['reason']}")
-            scores["toxicity"] = toxicity_result["toxicity_score"]
+        return results
 
-        # 3. Check spam
-        spam_result = await spam_detector.check_spam(message, user_id, user_roles)
-        if spam_result["is_spam"]:
-            violations.extend([f"Spam: {r}" for r in spam_result["reasons"]])
-            scores["spam"] = spam_result["spam_score"]
+    def _whitelisted_response(self) -> Dict:
+        return self._create_response(
+            should_delete=False,
+            should_timeout=False,
+            should_ban=False,
+            violations=[],
+            reason="Whitelisted user"
+        )
+
+    async def _decide(self, ctx: ModerationContext) -> Dict:
+        """Combine stage results into actions (cutoffs and actions from the channel policy)"""
+        violations, scores = ctx.violations_and_scores()
+        policy = ctx.policy
 
         # Determine actions
         should_delete = False
@@ -91,31 +125,30 @@ class ModerationEngine:
 
         if violations:
             # Record violation
-            self._record_violation(user_id)
+            violation_count = await self._record_violation(ctx.user_id)
 
             # Determine severity
             max_score = max(scores.values()) if scores else 0
 
             # Decide on action
-            if max_score >= 0.9 or len(violations) >= 3:
+            if max_score >= policy.severe_score or len(violations) >= policy.severe_violations:
                 # Severe violation
-                should_delete = settings.AUTO_DELETE
-                should_timeout = settings.AUTO_TIMEOUT
+                should_delete = policy.auto_delete
+                should_timeout = policy.auto_timeout
                 timeout_duration = settings.TIMEOUT_DURATION * 2
 
                 # Check for ban
-                violation_count = len(self.violations_log.get(user_id, []))
                 if violation_count >= settings.VIOLATIONS_FOR_BAN:
-                    should_ban = settings.AUTO_BAN
+                    should_ban = policy.auto_ban
 
-            elif max_score >= 0.7:
+            elif max_score >= policy.moderate_score:
                 # Moderate violation
-                should_delete = settings.AUTO_DELETE
-                should_timeout = settings.AUTO_TIMEOUT
+                should_delete = policy.auto_delete
+                should_timeout = policy.auto_timeout
 
-            elif max_score >= 0.5:
+            elif max_score >= policy.minor_score:
                 # Minor violation
-                should_delete = settings.AUTO_DELETE
+                should_delete = policy.auto_delete
 
         reason = " | ".join(violations) if violations else None
 
@@ -126,22 +159,15 @@ class ModerationEngine:
             timeout_duration=timeout_duration,
             violations=violations,
             scores=scores,
-            reason=reason
+            reason=reason,
+            timings=ctx.timings,
+            skipped_stages=ctx.skipped,
         )
 
-    def _record_violation(self, user_id: str):
-        """Record a violation for a user"""
-        if user_id not in self.violations_log:
-            self.violations_log[user_id] = []
-
-        self.violations_log[user_id].append(datetime.utcnow())
-
-        # Keep only recent violations (last 24 hours)
-        from datetime import timedelta
-        cutoff = datetime.utcnow() - timedelta(hours=24)
-        self.violations_log[user_id] = [
-            ts for ts in self.violations_log[user_id] if ts > cutoff
-        ]
+    async def _record_violation(self, user_id: str) -> int:
+        """Record a violation for a user; returns violations in the window, including this one"""
+        previous = await self.store.append(f"violations:{user_id}", settings.VIOLATION_WINDOW)
+        return previous + 1
 
     def _create_response(
         self,
@@ -151,7 +177,9 @@ class ModerationEngine:
         violations: List[str],
         timeout_duration: int = None,
         scores: Dict = None,
-        reason: str = None
+        reason: str = None,
+        timings: Dict = None,
+        skipped_stages: List[str] = None,
     ) -> Dict:
         """Create standardized response"""
         actions = []
@@ -171,16 +199,17 @@ class ModerationEngine:
             "scores": scores or {},
             "actions": actions,
             "reason": reason,
+            "timings": timings or {},
+            "skipped_stages": skipped_stages or [],
         }
 
-    def get_user_violations(self, user_id: str) -> int:
+    async def get_user_violations(self, user_id: str) -> int:
         """Get number of violations for a user"""
-        return len(self.violations_log.get(user_id, []))
+        return await self.store.count(f"violations:{user_id}", settings.VIOLATION_WINDOW)
 
-    def clear_user_violations(self, user_id: str):
+    async def clear_user_violations(self, user_id: str):
         """Clear violations for a user"""
-        if user_id in self.violations_log:
-            del self.violations_log[user_id]
+        await self.store.clear(f"violations:{user_id}")
 
 
 # Global instance
@@ -0,0 +1,89 @@
+"""
+Message feature extraction for spam scoring
+"""
+import re
+from typing import List, NamedTuple
+
+
+EMOJI_RANGES = '\U0001F600-\U0001F64F\U0001F300-\U0001F5FF\U0001F680-\U0001F6FF\U0001F1E0-\U0001F1FF'
+
+# (head words, tail words): a head followed later on the same line by a tail
+# is a spam pitch, e.g. "buy ... now", "claim ... reward"
+SPAM_KEYWORDS = [
+    (('buy', 'sell', 'cheap', 'discount', 'offer', 'deal'), ('now', 'today', 'limited')),
+    (('click here', 'check out', 'visit', 'go to'), ('link', 'website')),
+    (('free', 'prize', 'winner', 'won', 'claim'), ('money', 'gift', 'reward')),
+    (('dm me', 'message me', 'add me'), ('discord', 'telegram', 'whatsapp')),
+]
+
+# Tails are rarer than heads in normal chat, so look for them first
+_TAILS = [(tail, heads) for heads, tails in SPAM_KEYWORDS for tail in tails]
+
+# Each feature has its own precompiled pattern: matches may overlap (a
+# mention or emoji inside a link, a run that starts a link), so one
+# alternation would let a match of one kind hide another
+LINK = re.compile(r'https?://\S+')
+MENTION = re.compile(r'@\w+')
+RUN = re.compile(r'(.)\1{5,}')
+EMOJI = re.compile(rf'[{EMOJI_RANGES}]')
+ASCII_UPPER = bytes(range(ord('A'), ord('Z') + 1))
+
+
+class MessageFeatures(NamedTuple):
+    """Spam-relevant features of a message"""
+    length: int
+    caps_ratio: float
+    emoji_count: int
+    mention_count: int
+    links: List[str]
+    has_repeated_chars: bool  # Same character 6+ times
+    has_spam_pattern: bool
+
+
+def extract_features(message: str) -> MessageFeatures:
+    """
+    Compute every spam feature of a message
+
+    Each pattern runs only when a substring check says it can match (no
+    "@", no mentions; ASCII text, no emojis), and caps and keyword pitches
+    use C-level string operations instead of per-character Python or
+    per-pattern regex passes.
+    """
+    length = len(message)
+
+    if message.isascii():
+        caps = length - len(message.encode().translate(None, ASCII_UPPER))
+        emojis = 0
+    else:
+        caps = sum(map(str.isupper, message))
+        emojis = len(EMOJI.findall(message))
+
+    return MessageFeatures(
+        length=length,
+        caps_ratio=caps / max(length, 1),
+        emoji_count=emojis,
+        mention_count=len(MENTION.findall(message)) if '@' in message else 0,
+        links=LINK.findall(message) if '://' in message else [],
+        has_repeated_chars=RUN.search(message) is not None,
+        has_spam_pattern=has_spam_pattern(message.lower()),
+    )
+
+
+def has_spam_pattern(lowered: str) -> bool:
+    """True if a head keyword is followed by one of its tails on the same line"""
+    if '\n' in lowered:
+        return any(_line_has_pattern(line) for line in lowered.split('\n'))
+    return _line_has_pattern(lowered)
+
+
+def _line_has_pattern(line: str) -> bool:
+    for tail, heads in _TAILS:
+        last_tail = line.rfind(tail)
+        if last_tail < 0:
+            continue
+        # The earliest occurrence of a head ends first, so it is the one to test
+        for head in heads:
+            start = line.find(head)
+            if 0 <= start and start + len(head) <= last_tail:
+                return True
+    return False
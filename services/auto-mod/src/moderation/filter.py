@@ -2,60 +2,123 @@
 Banned Words and Phrases Filter
 """
 import logging
-import re
-from typing import List, Dict
+from typing import Dict, Iterable, List, Optional
 
 from ..config import settings
+from .matcher import PatternMatcher, normalize_text
 
 logger = logging.getLogger(__name__)
 
 
+class FilterRules:
+    """A compiled set of banned words and phrases (one rule set version)"""
+
+    def __init__(self, version: int = 0):
+        self.version = version
+        self.words = set()
+        self.phrases = []
+        self.matcher = PatternMatcher()
+
+    def add_word(self, word: str):
+        word_lower = word.lower()
+        self.words.add(word_lower)
+        for pattern in ContentFilter._word_patterns(word_lower):
+            self.matcher.add(pattern, ("word", word_lower))
+
+    def add_phrase(self, phrase: str):
+        phrase_lower = phrase.lower()
+        if phrase_lower not in self.phrases:
+            self.phrases.append(phrase_lower)
+            self.matcher.add(phrase_lower, ("phrase", phrase_lower))
+
+    def remove_word(self, word: str):
+        word_lower = word.lower()
+        if word_lower not in self.words:
+            return
+        self.words.discard(word_lower)
+        for pattern in ContentFilter._word_patterns(word_lower):
+            self.matcher.remove(pattern, ("word", word_lower))
+
+
 class ContentFilter:
-    """Filter banned words and phrases"""
+    """
+    Filter banned words and phrases
+
+    Scans read self.rules once, so a reload can compile a new FilterRules
+    off to the side and swap it in with a single assignment.
+    """
 
     def __init__(self):
-        self.banned_words = set(settings.BANNED_WORDS)
-        self.banned_phrases = settings.BANNED_PHRASES
-        self.word_variants = {}  # word -> [variants with common bypasses]
+        self.rules = self.compile(settings.BANNED_WORDS, settings.BANNED_PHRASES)
+
+    @staticmethod
+    def compile(words: Iterable[str], phrases: Iterable[str], version: int = 0) -> FilterRules:
+        """Build a complete rule set (safe to run off the event loop)"""
+        rules = FilterRules(version)
+        for word in words:
+            rules.add_word(word)
+        for phrase in phrases:
+            rules.add_phrase(phrase)
+        rules.matcher.scan("")  # Build failure links now, not on the first message
+        return rules
+
+    def swap(self, rules: FilterRules):
+        """Atomically replace the active rule set"""
+        self.rules = rules
+
+    @property
+    def version(self) -> int:
+        return self.rules.version
+
+    @property
+    def banned_words(self) -> set:
+        return self.rules.words
+
+    @property
+    def banned_phrases(self) -> List[str]:
+        return self.rules.phrases
+
+    @property
+    def matcher(self) -> PatternMatcher:
+        return self.rules.matcher
 
     def add_banned_word(self, word: str):
         """Add a word to the banned list"""
-        self.banned_words.add(word.lower())
-        self._generate_variants(word)
+        self.rules.add_word(word)
+        self.rules.version += 1  # Memory mode only: reported back by the admin routes, not propagated
 
-    def _generate_variants(self, word: str):
-        """Generate common bypass variants of a word"""
-        word_lower = word.lower()
-        variants = [word_lower]
-
-        # Common character substitutions
-        substitutions = {
-            'a': ['@', '4', 'α'],
-            'e': ['3', 'ε'],
-            'i': ['1', '!', 'í'],
-            'o': ['0', 'ο'],
-            's': ['$', '5', 'ς'],
-            't': ['7', '+'],
-            'l': ['1', '|'],
-        }
+    @staticmethod
+    def _word_patterns(word: str) -> List[str]:
+        """
+        Patterns for a word and its common bypass variants
 
-        # Generate variants with substitutions (limited to avoid explosion)
-        for char, subs in substitutions.items():
-            if char in word_lower:
-                for sub in subs:
-                    variants.append(word_lower.replace(char, sub))
+        Confusables (@, 3, $, ...) and separators (b.a.d) are folded away by the
+        matcher itself, so only the ambiguous '1' (i or l) and spaced-out
+        letters need explicit variants.
+        """
+        folded = normalize_text(word)
+        variants = {folded}
 
-        # Add spaces between characters
-        variants.append(' '.join(word_lower))
+        if 'i' in folded:
+            variants.add(folded.replace('i', '1'))
+        if 'l' in folded:
+            variants.add(folded.replace('l', '1'))
+        if 'i' in folded and 'l' in folded:
+            variants.add(folded.replace('i', '1').replace('l', '1'))
 
-        # Add dots between characters
-        variants.append('.'.join(word_lower))
+        # Add spaces between characters
+        compact = folded.replace(' ', '')
+        if len(compact) > 1:
+            variants.add(' '.join(compact))
 
-        self.word_variants[word_lower] = variants
+        return sorted(variants)
 
-    def check_content(self, message: str) -> Dict[str, any]:
+    def check_content(self, message: str, extra: Optional[FilterRules] = None) -> Dict[str, any]:
         """
-        Check message for banned content
+        Check message for banned content (the shared rule set, plus a channel's extra rules)
+
+        The message is normalized once by the shared scan; extra rules run
+        their own small automaton over that normalized text.
 
         Returns:
             {
@@ -65,39 +128,30 @@ class ContentFilter:
             }
         """
         violations = []
-        message_lower = message.lower()
-
-        # Remove special characters for checking
-        clean_message = re.sub(r'[^a-z0-9\s]', '', message_lower)
-
-        # Check banned words
-        for word in self.banned_words:
-            # Check exact word (with word boundaries)
-            if re.search(rf'\b{re.escape(word)}\b', message_lower):
-                violations.append(f"Banned word: {word}")
-
-            # Check in clean message (handles l33tspeak)
-            if word in clean_message:
-                violations.append(f"Banned word (obfuscated): {word}")
-
-            # Check variants
-            if word in self.word_variants:
-                for variant in self.word_variants[word]:
-                    if variant in message_lower:
-                        violations.append(f"Banned word (variant): {word}")
-                        break
-
-        # Check banned phrases
-        for phrase in self.banned_phrases:
-            if phrase.lower() in message_lower:
-                violations.append(f"Banned phrase: {phrase}")
+        seen = set()
+        spans = []
+
+        shared = self.rules.matcher
+        scan = shared.scan(message)
+        matches = [(hit, shared) for hit in scan.hits]
+        if extra is not None:
+            matches.extend((hit, extra.matcher) for hit in extra.matcher.search(scan.text))
+
+        for (start, end, pattern), matcher in matches:
+            orig_start = scan.positions[start]
+            orig_end = scan.positions[end - 1] + 1
+            spans.append((orig_start, orig_end))
+
+            for key in matcher.owners(pattern):
+                if key in seen:
+                    continue
+                seen.add(key)
+                violations.append(self._describe(key, pattern, message, orig_start, orig_end))
 
         # Create filtered message
         filtered_message = message
-        if violations:
-            for word in self.banned_words:
-                pattern = re.compile(re.escape(word), re.IGNORECASE)
-                filtered_message = pattern.sub('***', filtered_message)
+        if spans:
+            filtered_message = self._mask(message, spans)
 
         return {
             "has_violation": len(violations) > 0,
@@ -105,17 +159,58 @@ class ContentFilter:
             "filtered_message": filtered_message,
         }
 
+    def check_batch(self, messages: List[str], extra: Optional[FilterRules] = None) -> List[Dict[str, any]]:
+        """Check several messages against the same compiled matchers"""
+        return [self.check_content(message, extra) for message in messages]
+
+    def _describe(self, key, pattern: str, message: str, start: int, end: int) -> str:
+        """Describe a match (original coordinates) by how the word was disguised"""
+        kind, value = key
+        if kind == "phrase":
+            return f"Banned phrase: {value}"
+
+        whole_word = (
+            (start == 0 or not message[start - 1].isalnum())
+            and (end == len(message) or not message[end].isalnum())
+        )
+        original = message[start:end].lower()
+
+        if original == value:
+            if whole_word:
+                return f"Banned word: {value}"
+            return f"Banned word (obfuscated): {value}"
+
+        # Same length means characters were swapped, not padded with separators
+        if len(original) == len(pattern):
+            return f"Banned word (variant): {value}"
+        return f"Banned word (obfuscated): {value}"
+
+    def _mask(self, message: str, spans: List[tuple]) -> str:
+        """Replace matched spans (original coordinates) with ***"""
+        spans.sort()
+        parts = []
+        cursor = 0
+        for start, end in spans:
+            if end <= cursor:
+                continue
+            if start < cursor:
+                start = cursor
+            else:
+                parts.append(message[cursor:start])
+                parts.append('***')
+            cursor = end
+        parts.append(message[cursor:])
+        return ''.join(parts)
+
     def add_phrase(self, phrase: str):
         """Add a phrase to the banned list"""
-        if phrase not in self.banned_phrases:
-            self.banned_phrases.append(phrase.lower())
+        self.rules.add_phrase(phrase)
+        self.rules.version += 1
 
     def remove_word(self, word: str):
         """Remove a word from the banned list"""
-        word_lower = word.lower()
-        self.banned_words.discard(word_lower)
-        if word_lower in self.word_variants:
-            del self.word_variants[word_lower]
+        self.rules.remove_word(word)
+        self.rules.version += 1
 
     def get_banned_words(self) -> List[str]:
         """Get list of banned words"""
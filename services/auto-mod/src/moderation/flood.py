@@ -0,0 +1,178 @@
+"""
+Message-rate flood detection (token buckets in Redis with an in-process fallback)
+"""
+import logging
+import math
+import time
+from collections import OrderedDict
+from typing import List, Optional, Sequence, Tuple
+
+from ..config import settings
+from .state import get_redis
+
+logger = logging.getLogger(__name__)
+
+
+# Refill and take one token from each bucket in a single call. ARGV holds
+# (burst, rate) per key. Returns 1 per bucket that was already empty.
+# Time comes from the Redis server so every replica shares one clock.
+TAKE_SCRIPT = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local limited = {}
+for i = 1, #KEYS do
+    local burst = tonumber(ARGV[i * 2 - 1])
+    local rate = tonumber(ARGV[i * 2])
+    local bucket = redis.call('HMGET', KEYS[i], 'tokens', 'ts')
+    local tokens = tonumber(bucket[1]) or burst
+    local last = tonumber(bucket[2]) or now
+    tokens = math.min(burst, tokens + math.max(0, now - last) * rate)
+    limited[i] = 0
+    if tokens >= 1 then
+        tokens = tokens - 1
+    else
+        limited[i] = 1
+    end
+    redis.call('HSET', KEYS[i], 'tokens', tostring(tokens), 'ts', tostring(now))
+    redis.call('EXPIRE', KEYS[i], math.ceil(burst / rate) + 1)
+end
+return limited
+"""
+
+# (burst, refill rate in tokens/sec)
+Bucket = Tuple[float, float]
+
+
+class MemoryBucketStore:
+    """
+    In-process token buckets
+
+    Each key holds (tokens, last refill) in LRU order; keys are evicted past
+    max_keys. A full bucket carries no information, so dropping it is exact.
+    """
+
+    def __init__(self, max_keys: int = 100000):
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+
+    async def take(self, keys: Sequence[str], buckets: Sequence[Bucket]) -> List[bool]:
+        """Take one token from each bucket; True where the bucket was empty"""
+        now = time.monotonic()
+        limited = []
+        for key, (burst, rate) in zip(keys, buckets):
+            tokens, last = self._buckets.get(key, (burst, now))
+            tokens = min(burst, tokens + max(0.0, now - last) * rate)
+            if tokens >= 1:
+                tokens -= 1
+                limited.append(False)
+            else:
+                limited.append(True)
+            self._buckets[key] = (tokens, now)
+            self._buckets.move_to_end(key)
+            if len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        return limited
+
+
+class RedisBucketStore:
+    """
+    Token buckets as Redis hashes {tokens, ts}
+
+    All of a message's buckets are refilled and drawn from in one Lua call;
+    each key expires once it would have refilled completely, so memory is
+    constant per active user or channel. If Redis is unreachable the
+    in-process store takes over until it recovers.
+    """
+
+    def __init__(self, client, prefix: str, fallback: MemoryBucketStore):
+        self.prefix = prefix
+        self.fallback = fallback
+        self._redis = client
+        self._take = client.register_script(TAKE_SCRIPT)
+        self._degraded = False
+
+    async def take(self, keys: Sequence[str], buckets: Sequence[Bucket]) -> List[bool]:
+        args = [value for bucket in buckets for value in bucket]
+        try:
+            limited = await self._take(keys=[f"{self.prefix}:{key}" for key in keys], args=args)
+            if self._degraded:
+                logger.info("Redis flood buckets recovered")
+                self._degraded = False
+            return [bool(int(flag)) for flag in limited]
+        except Exception as e:
+            if not self._degraded:
+                logger.warning(f"Redis flood buckets unavailable, using in-process fallback: {e}")
+                self._degraded = True
+            return await self.fallback.take(keys, buckets)
+
+
+class FloodDetector:
+    """
+    Per-user and per-channel message rate limits
+
+    A user may post user_burst messages at once and user_rate per second
+    after that. A channel over its own limits is not a violation by itself
+    (most of its users did nothing wrong); it switches its users to the
+    stricter busy bucket, so in a flooded channel a lower personal rate
+    already counts as flooding. Unlike repeat detection this catches bursts
+    of unique messages.
+    """
+
+    def __init__(self, store, user_bucket: Bucket, channel_bucket: Bucket, busy_user_bucket: Bucket):
+        self.store = store
+        self.user_bucket = user_bucket
+        self.channel_bucket = channel_bucket
+        self.busy_user_bucket = busy_user_bucket
+        self.checked = 0
+        self.user_floods = 0
+        self.channel_floods = 0
+
+    async def check(self, user_id: str, channel_id: Optional[str]) -> Tuple[bool, bool]:
+        """Record a message; returns (user flooding, channel over its rate)"""
+        keys = [f"flood:user:{user_id}"]
+        buckets = [self.user_bucket]
+        if channel_id:
+            # The busy bucket is always drawn from, so it knows the user's
+            # recent rate the moment the channel floods
+            keys += [f"flood:channel:{channel_id}", f"flood:busy:{channel_id}:{user_id}"]
+            buckets += [self.channel_bucket, self.busy_user_bucket]
+
+        limited = await self.store.take(keys, buckets)
+        channel_flood = len(limited) > 1 and limited[1]
+        user_flood = limited[0] or (channel_flood and limited[2])
+
+        self.checked += 1
+        self.user_floods += user_flood
+        self.channel_floods += channel_flood
+        return user_flood, channel_flood
+
+    def get_metrics(self):
+        return {
+            "checked": self.checked,
+            "user_floods": self.user_floods,
+            "channel_floods": self.channel_floods,
+        }
+
+
+def _bucket(burst: float, rate: float) -> Bucket:
+    if burst < 1 or rate <= 0 or math.isinf(rate):
+        raise ValueError("flood buckets need burst >= 1 and a finite rate > 0")
+    return float(burst), float(rate)
+
+
+def create_flood_detector() -> FloodDetector:
+    """FloodDetector on the configured state backend"""
+    fallback = MemoryBucketStore(max_keys=settings.STATE_MAX_KEYS)
+    store = fallback
+    if settings.STATE_BACKEND == "redis":
+        try:
+            store = RedisBucketStore(get_redis(), prefix=settings.STATE_KEY_PREFIX, fallback=fallback)
+        except Exception as e:
+            logger.warning(f"Redis flood buckets unavailable, using in-process state: {e}")
+
+    return FloodDetector(
+        store,
+        user_bucket=_bucket(settings.FLOOD_USER_BURST, settings.FLOOD_USER_RATE),
+        channel_bucket=_bucket(settings.FLOOD_CHANNEL_BURST, settings.FLOOD_CHANNEL_RATE),
+        busy_user_bucket=_bucket(settings.FLOOD_BUSY_USER_BURST, settings.FLOOD_BUSY_USER_RATE),
+    )
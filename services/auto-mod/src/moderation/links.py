@@ -0,0 +1,149 @@
+"""
+Link safety checks (offline)
+"""
+import logging
+from functools import lru_cache
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Optional
+from urllib.parse import urlsplit
+
+import tldextract
+import validators
+
+from ..config import settings
+from .cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+
+class DomainSuffixIndex:
+    """
+    Reversed-label trie for domain suffix rules
+
+    "twitch.tv" is stored as tv -> twitch, so a lookup for "clips.twitch.tv"
+    walks at most one node per label regardless of how many rules exist.
+    """
+
+    ALLOW = 1
+    BLOCK = 2
+
+    def __init__(self):
+        self._root: Dict[str, dict] = {}
+
+    def add(self, domain: str, verdict: int):
+        node = self._root
+        for label in reversed(domain.lower().strip('.').split('.')):
+            node = node.setdefault(label, {})
+        node[''] = node.get('', 0) | verdict
+
+    def match(self, domain: str) -> int:
+        """Union of verdicts for every rule that is a suffix of domain (0 if none)"""
+        verdict = 0
+        node = self._root
+        for label in reversed(domain.split('.')):
+            node = node.get(label)
+            if node is None:
+                break
+            verdict |= node.get('', 0)
+        return verdict
+
+
+class LinkChecker:
+    """
+    Decide whether a link points to an allowed domain
+
+    Domains are resolved against a public suffix snapshot that ships with
+    tldextract (or PUBLIC_SUFFIX_LIST_FILE), never fetched at runtime.
+    Verdicts are cached per registered domain with LRU + TTL bounds, so
+    endlessly unique spam URLs cannot grow memory.
+    """
+
+    def __init__(
+        self,
+        allowed: Iterable[str],
+        blocked: Iterable[str],
+        cache_size: int = 10000,
+        cache_ttl: float = 3600,
+        suffix_list_file: Optional[str] = None,
+        resolver: Optional[Callable[[str], str]] = None,
+    ):
+        self.index = DomainSuffixIndex()
+        self.has_allowlist = False
+        for domain in allowed:
+            self.index.add(domain, DomainSuffixIndex.ALLOW)
+            self.has_allowlist = True
+        for domain in blocked:
+            self.index.add(domain, DomainSuffixIndex.BLOCK)
+
+        self.cache = TTLCache(maxsize=cache_size, ttl=cache_ttl)
+
+        # Checkers with their own rules (e.g. per channel) can share another
+        # checker's host -> domain resolver instead of loading the suffix list
+        if resolver is not None:
+            self._registered_domain = resolver
+            return
+
+        suffix_list_urls = ()
+        if suffix_list_file:
+            suffix_list_urls = (Path(suffix_list_file).resolve().as_uri(),)
+        self._extractor = tldextract.TLDExtract(
+            cache_dir=None,
+            suffix_list_urls=suffix_list_urls,
+            fallback_to_snapshot=True,
+        )
+        self._registered_domain = lru_cache(maxsize=cache_size)(self._resolve_domain)
+
+    @property
+    def resolver(self) -> Callable[[str], str]:
+        """Cached host -> registered domain lookup"""
+        return self._registered_domain
+
+    def _resolve_domain(self, host: str) -> str:
+        extracted = self._extractor(host)
+        return f"{extracted.domain}.{extracted.suffix}"
+
+    def is_safe(self, url: str) -> bool:
+        """Check if link is safe"""
+        # Validate URL format
+        if not validators.url(url):
+            return False
+
+        host = (urlsplit(url).hostname or "").rstrip('.')
+        domain = self._registered_domain(host)
+
+        verdict = self.cache.get(domain)
+        if verdict is None:
+            verdict = self._evaluate(domain)
+            self.cache.set(domain, verdict)
+        return verdict
+
+    def _evaluate(self, domain: str) -> bool:
+        matched = self.index.match(domain)
+
+        # Check blocked domains
+        if matched & DomainSuffixIndex.BLOCK:
+            return False
+
+        # Check allowed domains
+        if self.has_allowlist:
+            return bool(matched & DomainSuffixIndex.ALLOW)
+
+        # Default to safe if no restrictions
+        return True
+
+    def get_metrics(self) -> Dict[str, any]:
+        info = self._registered_domain.cache_info()
+        return {
+            "verdicts": self.cache.get_metrics(),
+            "domains": {"size": info.currsize, "hits": info.hits, "misses": info.misses},
+        }
+
+
+def create_link_checker() -> LinkChecker:
+    return LinkChecker(
+        allowed=settings.ALLOWED_DOMAINS,
+        blocked=settings.BLOCKED_DOMAINS,
+        cache_size=settings.LINK_CACHE_SIZE,
+        cache_ttl=settings.LINK_CACHE_TTL,
+        suffix_list_file=settings.PUBLIC_SUFFIX_LIST_FILE,
+    )
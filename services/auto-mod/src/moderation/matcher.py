@@ -0,0 +1,255 @@
+"""
+Multi-pattern matcher (Aho-Corasick) over confusable-normalized text
+"""
+import unicodedata
+from collections import deque
+from typing import Dict, Hashable, List, NamedTuple, Set, Tuple
+
+
+# Characters commonly used to dodge filters, folded to the letter they imitate.
+# '1' is deliberately absent: it stands in for both 'i' and 'l', so pattern
+# variants cover it instead (see ContentFilter._word_patterns).
+CONFUSABLES = {
+    '@': 'a', '4': 'a', 'α': 'a', 'а': 'a',
+    '3': 'e', 'ε': 'e', 'е': 'e',
+    '!': 'i', 'í': 'i', 'ì': 'i', 'і': 'i',
+    '0': 'o', 'ο': 'o', 'о': 'o',
+    '$': 's', '5': 's', 'ς': 's', 'ѕ': 's',
+    '7': 't', '+': 't',
+    '|': 'l',
+    'с': 'c', 'р': 'p', 'х': 'x', 'у': 'y',
+}
+
+_FOLD_CACHE: Dict[str, str] = {}
+
+
+def fold_char(ch: str) -> str:
+    """
+    Fold a single character to its canonical matching form
+
+    Returns a lowercase letter/digit, ' ' for whitespace, or '' for characters
+    that should be skipped (punctuation, symbols, emojis).
+    """
+    folded = _FOLD_CACHE.get(ch)
+    if folded is not None:
+        return folded
+
+    if ch in CONFUSABLES:
+        folded = CONFUSABLES[ch]
+    elif ch.isspace():
+        folded = ' '
+    else:
+        lowered = ch.lower()
+        # Strip accents: 'é' -> 'e', 'İ' -> 'i'
+        base = unicodedata.normalize('NFKD', lowered)[:1]
+        if base.isalnum():
+            folded = CONFUSABLES.get(base, base)
+        else:
+            folded = ''
+
+    _FOLD_CACHE[ch] = folded
+    return folded
+
+
+def normalize_text(text: str) -> str:
+    """Fold text the same way the matcher sees it (case, confusables, whitespace)"""
+    out = []
+    last_space = True
+    for ch in text:
+        c = _FOLD_CACHE.get(ch)
+        if c is None:
+            c = fold_char(ch)
+        if not c:
+            continue
+        if c == ' ':
+            if last_space:
+                continue
+            last_space = True
+        else:
+            last_space = False
+        out.append(c)
+    return ''.join(out).rstrip(' ')
+
+
+class ScanResult(NamedTuple):
+    """Result of a single scan over a message"""
+    text: str  # Normalized message
+    positions: List[int]  # Index in the original message for each normalized char
+    hits: List[Tuple[int, int, str]]  # (start, end, pattern) in normalized coordinates
+
+
+class PatternMatcher:
+    """
+    Aho-Corasick automaton matching many patterns in one pass
+
+    Patterns are folded with normalize_text() and every pattern is owned by one
+    or more keys, so the same folded string can back several rules. Adding a
+    pattern extends the trie in place; failure links are recomputed lazily on
+    the next scan after any change.
+    """
+
+    def __init__(self):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._own: List[Tuple[str, ...]] = [()]  # Patterns ending exactly at node
+        self._out: List[Tuple[str, ...]] = [()]  # Own + suffix outputs (built)
+        self._owners: Dict[str, Set[Hashable]] = {}  # pattern -> keys
+        self._dead_patterns = 0
+        self._dirty = False
+
+    def __len__(self) -> int:
+        return len(self._owners)
+
+    def add(self, pattern: str, key: Hashable) -> str:
+        """Add a pattern owned by key; returns the folded pattern"""
+        folded = normalize_text(pattern)
+        if not folded:
+            return folded
+
+        owners = self._owners.get(folded)
+        if owners is not None:
+            owners.add(key)
+            return folded
+
+        self._owners[folded] = {key}
+        node = 0
+        for c in folded:
+            nxt = self._goto[node].get(c)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto.append({})
+                self._fail.append(0)
+                self._own.append(())
+                self._out.append(())
+                self._goto[node][c] = nxt
+            node = nxt
+        self._own[node] = self._own[node] + (folded,)
+        self._dirty = True
+        return folded
+
+    def remove(self, pattern: str, key: Hashable):
+        """Drop key's ownership of pattern, removing it once unowned"""
+        folded = normalize_text(pattern)
+        owners = self._owners.get(folded)
+        if not owners:
+            return
+
+        owners.discard(key)
+        if owners:
+            return
+
+        del self._owners[folded]
+        node = 0
+        for c in folded:
+            node = self._goto[node][c]
+        self._own[node] = tuple(p for p in self._own[node] if p != folded)
+        self._dead_patterns += 1
+        self._dirty = True
+
+        # Trie nodes are never unlinked; compact once removals dominate
+        if self._dead_patterns > max(len(self._owners), 64):
+            self._compact()
+
+    def owners(self, pattern: str) -> Set[Hashable]:
+        """Keys that own a (folded) pattern"""
+        return self._owners.get(pattern, set())
+
+    def scan(self, text: str) -> ScanResult:
+        """Normalize text and find every pattern occurrence in a single pass"""
+        if self._dirty:
+            self._build()
+
+        goto = self._goto
+        fail = self._fail
+        out = self._out
+        cache = _FOLD_CACHE
+
+        stream: List[str] = []
+        positions: List[int] = []
+        hits: List[Tuple[int, int, str]] = []
+        state = 0
+        last_space = True
+
+        for idx, ch in enumerate(text):
+            c = cache.get(ch)
+            if c is None:
+                c = fold_char(ch)
+            if not c:
+                continue
+            if c == ' ':
+                if last_space:
+                    continue
+                last_space = True
+            else:
+                last_space = False
+
+            stream.append(c)
+            positions.append(idx)
+
+            while state and c not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(c, 0)
+
+            if out[state]:
+                end = len(stream)
+                for pattern in out[state]:
+                    hits.append((end - len(pattern), end, pattern))
+
+        return ScanResult(''.join(stream), positions, hits)
+
+    def search(self, folded: str) -> List[Tuple[int, int, str]]:
+        """Pattern occurrences in text another scan already normalized (ScanResult.text)"""
+        if self._dirty:
+            self._build()
+
+        goto = self._goto
+        fail = self._fail
+        out = self._out
+        hits: List[Tuple[int, int, str]] = []
+        state = 0
+
+        for end, c in enumerate(folded, 1):
+            while state and c not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(c, 0)
+
+            if out[state]:
+                for pattern in out[state]:
+                    hits.append((end - len(pattern), end, pattern))
+
+        return hits
+
+    def _build(self):
+        """Compute failure links and merged outputs (BFS over the trie)"""
+        goto = self._goto
+        fail = self._fail
+        own = self._own
+        out = self._out
+
+        out[0] = own[0]
+        queue = deque()
+        for child in goto[0].values():
+            fail[child] = 0
+            out[child] = own[child]
+            queue.append(child)
+
+        while queue:
+            node = queue.popleft()
+            for c, child in goto[node].items():
+                f = fail[node]
+                while f and c not in goto[f]:
+                    f = fail[f]
+                f = goto[f].get(c, 0)
+                fail[child] = f
+                out[child] = own[child] + out[f] if out[f] else own[child]
+                queue.append(child)
+
+        self._dirty = False
+
+    def _compact(self):
+        """Rebuild the trie from live patterns only"""
+        owners = self._owners
+        self.__init__()
+        for pattern, keys in owners.items():
+            for key in keys:
+                self.add(pattern, key)
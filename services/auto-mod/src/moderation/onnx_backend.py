@@ -0,0 +1,135 @@
+"""
+Quantized ONNX Runtime backend for Detoxify
+"""
+import json
+import logging
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+LABELS_FILE = "labels.json"
+
+
+def model_path(export_dir: str, model_type: str, quantize: bool) -> Path:
+    suffix = "int8" if quantize else "fp32"
+    return Path(export_dir) / f"detoxify-{model_type}-{suffix}.onnx"
+
+
+def export_detoxify(model_type: str, export_dir: str, quantize: bool = True) -> Path:
+    """
+    Export a Detoxify checkpoint to ONNX (int8 dynamic quantization by default)
+
+    The tokenizer and category names are saved next to the model, so loading
+    the export later needs neither torch nor detoxify.
+    """
+    import torch
+    from detoxify import Detoxify
+
+    out_dir = Path(export_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    fp32_path = model_path(export_dir, model_type, quantize=False)
+
+    detoxify = Detoxify(model_type)
+    model = detoxify.model.eval()
+    tokenizer = detoxify.tokenizer
+    input_names = list(tokenizer.model_input_names)
+
+    class Logits(torch.nn.Module):
+        def __init__(self):
+            super().__init__()
+            self.model = model
+
+        def forward(self, *inputs):
+            return self.model(**dict(zip(input_names, inputs)))[0]
+
+    sample = tokenizer(["export sample"], return_tensors="pt", padding=True, truncation=True)
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names}
+    dynamic_axes["logits"] = {0: "batch"}
+
+    with torch.no_grad():
+        torch.onnx.export(
+            Logits(),
+            tuple(sample[name] for name in input_names),
+            str(fp32_path),
+            input_names=input_names,
+            output_names=["logits"],
+            dynamic_axes=dynamic_axes,
+            opset_version=14,
+        )
+
+    path = fp32_path
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        path = model_path(export_dir, model_type, quantize=True)
+        quantize_dynamic(str(fp32_path), str(path), weight_type=QuantType.QInt8)
+
+    tokenizer.save_pretrained(str(out_dir))
+    (out_dir / LABELS_FILE).write_text(json.dumps(list(detoxify.class_names)))
+    logger.info(f"Exported Detoxify '{model_type}' to {path}")
+    return path
+
+
+class OnnxDetoxify:
+    """
+    Drop-in for Detoxify.predict backed by ONNX Runtime on CPU
+
+    predict() returns the same {category: [score, ...]} mapping as Detoxify,
+    with the same category names, so the rest of the detector is unchanged.
+    """
+
+    def __init__(self, model_file: Path, threads: int = 0):
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        export_dir = model_file.parent
+        self.tokenizer = AutoTokenizer.from_pretrained(str(export_dir))
+        self.class_names: List[str] = json.loads((export_dir / LABELS_FILE).read_text())
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.inter_op_num_threads = 1
+        if threads > 0:
+            options.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(
+            str(model_file), options, providers=["CPUExecutionProvider"]
+        )
+        self._input_names = [i.name for i in self.session.get_inputs()]
+
+    @classmethod
+    def load(
+        cls,
+        model_type: str,
+        export_dir: str,
+        quantize: bool = True,
+        threads: int = 0,
+    ) -> "OnnxDetoxify":
+        """Load an existing export, exporting the model first if there is none"""
+        path = model_path(export_dir, model_type, quantize)
+        if not path.exists() or not (path.parent / LABELS_FILE).exists():
+            path = export_detoxify(model_type, export_dir, quantize)
+        return cls(path, threads)
+
+    def predict(self, texts: List[str]) -> Dict[str, List[float]]:
+        encoded = self.tokenizer(texts, return_tensors="np", padding=True, truncation=True)
+        feed = {name: encoded[name].astype(np.int64) for name in self._input_names}
+        logits = self.session.run(None, feed)[0]
+        scores = 1.0 / (1.0 + np.exp(-logits))
+        return {name: scores[:, i].tolist() for i, name in enumerate(self.class_names)}
+
+
+def load_backend(
+    model_type: str,
+    export_dir: str,
+    quantize: bool = True,
+    threads: int = 0,
+) -> Optional[OnnxDetoxify]:
+    """OnnxDetoxify, or None if onnxruntime or the export is unavailable"""
+    try:
+        return OnnxDetoxify.load(model_type, export_dir, quantize, threads)
+    except Exception as e:
+        logger.error(f"Failed to load ONNX Detoxify backend: {e}")
+        return None
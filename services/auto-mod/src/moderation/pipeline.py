@@ -0,0 +1,205 @@
+"""
+Staged moderation pipeline
+"""
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+from ..config import settings
+from .filter import content_filter
+from .spam import spam_detector
+from .toxicity import toxicity_detector
+
+logger = logging.getLogger(__name__)
+
+
+class ModerationContext:
+    """Per-message state carried through the pipeline"""
+
+    def __init__(
+        self,
+        message: str,
+        user_id: str,
+        user_roles: Optional[List[str]] = None,
+        platform: Optional[str] = None,
+        channel_id: Optional[str] = None,
+        policy=None,
+    ):
+        self.message = message
+        self.user_id = user_id
+        self.user_roles = user_roles
+        self.platform = platform
+        self.channel_id = channel_id
+        self.policy = policy  # ChannelPolicy; None = global settings
+        self.deadline = toxicity_detector.deadline()
+
+        self.filter_result: Optional[Dict] = None
+        self.spam_result: Optional[Dict] = None
+        self.toxicity_result: Optional[Dict] = None
+
+        self.timings: Dict[str, float] = {}  # stage -> ms
+        self.skipped: List[str] = []
+
+    def violations_and_scores(self) -> Tuple[List[str], Dict[str, float]]:
+        """Violations and scores from the stages that have run so far"""
+        violations = []
+        scores = {}
+
+        if self.filter_result and self.filter_result["has_violation"]:
+            violations.extend(self.filter_result["violations"])
+            scores["filter"] = 1.0
+
+        if self.toxicity_result and self.toxicity_result["is_toxic"]:
+            violations.append(f"Toxic content: {self.toxicity_result['reason']}")
+            scores["toxicity"] = self.toxicity_result["toxicity_score"]
+
+        if self.spam_result and self.spam_result["is_spam"]:
+            violations.extend([f"Spam: {r}" for r in self.spam_result["reasons"]])
+            scores["spam"] = self.spam_result["spam_score"]
+
+        return violations, scores
+
+    def is_decided(self) -> bool:
+        """True once the message already warrants the most severe action tier"""
+        violations, scores = self.violations_and_scores()
+        if not violations:
+            return False
+        max_score = max(scores.values()) if scores else 0
+        policy = self.policy
+        severe_score = policy.severe_score if policy else settings.SEVERE_SCORE
+        severe_violations = policy.severe_violations if policy else settings.SEVERE_VIOLATIONS
+        return max_score >= severe_score or len(violations) >= severe_violations
+
+
+class StagePolicy:
+    """Which stages run, in what order, and which may be skipped once decided"""
+
+    def __init__(self, stages: Iterable[str], skip_if_decided: Iterable[str] = ()):
+        self.stages = list(stages)
+        self.skip_if_decided = set(skip_if_decided)
+
+    @classmethod
+    def from_settings(cls) -> "StagePolicy":
+        return cls(settings.MODERATION_STAGES, settings.SKIP_IF_DECIDED_STAGES)
+
+
+class ModerationPipeline:
+    """
+    Run moderation stages over a batch of messages
+
+    Stages run in policy order, cheap deterministic ones first by default.
+    A stage marked skip-if-decided only sees messages whose outcome it can
+    still change; every message records the latency of each stage it went
+    through and which stages it skipped. Stages that handle messages one at
+    a time (spam, ai) time each message; batched stages (filter, detoxify)
+    charge each message an equal share of the batch call.
+    """
+
+    def __init__(self):
+        self._stages: Dict[str, Callable[[List[ModerationContext]], Awaitable[None]]] = {
+            "filter": self._run_filter,
+            "spam": self._run_spam,
+            "detoxify": self._run_detoxify,
+            "ai": self._run_ai,
+        }
+        self._stats = {name: {"messages": 0, "skipped": 0, "total_ms": 0.0, "max_ms": 0.0} for name in self._stages}
+
+    @property
+    def stage_names(self) -> List[str]:
+        return list(self._stages)
+
+    async def run(self, contexts: List[ModerationContext], policy: StagePolicy):
+        for name in policy.stages:
+            runner = self._stages.get(name)
+            if runner is None:
+                logger.warning(f"Unknown moderation stage: {name}")
+                continue
+
+            active = contexts
+            if name in policy.skip_if_decided:
+                active = []
+                for ctx in contexts:
+                    if ctx.is_decided():
+                        ctx.skipped.append(name)
+                    else:
+                        active.append(ctx)
+                self._stats[name]["skipped"] += len(contexts) - len(active)
+
+            if not active:
+                continue
+
+            started = time.perf_counter()
+            await runner(active)
+            elapsed_ms = (time.perf_counter() - started) * 1000
+
+            share_ms = round(elapsed_ms / len(active), 3)
+            for ctx in active:
+                ctx.timings.setdefault(name, share_ms)
+
+            stats = self._stats[name]
+            stats["messages"] += len(active)
+            stats["total_ms"] += elapsed_ms
+            stats["max_ms"] = max(stats["max_ms"], elapsed_ms)
+
+    async def _run_filter(self, contexts: List[ModerationContext]):
+        for policy, group in _by_policy(contexts):
+            extra = policy.rules if policy else None
+            results = content_filter.check_batch([ctx.message for ctx in group], extra)
+            for ctx, result in zip(group, results):
+                ctx.filter_result = result
+
+    async def _run_spam(self, contexts: List[ModerationContext]):
+        # Sequential so repeat detection sees messages in send order
+        for ctx in contexts:
+            started = time.perf_counter()
+            ctx.spam_result = await spam_detector.check_spam(
+                ctx.message, ctx.user_id, ctx.user_roles, channel_id=ctx.channel_id, policy=ctx.policy
+            )
+            ctx.timings["spam"] = round((time.perf_counter() - started) * 1000, 3)
+
+    async def _run_detoxify(self, contexts: List[ModerationContext]):
+        for policy, group in _by_policy(contexts):
+            threshold = policy.toxicity_threshold if policy else None
+            results = await toxicity_detector.check_detoxify_batch([ctx.message for ctx in group], threshold)
+            for ctx, result in zip(group, results):
+                ctx.toxicity_result = result
+
+    async def _run_ai(self, contexts: List[ModerationContext]):
+        async def check(ctx: ModerationContext):
+            started = time.perf_counter()
+            try:
+                return await toxicity_detector.check_ai(ctx.message, ctx.deadline)
+            finally:
+                ctx.timings["ai"] = round((time.perf_counter() - started) * 1000, 3)
+
+        verdicts = await asyncio.gather(*(check(ctx) for ctx in contexts))
+        for ctx, verdict in zip(contexts, verdicts):
+            if ctx.toxicity_result is None:
+                ctx.toxicity_result = toxicity_detector.empty_result()
+            toxicity_detector.apply_ai_verdict(ctx.toxicity_result, verdict)
+
+    def get_metrics(self) -> Dict[str, Dict]:
+        """Per-stage message counts, skips and latency"""
+        metrics = {}
+        for name, stats in self._stats.items():
+            runs = stats["messages"]
+            metrics[name] = {
+                "messages": runs,
+                "skipped": stats["skipped"],
+                "avg_ms_per_message": round(stats["total_ms"] / runs, 3) if runs else 0.0,
+                "max_call_ms": round(stats["max_ms"], 3),
+            }
+        return metrics
+
+
+def _by_policy(contexts: List[ModerationContext]):
+    """Group contexts that share a channel policy, keeping order within each group"""
+    groups: Dict[int, Tuple[object, List[ModerationContext]]] = {}
+    for ctx in contexts:
+        groups.setdefault(id(ctx.policy), (ctx.policy, []))[1].append(ctx)
+    return groups.values()
+
+
+# Global instance
+moderation_pipeline = ModerationPipeline()
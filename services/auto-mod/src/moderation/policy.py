@@ -0,0 +1,329 @@
+"""
+Per-channel moderation policies (compiled, cached, version-invalidated)
+"""
+import asyncio
+import json
+import logging
+from typing import Dict, FrozenSet, Optional, Tuple
+
+from ..config import settings
+from .cache import TTLCache
+from .filter import ContentFilter, FilterRules
+from .links import LinkChecker
+from .pipeline import StagePolicy
+from .spam import spam_detector
+from .state import get_redis
+
+logger = logging.getLogger(__name__)
+
+# Override fields a channel may set; anything missing falls back to settings
+POLICY_FIELDS = (
+    "toxicity_threshold",
+    "spam_threshold",
+    "severe_score",  # Action cutoffs on the highest violation score
+    "severe_violations",
+    "moderate_score",
+    "minor_score",
+    "auto_delete",
+    "auto_timeout",
+    "auto_ban",
+    "whitelist_roles",
+    "whitelist_users",
+    "allowed_domains",
+    "blocked_domains",
+    "banned_words",  # Scanned in addition to the shared rule set
+    "banned_phrases",
+    "stages",
+    "skip_if_decided",
+)
+
+# Seconds a fallback (default) policy is cached after the store failed
+ERROR_RETRY = 5.0
+
+
+class ChannelPolicy:
+    """Everything moderation needs for one channel, resolved ahead of time"""
+
+    __slots__ = (
+        "key", "version", "overrides",
+        "toxicity_threshold", "spam_threshold",
+        "severe_score", "severe_violations", "moderate_score", "minor_score",
+        "auto_delete", "auto_timeout", "auto_ban",
+        "whitelist_roles", "whitelist_users",
+        "link_checker", "rules", "stages",
+    )
+
+    def __init__(
+        self,
+        key: str,
+        version: int,
+        overrides: Dict,
+        toxicity_threshold: float,
+        spam_threshold: float,
+        severe_score: float,
+        severe_violations: int,
+        moderate_score: float,
+        minor_score: float,
+        auto_delete: bool,
+        auto_timeout: bool,
+        auto_ban: bool,
+        whitelist_roles: FrozenSet[str],
+        whitelist_users: FrozenSet[str],
+        link_checker: LinkChecker,
+        rules: Optional[FilterRules],
+        stages: StagePolicy,
+    ):
+        self.key = key
+        self.version = version
+        self.overrides = overrides
+        self.toxicity_threshold = toxicity_threshold
+        self.spam_threshold = spam_threshold
+        self.severe_score = severe_score
+        self.severe_violations = severe_violations
+        self.moderate_score = moderate_score
+        self.minor_score = minor_score
+        self.auto_delete = auto_delete
+        self.auto_timeout = auto_timeout
+        self.auto_ban = auto_ban
+        self.whitelist_roles = whitelist_roles
+        self.whitelist_users = whitelist_users
+        self.link_checker = link_checker
+        self.rules = rules  # Channel's own banned list, scanned after the shared one; None = none
+        self.stages = stages
+
+    def is_whitelisted(self, user_id: str, user_roles) -> bool:
+        if user_roles and not self.whitelist_roles.isdisjoint(user_roles):
+            return True
+        return user_id in self.whitelist_users
+
+
+def compile_policy(key: str, version: int, overrides: Dict) -> ChannelPolicy:
+    """Resolve overrides against settings into a ready-to-use policy"""
+    get = overrides.get
+
+    link_checker = spam_detector.link_checker
+    if "allowed_domains" in overrides or "blocked_domains" in overrides:
+        link_checker = LinkChecker(
+            allowed=get("allowed_domains", settings.ALLOWED_DOMAINS),
+            blocked=get("blocked_domains", settings.BLOCKED_DOMAINS),
+            cache_size=settings.POLICY_LINK_CACHE_SIZE,
+            cache_ttl=settings.LINK_CACHE_TTL,
+            resolver=spam_detector.link_checker.resolver,
+        )
+
+    # Only the channel's own entries: the shared automaton is scanned once for
+    # every channel and never copied, so shared rule updates recompile nothing
+    rules = None
+    if get("banned_words") or get("banned_phrases"):
+        rules = ContentFilter.compile(get("banned_words", []), get("banned_phrases", []))
+
+    return ChannelPolicy(
+        key=key,
+        version=version,
+        overrides=overrides,
+        toxicity_threshold=get("toxicity_threshold", settings.TOXICITY_THRESHOLD),
+        spam_threshold=get("spam_threshold", settings.SPAM_THRESHOLD),
+        severe_score=get("severe_score", settings.SEVERE_SCORE),
+        severe_violations=get("severe_violations", settings.SEVERE_VIOLATIONS),
+        moderate_score=get("moderate_score", settings.MODERATE_SCORE),
+        minor_score=get("minor_score", settings.MINOR_SCORE),
+        auto_delete=get("auto_delete", settings.AUTO_DELETE),
+        auto_timeout=get("auto_timeout", settings.AUTO_TIMEOUT),
+        auto_ban=get("auto_ban", settings.AUTO_BAN),
+        whitelist_roles=frozenset(get("whitelist_roles", settings.WHITELIST_ROLES)),
+        whitelist_users=frozenset(get("whitelist_users", settings.WHITELIST_USERS)),
+        link_checker=link_checker,
+        rules=rules,
+        stages=StagePolicy(
+            get("stages", settings.MODERATION_STAGES),
+            get("skip_if_decided", settings.SKIP_IF_DECIDED_STAGES),
+        ),
+    )
+
+
+# Store a channel's overrides, bump its version and tell every worker.
+SET_SCRIPT = """
+local version = redis.call('HINCRBY', KEYS[1], 'version', 1)
+redis.call('HSET', KEYS[1], 'policy', ARGV[1])
+redis.call('PUBLISH', ARGV[2], ARGV[3] .. '|' .. version)
+return version
+"""
+
+
+class RedisPolicyStore:
+    """Channel overrides as Redis hashes {version, policy}; changes are published"""
+
+    def __init__(self, client, prefix: str):
+        self._redis = client
+        self.prefix = f"{prefix}:policy"
+        self.channel = f"{prefix}:policy:updates"
+        self._set = client.register_script(SET_SCRIPT)
+
+    async def get(self, key: str) -> Tuple[int, Dict]:
+        version, policy = await self._redis.hmget(f"{self.prefix}:{key}", "version", "policy")
+        return int(version or 0), json.loads(policy) if policy else {}
+
+    async def set(self, key: str, overrides: Dict) -> int:
+        return int(await self._set(
+            keys=[f"{self.prefix}:{key}"],
+            args=[json.dumps(overrides), self.channel, key],
+        ))
+
+    def pubsub(self):
+        return self._redis.pubsub()
+
+
+class MemoryPolicyStore:
+    """Per-process overrides (single worker or tests)"""
+
+    channel = None
+
+    def __init__(self):
+        self._policies: Dict[str, Tuple[int, Dict]] = {}
+
+    async def get(self, key: str) -> Tuple[int, Dict]:
+        return self._policies.get(key, (0, {}))
+
+    async def set(self, key: str, overrides: Dict) -> int:
+        version = self._policies.get(key, (0, {}))[0] + 1
+        self._policies[key] = (version, overrides)
+        return version
+
+
+class PolicyRegistry:
+    """
+    Compiled channel policies in an LRU
+
+    A channel's policy is loaded and compiled on its first message, then
+    served from memory. Writers bump the channel's version and publish it;
+    every worker drops cached entries older than the published version, and
+    the TTL bounds staleness if a notification is lost. Channels without
+    overrides share one default policy, so they cost a cache entry only.
+    """
+
+    def __init__(self, store, cache_size: int = 10000, cache_ttl: float = 300):
+        self.store = store
+        self.cache = TTLCache(maxsize=cache_size, ttl=cache_ttl)
+        self.default = compile_policy("default", 0, {})
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._task: Optional[asyncio.Task] = None
+        self.compiles = 0
+        self.invalidations = 0
+        self.errors = 0
+
+    @staticmethod
+    def key(platform: Optional[str], channel_id: Optional[str]) -> str:
+        return f"{platform or 'unknown'}:{channel_id or 'unknown'}"
+
+    async def get(self, platform: Optional[str], channel_id: Optional[str]) -> ChannelPolicy:
+        key = self.key(platform, channel_id)
+        policy = self.cache.get(key)
+        if policy is not None:
+            return policy
+
+        # One load per channel, however many of its messages miss at once
+        future = self._inflight.get(key)
+        if future is not None:
+            return await future
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            policy = await self._load(key)
+            future.set_result(policy)
+            return policy
+        except BaseException as e:
+            if isinstance(e, Exception):
+                future.set_exception(e)
+                future.exception()  # Mark retrieved; joiners re-raise it
+            else:
+                future.cancel()
+            raise
+        finally:
+            self._inflight.pop(key, None)
+
+    async def _load(self, key: str) -> ChannelPolicy:
+        try:
+            version, overrides = await self.store.get(key)
+        except Exception as e:
+            self.errors += 1
+            logger.warning(f"Policy store unavailable, using default policy for {key}: {e}")
+            self.cache.set(key, self.default, ERROR_RETRY)
+            return self.default
+
+        if overrides:
+            policy = await asyncio.to_thread(compile_policy, key, version, overrides)
+            self.compiles += 1
+        else:
+            policy = self.default
+        self.cache.set(key, policy)
+        return policy
+
+    async def set(self, platform: str, channel_id: str, overrides: Dict) -> int:
+        """Replace a channel's overrides (empty dict resets it); returns the new version"""
+        key = self.key(platform, channel_id)
+        overrides = {k: v for k, v in overrides.items() if k in POLICY_FIELDS and v is not None}
+        version = await self.store.set(key, overrides)
+        self.invalidate(key, version)
+        return version
+
+    def invalidate(self, key: str, version: int):
+        cached = self.cache.get(key)
+        if cached is not None and (cached is self.default or cached.version < version):
+            self.cache.pop(key)
+            self.invalidations += 1
+
+    async def start(self):
+        if self.store.channel:
+            self._task = asyncio.create_task(self._listen())
+
+    async def _listen(self):
+        while True:
+            pubsub = None
+            try:
+                pubsub = self.store.pubsub()
+                await pubsub.subscribe(self.store.channel)
+                self.cache.clear()  # Updates may have been missed while disconnected
+                async for message in pubsub.listen():
+                    if message["type"] != "message":
+                        continue
+                    data = message["data"]
+                    key, version = (data.decode() if isinstance(data, bytes) else data).rsplit("|", 1)
+                    self.invalidate(key, int(version))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.errors += 1
+                logger.warning(f"Policy update listener interrupted, retrying: {e}")
+                await asyncio.sleep(ERROR_RETRY)
+            finally:
+                if pubsub is not None:
+                    await pubsub.aclose()
+
+    def get_metrics(self) -> Dict[str, any]:
+        return {
+            "cache": self.cache.get_metrics(),
+            "compiles": self.compiles,
+            "invalidations": self.invalidations,
+            "errors": self.errors,
+        }
+
+    async def close(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+
+def create_policy_registry() -> PolicyRegistry:
+    store = MemoryPolicyStore()
+    if settings.POLICY_BACKEND == "redis":
+        try:
+            store = RedisPolicyStore(get_redis(), prefix=settings.STATE_KEY_PREFIX)
+        except Exception as e:
+            logger.warning(f"Policy store unavailable, keeping policies per process: {e}")
+    return PolicyRegistry(store, settings.POLICY_CACHE_SIZE, settings.POLICY_CACHE_TTL)
+
+
+# Global instance
+policy_registry = create_policy_registry()
@@ -0,0 +1,220 @@
+"""
+Cross-user near-duplicate (raid) detection
+"""
+import time
+import zlib
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from ..config import settings
+from .matcher import normalize_text
+
+# Universal hashing (a * x + b) mod p over 32-bit shingle hashes
+_PRIME = np.uint64(4294967311)  # Smallest prime above 2**32
+
+
+class MinHasher:
+    """
+    MinHash signatures over character shingles of the normalized message
+
+    Text is folded like the banned-word matcher (case, confusables, emojis
+    and punctuation dropped) and spaces removed before shingling, so the
+    usual raid mutations - casing, spacing, emoji padding, lookalike
+    characters - do not change the signature at all.
+    """
+
+    def __init__(self, num_perm: int = 32, shingle: int = 4, seed: int = 1):
+        rng = np.random.RandomState(seed)
+        self.num_perm = num_perm
+        self.shingle = shingle
+        self._a = rng.randint(1, 2**32 - 1, size=num_perm, dtype=np.uint64)
+        self._b = rng.randint(0, 2**32 - 1, size=num_perm, dtype=np.uint64)
+
+    def fold(self, message: str) -> str:
+        return normalize_text(message).replace(' ', '')
+
+    def signature(self, folded: str) -> np.ndarray:
+        size = self.shingle
+        shingles = {folded[i:i + size] for i in range(max(len(folded) - size + 1, 1))}
+        hashes = np.fromiter(
+            (zlib.crc32(s.encode()) for s in shingles), dtype=np.uint64, count=len(shingles)
+        )
+        return ((np.outer(hashes, self._a) + self._b) % _PRIME).min(axis=0)
+
+
+class _Cluster:
+    """Near-identical messages in one channel, seeded by the first one seen"""
+
+    __slots__ = ("signature", "band_keys", "users", "last_seen", "flagged")
+
+    def __init__(self, signature: np.ndarray, band_keys: List[Tuple]):
+        self.signature = signature
+        self.band_keys = band_keys
+        self.users: "OrderedDict[str, float]" = OrderedDict()  # user_id -> last post
+        self.last_seen = 0.0
+        self.flagged = False
+
+
+class _Channel:
+    __slots__ = ("clusters", "buckets", "next_id")
+
+    def __init__(self):
+        self.clusters: "OrderedDict[int, _Cluster]" = OrderedDict()  # Oldest activity first
+        self.buckets: Dict[Tuple, int] = {}  # LSH band -> cluster id
+        self.next_id = 0
+
+
+class RaidDetector:
+    """
+    Streaming near-duplicate detector over a sliding time window
+
+    Each channel keeps an LSH index (MinHash bands -> cluster) of the message
+    clusters seen within the window. A message costs one signature and one
+    dict lookup per band: it either joins the closest cluster its bands point
+    to or seeds a new one. Expired users and clusters are trimmed from the
+    front of LRU-ordered dicts, so upkeep is O(1) amortized per message.
+
+    State is per process; with several replicas, route each channel to one
+    replica or expect each to see its own share of a raid.
+    """
+
+    def __init__(
+        self,
+        window: float = 120,
+        min_users: int = 5,
+        similarity: float = 0.5,
+        min_length: int = 20,
+        num_perm: int = 32,
+        bands: int = 16,
+        max_channels: int = 10000,
+        max_clusters: int = 5000,
+    ):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+
+        self.window = window
+        self.min_users = min_users
+        self.similarity = similarity
+        self.min_length = min_length
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.max_channels = max_channels
+        self.max_clusters = max_clusters
+        self.hasher = MinHasher(num_perm)
+
+        self._channels: "OrderedDict[str, _Channel]" = OrderedDict()
+        self.checked = 0
+        self.flagged_messages = 0
+        self.raids = 0
+
+    def observe(self, channel_id: str, user_id: str, message: str) -> int:
+        """
+        Record a message; returns how many distinct users posted a
+        near-duplicate of it in the window (including this one), or 0 if the
+        message is too short to fingerprint reliably.
+        """
+        folded = self.hasher.fold(message)
+        if len(folded) < self.min_length:
+            return 0
+
+        self.checked += 1
+        now = time.monotonic()
+        channel = self._channel(channel_id)
+        self._expire(channel, now)
+
+        signature = self.hasher.signature(folded)
+        band_keys = [
+            (i, signature[i * self.rows:(i + 1) * self.rows].tobytes())
+            for i in range(self.bands)
+        ]
+
+        cluster_id, cluster = self._closest(channel, signature, band_keys)
+        if cluster is None:
+            cluster_id = channel.next_id
+            channel.next_id += 1
+            cluster = _Cluster(signature, band_keys)
+            channel.clusters[cluster_id] = cluster
+            for key in band_keys:
+                channel.buckets[key] = cluster_id
+            if len(channel.clusters) > self.max_clusters:
+                self._drop(channel, *channel.clusters.popitem(last=False))
+
+        cluster.users[user_id] = now
+        cluster.users.move_to_end(user_id)
+        cluster.last_seen = now
+        channel.clusters.move_to_end(cluster_id)
+
+        while cluster.users:
+            oldest_user, seen = next(iter(cluster.users.items()))
+            if now - seen <= self.window:
+                break
+            del cluster.users[oldest_user]
+
+        users = len(cluster.users)
+        if users >= self.min_users:
+            self.flagged_messages += 1
+            if not cluster.flagged:
+                cluster.flagged = True
+                self.raids += 1
+        return users
+
+    def _channel(self, channel_id: str) -> _Channel:
+        channel = self._channels.get(channel_id)
+        if channel is None:
+            channel = _Channel()
+            self._channels[channel_id] = channel
+            if len(self._channels) > self.max_channels:
+                self._channels.popitem(last=False)
+        self._channels.move_to_end(channel_id)
+        return channel
+
+    def _closest(
+        self, channel: _Channel, signature: np.ndarray, band_keys: List[Tuple]
+    ) -> Tuple[Optional[int], Optional[_Cluster]]:
+        best_id, best, best_score = None, None, self.similarity
+        for key in band_keys:
+            cluster_id = channel.buckets.get(key)
+            if cluster_id is None or cluster_id == best_id:
+                continue
+            cluster = channel.clusters[cluster_id]
+            # Fraction of equal MinHash values estimates Jaccard similarity
+            score = float(np.count_nonzero(cluster.signature == signature)) / len(signature)
+            if score >= best_score:
+                best_id, best, best_score = cluster_id, cluster, score
+        return best_id, best
+
+    def _expire(self, channel: _Channel, now: float):
+        while channel.clusters:
+            cluster_id, cluster = next(iter(channel.clusters.items()))
+            if now - cluster.last_seen <= self.window:
+                break
+            del channel.clusters[cluster_id]
+            self._drop(channel, cluster_id, cluster)
+
+    def _drop(self, channel: _Channel, cluster_id: int, cluster: _Cluster):
+        for key in cluster.band_keys:
+            # A newer cluster may have taken over the band
+            if channel.buckets.get(key) == cluster_id:
+                del channel.buckets[key]
+
+    def get_metrics(self) -> Dict[str, any]:
+        return {
+            "channels": len(self._channels),
+            "clusters": sum(len(c.clusters) for c in self._channels.values()),
+            "checked": self.checked,
+            "flagged_messages": self.flagged_messages,
+            "raids": self.raids,
+        }
+
+
+def create_raid_detector() -> RaidDetector:
+    return RaidDetector(
+        window=settings.RAID_WINDOW,
+        min_users=settings.RAID_MIN_USERS,
+        similarity=settings.RAID_SIMILARITY,
+        min_length=settings.RAID_MIN_LENGTH,
+        max_channels=settings.RAID_MAX_CHANNELS,
+        max_clusters=settings.RAID_MAX_CLUSTERS,
+    )
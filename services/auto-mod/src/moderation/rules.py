@@ -0,0 +1,236 @@
+"""
+Shared banned-word rule sets (Redis, versioned, hot-reloaded)
+"""
+import asyncio
+import logging
+from typing import Iterable, List, NamedTuple, Optional
+
+from ..config import settings
+from .filter import ContentFilter, content_filter
+from .state import get_redis
+
+logger = logging.getLogger(__name__)
+
+
+# Apply a change to one rule set; bump the version and notify workers only
+# if something actually changed. Returns the resulting version.
+MUTATE_SCRIPT = """
+local changed = 0
+for i = 3, #ARGV do
+    if ARGV[1] == 'add' then
+        changed = changed + redis.call('SADD', KEYS[1], ARGV[i])
+    else
+        changed = changed + redis.call('SREM', KEYS[1], ARGV[i])
+    end
+end
+if changed == 0 then
+    return tonumber(redis.call('GET', KEYS[2]) or '0')
+end
+local version = redis.call('INCR', KEYS[2])
+redis.call('PUBLISH', ARGV[2], version)
+return version
+"""
+
+# First worker to start seeds Redis from settings; later ones keep what is there.
+# ARGV = [word count, words..., phrases...]
+SEED_SCRIPT = """
+if redis.call('EXISTS', KEYS[3]) == 1 then
+    return tonumber(redis.call('GET', KEYS[3]))
+end
+local words = tonumber(ARGV[1])
+for i = 2, #ARGV do
+    if i <= words + 1 then
+        redis.call('SADD', KEYS[1], ARGV[i])
+    else
+        redis.call('SADD', KEYS[2], ARGV[i])
+    end
+end
+redis.call('SET', KEYS[3], 1)
+return 1
+"""
+
+
+class RuleSet(NamedTuple):
+    version: int
+    words: List[str]
+    phrases: List[str]
+
+
+class RedisRuleStore:
+    """Banned words and phrases as Redis sets with a version counter"""
+
+    def __init__(self, client, prefix: str):
+        self._redis = client
+        self.words_key = f"{prefix}:rules:words"
+        self.phrases_key = f"{prefix}:rules:phrases"
+        self.version_key = f"{prefix}:rules:version"
+        self.channel = f"{prefix}:rules:updates"
+        self._mutate = client.register_script(MUTATE_SCRIPT)
+        self._seed = client.register_script(SEED_SCRIPT)
+
+    async def seed(self, words: Iterable[str], phrases: Iterable[str]) -> int:
+        words = [w.lower() for w in words]
+        phrases = [p.lower() for p in phrases]
+        return int(await self._seed(
+            keys=[self.words_key, self.phrases_key, self.version_key],
+            args=[len(words), *words, *phrases],
+        ))
+
+    def pubsub(self):
+        return self._redis.pubsub()
+
+    async def version(self) -> int:
+        return int(await self._redis.get(self.version_key) or 0)
+
+    async def load(self) -> RuleSet:
+        """Version and contents read in one transaction"""
+        pipe = self._redis.pipeline(transaction=True)
+        pipe.get(self.version_key)
+        pipe.smembers(self.words_key)
+        pipe.smembers(self.phrases_key)
+        version, words, phrases = await pipe.execute()
+        return RuleSet(
+            version=int(version or 0),
+            words=sorted(_decode(w) for w in words),
+            phrases=sorted(_decode(p) for p in phrases),
+        )
+
+    async def add_words(self, words: Iterable[str]) -> int:
+        return await self._change("add", self.words_key, words)
+
+    async def remove_words(self, words: Iterable[str]) -> int:
+        return await self._change("remove", self.words_key, words)
+
+    async def add_phrases(self, phrases: Iterable[str]) -> int:
+        return await self._change("add", self.phrases_key, phrases)
+
+    async def remove_phrases(self, phrases: Iterable[str]) -> int:
+        return await self._change("remove", self.phrases_key, phrases)
+
+    async def _change(self, op: str, key: str, values: Iterable[str]) -> int:
+        values = [v.lower() for v in values]
+        return int(await self._mutate(keys=[key, self.version_key], args=[op, self.channel, *values]))
+
+
+def _decode(value) -> str:
+    return value.decode() if isinstance(value, bytes) else value
+
+
+class RuleSync:
+    """
+    Keep a ContentFilter on the latest shared rule set
+
+    Listens for version notifications on Redis pub/sub and falls back to
+    polling the version counter, so a missed message (or a reconnect) only
+    delays an update by one poll interval. Each new version is compiled off
+    the event loop and swapped into the filter in one assignment; messages
+    never wait on Redis.
+    """
+
+    def __init__(self, store: RedisRuleStore, content_filter: ContentFilter, poll_interval: float = 5.0):
+        self.store = store
+        self.filter = content_filter
+        self.poll_interval = poll_interval
+        self._task: Optional[asyncio.Task] = None
+        self._reload_lock = asyncio.Lock()
+        self.reloads = 0
+        self.errors = 0
+
+    async def start(self):
+        try:
+            await self.catch_up()
+        except Exception as e:
+            self.errors += 1
+            logger.warning(f"Shared rule set unavailable, using local rules until Redis recovers: {e}")
+        self._task = asyncio.create_task(self._listen())
+
+    async def catch_up(self):
+        """Seed an empty store from settings, then load whatever it holds"""
+        await self.store.seed(settings.BANNED_WORDS, settings.BANNED_PHRASES)
+        await self.reload()
+
+    async def reload(self, min_version: Optional[int] = None):
+        """
+        Load, compile and swap in the stored rule set if its version differs
+
+        min_version skips the load when this worker is already at least that
+        current (e.g. a notification for a change it made itself).
+        """
+        async with self._reload_lock:
+            if min_version is not None and self.filter.version >= min_version:
+                return
+            rules = await self.store.load()
+            if rules.version == self.filter.version:
+                return
+            compiled = await asyncio.to_thread(
+                ContentFilter.compile, rules.words, rules.phrases, rules.version
+            )
+            self.filter.swap(compiled)
+            self.reloads += 1
+            logger.info(
+                f"Loaded banned-word rules v{rules.version} "
+                f"({len(rules.words)} words, {len(rules.phrases)} phrases)"
+            )
+
+    async def _listen(self):
+        while True:
+            pubsub = None
+            try:
+                pubsub = self.store.pubsub()
+                await pubsub.subscribe(self.store.channel)
+                await self.catch_up()  # Anything missed while disconnected
+                while True:
+                    message = await pubsub.get_message(
+                        ignore_subscribe_messages=True, timeout=self.poll_interval
+                    )
+                    if message is not None:
+                        await self.reload(int(message["data"]))
+                    elif await self.store.version() != self.filter.version:
+                        await self.catch_up()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.errors += 1
+                logger.warning(f"Rule set sync interrupted, retrying: {e}")
+                await asyncio.sleep(self.poll_interval)
+            finally:
+                if pubsub is not None:
+                    await pubsub.aclose()
+
+    async def add_words(self, words: Iterable[str]):
+        await self.reload(await self.store.add_words(words))
+
+    async def remove_words(self, words: Iterable[str]):
+        await self.reload(await self.store.remove_words(words))
+
+    async def add_phrases(self, phrases: Iterable[str]):
+        await self.reload(await self.store.add_phrases(phrases))
+
+    def get_metrics(self):
+        return {
+            "version": self.filter.version,
+            "reloads": self.reloads,
+            "errors": self.errors,
+        }
+
+    async def close(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+
+def create_rule_sync() -> Optional[RuleSync]:
+    """RuleSync for the configured backend (None keeps rules per process)"""
+    if settings.RULES_BACKEND != "redis":
+        return None
+    try:
+        store = RedisRuleStore(get_redis(), prefix=settings.STATE_KEY_PREFIX)
+    except Exception as e:
+        logger.warning(f"Shared rule set unavailable, using per-process rules: {e}")
+        return None
+    return RuleSync(store, content_filter, poll_interval=settings.RULES_POLL_INTERVAL)
+
+
+# Global instance
+rule_sync = create_rule_sync()
@@ -1,15 +1,16 @@
 """
 Spam Detection
 """
+import hashlib
 import logging
-import re
-from typing import Dict, List
-from collections import defaultdict
-from datetime import datetime, timedelta
-import validators
-import tldextract
+from typing import Dict, List, Optional, Tuple
 
 from ..config import settings
+from .features import extract_features
+from .flood import create_flood_detector
+from .links import create_link_checker
+from .raid import create_raid_detector
+from .state import window_store
 
 logger = logging.getLogger(__name__)
 
@@ -18,17 +19,21 @@ class SpamDetector:
     """Detect spam and suspicious messages"""
 
     def __init__(self):
-        self.message_history = defaultdict(list)  # user_id -> [(message, timestamp), ...]
-        self.link_cache = {}  # URL -> safety check result
+        self.store = window_store  # Shared repeat windows (Redis or in-process)
+        self.link_checker = create_link_checker()
+        self.raid_detector = create_raid_detector()
+        self.flood_detector = create_flood_detector()
 
     async def check_spam(
         self,
         message: str,
         user_id: str,
-        user_roles: List[str] = None
+        user_roles: List[str] = None,
+        channel_id: Optional[str] = None,
+        policy=None,
     ) -> Dict[str, any]:
         """
-        Check message for spam indicators
+        Check message for spam indicators (policy: the channel's ChannelPolicy, if any)
 
         Returns:
             {
@@ -40,9 +45,14 @@ class SpamDetector:
         """
         reasons = []
         spam_score = 0.0
+        whitelist_roles = policy.whitelist_roles if policy else settings.WHITELIST_ROLES
+        threshold = policy.spam_threshold if policy else settings.SPAM_THRESHOLD
+        link_checker = policy.link_checker if policy else self.link_checker
+        auto_delete = policy.auto_delete if policy else settings.AUTO_DELETE
+        auto_timeout = policy.auto_timeout if policy else settings.AUTO_TIMEOUT
 
         # Check exemptions
-        if user_roles and any(role in settings.WHITELIST_ROLES for role in user_roles):
+        if user_roles and any(role in whitelist_roles for role in user_roles):
             return {
                 "is_spam": False,
                 "spam_score": 0.0,
@@ -50,47 +60,49 @@ class SpamDetector:
                 "action": "none",
             }
 
+        features = extract_features(message)
+
         # 1. Check message length
-        if len(message) < settings.MIN_MESSAGE_LENGTH:
+        if features.length < settings.MIN_MESSAGE_LENGTH:
             reasons.append("Message too short")
             spam_score += 0.2
 
-        if len(message) > settings.MAX_MESSAGE_LENGTH:
+        if features.length > settings.MAX_MESSAGE_LENGTH:
             reasons.append("Message too long")
             spam_score += 0.3
 
         # 2. Check CAPS
-        caps_ratio = sum(1 for c in message if c.isupper()) / max(len(message), 1)
+        caps_ratio = features.caps_ratio
         if caps_ratio > settings.MAX_CAPS_RATIO:
             reasons.append(f"Excessive caps ({caps_ratio:.0%})")
             spam_score += 0.4
 
         # 3. Check emojis
-        emoji_count = len(re.findall(r'[\U0001F600-\U0001F64F\U0001F300-\U0001F5FF\U0001F680-\U0001F6FF\U0001F1E0-\U0001F1FF]', message))
+        emoji_count = features.emoji_count
         if emoji_count > settings.MAX_EMOJIS:
             reasons.append(f"Excessive emojis ({emoji_count})")
             spam_score += 0.3
 
         # 4. Check mentions
-        mention_count = len(re.findall(r'@\w+', message))
+        mention_count = features.mention_count
         if mention_count > settings.MAX_MENTIONS:
             reasons.append(f"Excessive mentions ({mention_count})")
             spam_score += 0.4
 
         # 5. Check links
-        links = re.findall(r'https?://[^\s]+', message)
+        links = features.links
         if len(links) > settings.MAX_LINKS:
             reasons.append(f"Excessive links ({len(links)})")
             spam_score += 0.5
 
         # Check link safety
         for link in links:
-            if not await self._check_link_safety(link):
+            if not await self._check_link_safety(link, link_checker):
                 reasons.append(f"Suspicious link: {link}")
                 spam_score += 0.8
 
         # 6. Check repeated characters
-        if re.search(r'(.)\1{5,}', message):  # Same character 6+ times
+        if features.has_repeated_chars:  # Same character 6+ times
             reasons.append("Repeated characters")
             spam_score += 0.3
 
@@ -99,91 +111,81 @@ class SpamDetector:
             reasons.append("Repeated message spam")
             spam_score += 0.6
 
-        # 8. Check for common spam patterns
-        spam_patterns = [
-            r'(?i)(buy|sell|cheap|discount|offer|deal).*(now|today|limited)',
-            r'(?i)(click here|check out|visit|go to).*(link|website)',
-            r'(?i)(free|prize|winner|won|claim).*(money|gift|reward)',
-            r'(?i)(dm me|message me|add me).*(discord|telegram|whatsapp)',
-        ]
+        # 8. Check message rate (token buckets per user; a flooded channel
+        # only tightens its users' limit, it is never a reason by itself)
+        user_flood, channel_flood = await self._check_flood(user_id, channel_id)
+        if user_flood:
+            reasons.append("Message flooding (busy channel)" if channel_flood else "Message flooding")
+            spam_score += 0.6
+
+        # 9. Check near-duplicates posted by many users (raids)
+        raid_users = self._check_raid(channel_id, user_id, message)
+        if raid_users:
+            reasons.append(f"Coordinated near-duplicate messages ({raid_users} users)")
+            spam_score += 0.8
 
-        for pattern in spam_patterns:
-            if re.search(pattern, message):
-                reasons.append("Spam keyword pattern detected")
-                spam_score += 0.4
-                break
+        # 10. Check for common spam patterns
+        if features.has_spam_pattern:
+            reasons.append("Spam keyword pattern detected")
+            spam_score += 0.4
 
         # Determine action
         action = "none"
-        if spam_score >= settings.SPAM_THRESHOLD:
+        if spam_score >= threshold:
             if spam_score >= 0.8:
-                action = "timeout" if settings.AUTO_TIMEOUT else "delete"
+                action = "timeout" if auto_timeout else "delete"
             elif spam_score >= 0.6:
-                action = "delete" if settings.AUTO_DELETE else "warn"
+                action = "delete" if auto_delete else "warn"
             else:
                 action = "warn"
 
         return {
-            "is_spam": spam_score >= settings.SPAM_THRESHOLD,
+            "is_spam": spam_score >= threshold,
             "spam_score": spam_score,
             "reasons": reasons,
             "action": action,
         }
 
-    async def _check_link_safety(self, url: str) -> bool:
+    async def _check_link_safety(self, url: str, link_checker=None) -> bool:
         """Check if link is safe"""
         if not settings.CHECK_LINK_SAFETY:
             return True
 
-        # Check cache
-        if url in self.link_cache:
-            return self.link_cache[url]
-
-        # Validate URL format
-        if not validators.url(url):
-            self.link_cache[url] = False
-            return False
-
-        # Extract domain
-        extracted = tldextract.extract(url)
-        domain = f"{extracted.domain}.{extracted.suffix}"
-
-        # Check blocked domains
-        if domain in settings.BLOCKED_DOMAINS:
-            self.link_cache[url] = False
-            return False
-
-        # Check allowed domains
-        if settings.ALLOWED_DOMAINS:
-            is_allowed = any(
-                domain == allowed or domain.endswith(f'.{allowed}')
-                for allowed in settings.ALLOWED_DOMAINS
-            )
-            self.link_cache[url] = is_allowed
-            return is_allowed
-
-        # Default to safe if no restrictions
-        self.link_cache[url] = True
-        return True
+        return (link_checker or self.link_checker).is_safe(url)
 
     async def _check_repeat_spam(self, user_id: str, message: str) -> bool:
         """Check if user is repeating the same message"""
-        now = datetime.utcnow()
-        cutoff = now - timedelta(seconds=settings.REPEAT_MESSAGE_WINDOW)
+        digest = hashlib.blake2b(message.encode(), digest_size=16).hexdigest()
 
-        # Clean old messages
-        self.message_history[user_id] = [
-            (msg, ts) for msg, ts in self.message_history[user_id]
-            if ts > cutoff
-        ]
+        # Count same messages in the window, then add the current one
+        same_count = await self.store.append(
+            f"repeat:{user_id}:{digest}", settings.REPEAT_MESSAGE_WINDOW
+        )
 
-        # Count same messages
-        same_count = sum(1 for msg, _ in self.message_history[user_id] if msg == message)
+        return same_count >= settings.REPEAT_MESSAGE_COUNT
 
-        # Add current message
-        self.message_history[user_id].append((message, now))
+    async def _check_flood(self, user_id: str, channel_id: Optional[str]) -> Tuple[bool, bool]:
+        """Whether the user and the channel are posting faster than their token buckets allow"""
+        if not settings.FLOOD_DETECTION:
+            return False, False
 
-        return same_count >= settings.REPEAT_MESSAGE_COUNT
+        return await self.flood_detector.check(user_id, channel_id)
+
+    def _check_raid(self, channel_id: Optional[str], user_id: str, message: str) -> int:
+        """Number of users posting near-duplicates of message in the channel (0 if below the raid threshold)"""
+        if not settings.RAID_DETECTION:
+            return 0
+
+        users = self.raid_detector.observe(channel_id or "global", user_id, message)
+        return users if users >= settings.RAID_MIN_USERS else 0
+
+    def get_metrics(self) -> Dict[str, any]:
+        """Link cache, raid index and flood metrics"""
+        return {
+            "links": self.link_checker.get_metrics(),
+            "raids": self.raid_detector.get_metrics(),
+            "floods": self.flood_detector.get_metrics(),
+        }
 
 
 # Global instance
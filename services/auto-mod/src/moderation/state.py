@@ -0,0 +1,209 @@
+"""
+Shared sliding-window state (Redis sorted sets with an in-process fallback)
+"""
+import logging
+import time
+import uuid
+from collections import OrderedDict, deque
+from typing import Optional, Tuple
+
+from ..config import settings
+
+logger = logging.getLogger(__name__)
+
+
+# Trim the window, count what is left, then append. Returns the count *before*
+# the append so callers can compare against thresholds without a second call.
+# Time comes from the Redis server so every replica shares one clock.
+APPEND_SCRIPT = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local window = tonumber(ARGV[1])
+local max_entries = tonumber(ARGV[3])
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now - window)
+local count = redis.call('ZCARD', KEYS[1])
+redis.call('ZADD', KEYS[1], now, ARGV[2])
+if max_entries > 0 and count + 1 > max_entries then
+    redis.call('ZREMRANGEBYRANK', KEYS[1], 0, count - max_entries)
+end
+redis.call('EXPIRE', KEYS[1], math.ceil(window))
+return count
+"""
+
+COUNT_SCRIPT = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now - tonumber(ARGV[1]))
+return redis.call('ZCARD', KEYS[1])
+"""
+
+
+class MemoryWindowStore:
+    """
+    In-process sliding windows
+
+    Each key holds a bounded deque of timestamps; keys are kept in LRU order
+    and evicted past max_keys or once their newest entry has expired.
+    """
+
+    def __init__(self, max_entries: int = 1000, max_keys: int = 100000):
+        self.max_entries = max_entries
+        self.max_keys = max_keys
+        self._windows: "OrderedDict[str, Tuple[float, deque]]" = OrderedDict()
+        self._ops = 0
+
+    async def append(self, key: str, window: float) -> int:
+        """Record an event; returns the number of events already in the window"""
+        now = time.time()
+        events = self._trimmed(key, now, window)
+        if events is None:
+            events = deque(maxlen=self.max_entries or None)
+            if len(self._windows) >= self.max_keys:
+                self._windows.popitem(last=False)
+
+        count = len(events)
+        events.append(now)
+        self._windows[key] = (window, events)
+        self._windows.move_to_end(key)
+
+        self._ops += 1
+        if self._ops % 1000 == 0:
+            self._sweep(now)
+
+        return count
+
+    async def count(self, key: str, window: float) -> int:
+        """Number of events in the window"""
+        events = self._trimmed(key, time.time(), window)
+        return len(events) if events else 0
+
+    async def clear(self, key: str):
+        self._windows.pop(key, None)
+
+    def _trimmed(self, key: str, now: float, window: float) -> Optional[deque]:
+        entry = self._windows.get(key)
+        if entry is None:
+            return None
+        events = entry[1]
+        cutoff = now - window
+        while events and events[0] <= cutoff:
+            events.popleft()
+        return events
+
+    def _sweep(self, now: float):
+        """Drop keys whose newest event has left their window"""
+        stale = [
+            key for key, (window, events) in self._windows.items()
+            if not events or events[-1] <= now - window
+        ]
+        for key in stale:
+            del self._windows[key]
+
+    async def close(self):
+        pass
+
+
+class RedisWindowStore:
+    """
+    Sliding windows in Redis sorted sets (score = event time)
+
+    Append/trim/count run as one Lua call per event, so windows stay
+    consistent across workers and replicas. Keys expire after one window of
+    inactivity. If Redis is unreachable the in-process store takes over until
+    it recovers.
+    """
+
+    def __init__(self, client, prefix: str, max_entries: int, fallback: MemoryWindowStore):
+        self.prefix = prefix
+        self.max_entries = max_entries
+        self.fallback = fallback
+        self._redis = client
+        self._append = self._redis.register_script(APPEND_SCRIPT)
+        self._count = self._redis.register_script(COUNT_SCRIPT)
+        self._degraded = False
+
+    def _key(self, key: str) -> str:
+        return f"{self.prefix}:{key}"
+
+    async def append(self, key: str, window: float) -> int:
+        member = uuid.uuid4().hex
+        try:
+            count = await self._append(keys=[self._key(key)], args=[window, member, self.max_entries])
+            self._recovered()
+            return int(count)
+        except Exception as e:
+            self._degrade(e)
+            return await self.fallback.append(key, window)
+
+    async def count(self, key: str, window: float) -> int:
+        try:
+            count = await self._count(keys=[self._key(key)], args=[window])
+            self._recovered()
+            return int(count)
+        except Exception as e:
+            self._degrade(e)
+            return await self.fallback.count(key, window)
+
+    async def clear(self, key: str):
+        await self.fallback.clear(key)
+        try:
+            await self._redis.delete(self._key(key))
+        except Exception as e:
+            self._degrade(e)
+
+    def _degrade(self, error: Exception):
+        if not self._degraded:
+            logger.warning(f"Redis state unavailable, using in-process fallback: {error}")
+            self._degraded = True
+
+    def _recovered(self):
+        if self._degraded:
+            logger.info("Redis state recovered")
+            self._degraded = False
+
+    async def close(self):
+        pass
+
+
+_redis_client = None
+
+
+def get_redis():
+    """Shared async Redis client for moderation state and caches"""
+    global _redis_client
+    if _redis_client is None:
+        import redis.asyncio as redis
+        _redis_client = redis.from_url(settings.REDIS_URL)
+    return _redis_client
+
+
+async def close_redis():
+    global _redis_client
+    if _redis_client is not None:
+        await _redis_client.aclose()
+        _redis_client = None
+
+
+def create_window_store():
+    """Build the configured state backend"""
+    fallback = MemoryWindowStore(
+        max_entries=settings.STATE_MAX_ENTRIES,
+        max_keys=settings.STATE_MAX_KEYS,
+    )
+    if settings.STATE_BACKEND != "redis":
+        return fallback
+
+    try:
+        return RedisWindowStore(
+            get_redis(),
+            prefix=settings.STATE_KEY_PREFIX,
+            max_entries=settings.STATE_MAX_ENTRIES,
+            fallback=fallback,
+        )
+    except Exception as e:
+        logger.warning(f"Redis state backend unavailable, using in-process state: {e}")
+        return fallback
+
+
+# Global instance
+window_store = create_window_store()
@@ -1,11 +1,16 @@
 """
 Toxicity Detection
 """
+import asyncio
 import logging
-from typing import Dict, Optional
-import httpx
+from typing import Dict, List, Optional
 
 from ..config import settings
+from .ai_client import AIModerationClient
+from .batcher import InferenceBatcher
+from .cache import ResultCache
+from .matcher import normalize_text
+from .state import get_redis
 
 logger = logging.getLogger(__name__)
 
@@ -15,18 +20,88 @@ class ToxicityDetector:
 
     def __init__(self):
         self.detoxify_model = None
+        self.backend: Optional[str] = None
+        self.batcher: Optional[InferenceBatcher] = None
+        self.cache: Optional[ResultCache] = None
+        self.ai_client = AIModerationClient()
+        if settings.RESULT_CACHE_ENABLED:
+            self.cache = ResultCache(
+                prefix=f"{settings.STATE_KEY_PREFIX}:result",
+                maxsize=settings.RESULT_CACHE_SIZE,
+                redis_client=self._cache_redis(),
+            )
         if settings.USE_DETOXIFY:
             self._load_detoxify()
 
     def _load_detoxify(self):
-        """Load Detoxify model"""
+        """Load Detoxify model (ONNX Runtime backend when configured, else PyTorch)"""
         try:
-            from detoxify import Detoxify
-            self.detoxify_model = Detoxify('original')
-            logger.info("✅ Detoxify model loaded")
+            if settings.DETOXIFY_BACKEND == "onnx":
+                from .onnx_backend import load_backend
+                self.detoxify_model = load_backend(
+                    settings.DETOXIFY_MODEL,
+                    settings.DETOXIFY_ONNX_DIR,
+                    quantize=settings.DETOXIFY_ONNX_QUANTIZE,
+                    threads=settings.DETOXIFY_THREADS,
+                )
+                if self.detoxify_model is None:
+                    logger.warning("Falling back to the PyTorch Detoxify backend")
+                else:
+                    self.backend = "onnx"
+            if self.detoxify_model is None:
+                from detoxify import Detoxify
+                self.detoxify_model = Detoxify(settings.DETOXIFY_MODEL)
+                self.backend = "torch"
+            self.batcher = InferenceBatcher(
+                self._predict_batch,
+                max_batch_size=settings.DETOXIFY_BATCH_SIZE,
+                max_wait_ms=settings.DETOXIFY_BATCH_WAIT_MS,
+                workers=settings.DETOXIFY_WORKERS,
+                max_queue=settings.DETOXIFY_MAX_QUEUE,
+                name="detoxify",
+            )
+            logger.info(f"✅ Detoxify model loaded ({self.backend})")
         except Exception as e:
             logger.error(f"Failed to load Detoxify model: {e}")
             self.detoxify_model = None
+            self.backend = None
+
+    @property
+    def saturated(self) -> bool:
+        """True while the Detoxify queue is full (callers should hold off)"""
+        return bool(self.batcher and self.batcher.saturated)
+
+    def _cache_redis(self):
+        if not settings.RESULT_CACHE_REDIS:
+            return None
+        try:
+            return get_redis()
+        except Exception as e:
+            logger.warning(f"Result cache Redis tier unavailable, using in-process cache only: {e}")
+            return None
+
+    def _cache_keys(self, messages: List[str]) -> List[str]:
+        """Hash of the normalized message (case, whitespace and confusables folded)"""
+        return [ResultCache.digest(normalize_text(m)) for m in messages]
+
+    @property
+    def _detoxify_namespace(self) -> str:
+        """
+        Cache namespace of the loaded model; scores from another model or
+        backend (e.g. mid-rollout, sharing the Redis tier) are never served
+        """
+        backend = self.backend
+        if backend == "onnx" and settings.DETOXIFY_ONNX_QUANTIZE:
+            backend = "onnx-int8"
+        return f"detoxify:{settings.DETOXIFY_MODEL}:{backend}"
+
+    def _predict_batch(self, messages: List[str]) -> List[Dict[str, float]]:
+        """Run Detoxify on a batch (called on the batcher's worker thread)"""
+        scores = self.detoxify_model.predict(messages)
+        return [
+            {category: float(values[i]) for category, values in scores.items()}
+            for i in range(len(messages))
+        ]
 
     async def check_toxicity(self, message: str) -> Dict[str, any]:
         """
@@ -40,76 +115,120 @@ class ToxicityDetector:
                 "reason": str
             }
         """
-        result = {
-            "is_toxic": False,
-            "toxicity_score": 0.0,
-            "categories": {},
-            "reason": None,
-        }
+        deadline = self.deadline()
+        result = (await self.check_detoxify_batch([message]))[0]
 
-        # Use Detoxify model
-        if self.detoxify_model and settings.USE_DETOXIFY:
-            try:
-                scores = self.detoxify_model.predict(message)
+        # Use AI for contextual analysis
+        self.apply_ai_verdict(result, await self.check_ai(message, deadline))
+
+        return result
 
-                # Check each category
-                categories = {}
-                max_score = 0.0
-                max_category = None
+    async def check_toxicity_batch(self, messages: List[str]) -> List[Dict[str, any]]:
+        """Check several messages; Detoxify scores them as batches, results keep input order"""
+        deadline = self.deadline()
+        results = await self.check_detoxify_batch(messages)
 
-                for category, score in scores.items():
-                    categories[category] = float(score)
-                    if score > max_score:
-                        max_score = score
-                        max_category = category
+        ai_results = await asyncio.gather(*(self.check_ai(m, deadline) for m in messages))
+        for result, ai_result in zip(results, ai_results):
+            self.apply_ai_verdict(result, ai_result)
 
-                result["categories"] = categories
-                result["toxicity_score"] = max_score
+        return results
 
-                if max_score >= settings.TOXICITY_THRESHOLD:
-                    result["is_toxic"] = True
-                    result["reason"] = f"High {max_category} score ({max_score:.2f})"
+    async def check_detoxify_batch(
+        self, messages: List[str], threshold: Optional[float] = None
+    ) -> List[Dict[str, any]]:
+        """Score messages with Detoxify only (empty results when it is disabled)"""
+        results = [self.empty_result() for _ in messages]
 
+        if self.batcher and settings.USE_DETOXIFY:
+            try:
+                if self.cache:
+                    batch_scores = await self.cache.get_or_compute(
+                        self._detoxify_namespace,
+                        self._cache_keys(messages),
+                        messages,
+                        self.batcher.submit_many,
+                        ttl=settings.TOXICITY_CACHE_TTL,
+                    )
+                else:
+                    batch_scores = await self.batcher.submit_many(messages)
+                for result, scores in zip(results, batch_scores):
+                    self._apply_scores(result, scores, threshold)
             except Exception as e:
                 logger.error(f"Detoxify check failed: {e}")
 
-        # Use AI for contextual analysis
-        if settings.USE_AI_MODERATION:
-            ai_result = await self._check_with_ai(message)
-            if ai_result["is_toxic"]:
-                result["is_toxic"] = True
-                result["reason"] = result["reason"] or ai_result["reason"]
+        return results
 
-        return result
+    async def check_ai(self, message: str, deadline: Optional[float] = None) -> Dict[str, any]:
+        """
+        AI contextual verdict (not toxic when AI moderation is disabled)
 
-    async def _check_with_ai(self, message: str) -> Dict[str, any]:
-        """Use AI personality for contextual toxicity check"""
-        try:
-            async with httpx.AsyncClient() as client:
-                response = await client.post(
-                    f"{settings.AI_PERSONALITY_URL}/api/v1/chat",
-                    json={
-                        "message": f"Analyze if this message is toxic, hateful, harassing, or inappropriate. Reply ONLY with 'TOXIC: <reason>' if it is, or 'SAFE' if it's not: \"{message}\"",
-                        "platform": "moderation",
-                    },
-                    timeout=5.0,
-                )
+        deadline is the event-loop time the message's moderation must finish
+        by. When the AI cannot answer in time, or its circuit is open, the
+        verdict is "not toxic" and the message is judged on Detoxify alone.
+        """
+        if not settings.USE_AI_MODERATION:
+            return {"is_toxic": False, "reason": None}
 
-                if response.status_code == 200:
-                    result_data = response.json()
-                    ai_response = result_data.get("response", "").strip()
+        if self.cache:
+            verdict = (await self.cache.get_or_compute(
+                "ai",
+                self._cache_keys([message]),
+                [message],
+                lambda messages: self._check_with_ai_many(messages, deadline),
+                ttl=settings.AI_VERDICT_CACHE_TTL,
+            ))[0]
+        else:
+            verdict = await self.ai_client.classify(message, deadline)
 
-                    if ai_response.startswith("TOXIC"):
-                        reason = ai_response.replace("TOXIC:", "").strip()
-                        return {
-                            "is_toxic": True,
-                            "reason": f"AI: {reason}",
-                        }
+        return verdict or {"is_toxic": False, "reason": None}
 
-        except Exception as e:
-            logger.warning(f"AI moderation check failed: {e}")
+    async def _check_with_ai_many(
+        self, messages: List[str], deadline: Optional[float] = None
+    ) -> List[Optional[Dict[str, any]]]:
+        return list(await asyncio.gather(*(self.ai_client.classify(m, deadline) for m in messages)))
 
-        return {"is_toxic": False, "reason": None}
+    @staticmethod
+    def deadline() -> float:
+        """Event-loop time by which a message entering moderation now must be decided"""
+        return asyncio.get_running_loop().time() + settings.MODERATION_BUDGET_MS / 1000
+
+    def empty_result(self) -> Dict[str, any]:
+        return {
+            "is_toxic": False,
+            "toxicity_score": 0.0,
+            "categories": {},
+            "reason": None,
+        }
+
+    def _apply_scores(self, result: Dict, scores: Dict[str, float], threshold: Optional[float] = None):
+        """Fill a result from Detoxify category scores"""
+        if threshold is None:
+            threshold = settings.TOXICITY_THRESHOLD
+
+        # Check each category
+        categories = {}
+        max_score = 0.0
+        max_category = None
+
+        for category, score in scores.items():
+            categories[category] = float(score)
+            if score > max_score:
+                max_score = score
+                max_category = category
+
+        result["categories"] = categories
+        result["toxicity_score"] = max_score
+
+        if max_score >= threshold:
+            result["is_toxic"] = True
+            result["reason"] = f"High {max_category} score ({max_score:.2f})"
+
+    def apply_ai_verdict(self, result: Dict, ai_result: Dict):
+        """Merge an AI verdict into a result"""
+        if ai_result["is_toxic"]:
+            result["is_toxic"] = True
+            result["reason"] = result["reason"] or ai_result["reason"]
 
     async def check_hate_speech(self, message: str) -> bool:
         """Check specifically for hate speech"""
@@ -124,6 +243,21 @@ class ToxicityDetector:
 
         return False
 
+    def get_metrics(self) -> Dict[str, any]:
+        """Inference metrics"""
+        return {
+            "backend": self.backend,
+            "detoxify": self.batcher.get_metrics() if self.batcher else None,
+            "cache": self.cache.get_metrics() if self.cache else None,
+            "ai": self.ai_client.get_metrics(),
+        }
+
+    async def close(self):
+        """Release inference workers and pooled connections"""
+        if self.batcher:
+            await self.batcher.close()
+        await self.ai_client.close()
+
 
 # Global instance
 toxicity_detector = ToxicityDetector()
@@ -1,13 +1,20 @@
 """
 Moderation API Routes
 """
-from fastapi import APIRouter, HTTPException
-from pydantic import BaseModel
-from typing import List, Optional
+from fastapi import APIRouter, HTTPException, WebSocket, WebSocketDisconnect
+from pydantic import BaseModel, Field, ValidationError
+from typing import Any, Dict, List, Optional, Set
+import asyncio
 import logging
 
+from ..config import settings
 from ..moderation.engine import moderation_engine
 from ..moderation.filter import content_filter
+from ..moderation.pipeline import moderation_pipeline
+from ..moderation.policy import policy_registry
+from ..moderation.rules import rule_sync
+from ..moderation.spam import spam_detector
+from ..moderation.toxicity import toxicity_detector
 
 logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/api/v1/moderate", tags=["moderation"])
@@ -31,6 +38,37 @@ class ModerateResponse(BaseModel):
     scores: dict
     actions: List[str]
     reason: Optional[str]
+    timings: dict = {}  # Per-stage latency in ms
+    skipped_stages: List[str] = []
+
+
+class ModerateBatchRequest(BaseModel):
+    messages: List[ModerateRequest] = Field(..., max_length=settings.MAX_BATCH_MESSAGES)
+
+
+class ModerateBatchResponse(BaseModel):
+    results: List[ModerateResponse]  # Same order as the request
+
+
+class ChannelPolicyRequest(BaseModel):
+    """Per-channel overrides; omitted fields use the service settings"""
+    toxicity_threshold: Optional[float] = Field(None, ge=0.0, le=1.0)
+    spam_threshold: Optional[float] = Field(None, ge=0.0)
+    severe_score: Optional[float] = Field(None, ge=0.0)  # Action cutoffs on the highest score
+    severe_violations: Optional[int] = Field(None, ge=1)
+    moderate_score: Optional[float] = Field(None, ge=0.0)
+    minor_score: Optional[float] = Field(None, ge=0.0)
+    auto_delete: Optional[bool] = None
+    auto_timeout: Optional[bool] = None
+    auto_ban: Optional[bool] = None
+    whitelist_roles: Optional[List[str]] = None
+    whitelist_users: Optional[List[str]] = None
+    allowed_domains: Optional[List[str]] = None
+    blocked_domains: Optional[List[str]] = None
+    banned_words: Optional[List[str]] = None  # Scanned in addition to the shared banned list
+    banned_phrases: Optional[List[str]] = None
+    stages: Optional[List[str]] = None
+    skip_if_decided: Optional[List[str]] = None
 
 
 @router.post("/check", response_model=ModerateResponse)
@@ -57,37 +95,246 @@ async def check_message(request: ModerateRequest):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.post("/check-batch", response_model=ModerateBatchResponse)
+async def check_messages(request: ModerateBatchRequest):
+    """
+    Check many messages in one call
+
+    Lets a bot flush its buffered channel messages in a single round trip
+    """
+    try:
+        results = await moderation_engine.moderate_batch(
+            [item.model_dump() for item in request.messages]
+        )
+
+        return ModerateBatchResponse(results=[ModerateResponse(**r) for r in results])
+
+    except Exception as e:
+        logger.error(f"Batch moderation check failed: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+stream_stats = {
+    "connections": 0,
+    "open_connections": 0,
+    "requests": 0,
+    "errors": 0,
+    "backpressure_pauses": 0,
+}
+
+
+class ModerationStream:
+    """
+    One bot connection: pipelined requests in, verdicts out as they finish
+
+    Requests are moderated concurrently, up to WS_MAX_IN_FLIGHT per
+    connection; a request holds its slot until its reply has been sent. At
+    that limit, or while the toxicity batcher is saturated, the stream stops
+    reading frames, so the client's socket buffer fills and the bot slows
+    down instead of the service queueing without bound, including when the
+    bot stops reading replies. All sends go through one writer task; if it
+    fails, the connection is closed.
+    """
+
+    def __init__(self, websocket: WebSocket):
+        self.websocket = websocket
+        self._slots = asyncio.Semaphore(settings.WS_MAX_IN_FLIGHT)
+        # Every queued reply holds a slot, so this never fills up
+        self._outbox: asyncio.Queue = asyncio.Queue(maxsize=settings.WS_MAX_IN_FLIGHT)
+        self._tasks: Set[asyncio.Task] = set()
+
+    async def run(self):
+        writer = asyncio.create_task(self._write())
+        reader = asyncio.create_task(self._read())
+        try:
+            await asyncio.wait({reader, writer}, return_when=asyncio.FIRST_COMPLETED)
+            if writer.done():
+                # Nobody would deliver further verdicts: stop reading and hang up
+                logger.warning(f"Moderation stream writer failed, closing connection: {writer.exception()}")
+                stream_stats["errors"] += 1
+                try:
+                    await self.websocket.close(code=1011)
+                except Exception:
+                    pass # Already gone
+            else:
+                reader.result()
+        finally:
+            reader.cancel()
+            for task in self._tasks:
+                task.cancel()
+            await asyncio.gather(reader, *self._tasks, return_exceptions=True)
+            writer.cancel()
+            await asyncio.gather(writer, return_exceptions=True)
+
+    async def _read(self):
+        try:
+            while True:
+                await self._wait_for_capacity()
+                try:
+                    frame = await self.websocket.receive_json()
+                except (ValueError, KeyError):
+                    stream_stats["errors"] += 1
+                    await self._outbox.put({"id": None, "error": "Frames must be JSON objects"})
+                    continue
+                self._dispatch(frame)
+        except WebSocketDisconnect:
+            pass
+
+    async def _wait_for_capacity(self):
+        await self._slots.acquire()
+        if toxicity_detector.saturated:
+            stream_stats["backpressure_pauses"] += 1
+            while toxicity_detector.saturated:
+                await asyncio.sleep(settings.WS_BACKPRESSURE_POLL_MS / 1000)
+
+    def _dispatch(self, frame: Any):
+        correlation_id = frame.get("id") if isinstance(frame, dict) else None
+        try:
+            request = ModerateRequest.model_validate(frame)
+        except ValidationError as e:
+            stream_stats["errors"] += 1
+            self._outbox.put_nowait({"id": correlation_id, "error": str(e)})
+            return
+
+        task = asyncio.create_task(self._moderate(correlation_id, request))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _moderate(self, correlation_id: Optional[Any], request: ModerateRequest):
+        stream_stats["requests"] += 1
+        try:
+            result = await moderation_engine.moderate_message(
+                message=request.message,
+                user_id=request.user_id,
+                username=request.username,
+                platform=request.platform,
+                channel_id=request.channel_id,
+                user_roles=request.user_roles,
+            )
+            reply: Dict[str, Any] = {
+                "id": correlation_id,
+                "result": ModerateResponse(**result).model_dump(),
+            }
+        except Exception as e:
+            stream_stats["errors"] += 1
+            logger.error(f"Streamed moderation check failed: {e}")
+            reply = {"id": correlation_id, "error": str(e)}
+
+        await self._outbox.put(reply)
+
+    async def _write(self):
+        while True:
+            reply = await self._outbox.get()
+            await self.websocket.send_json(reply)
+            # Only a delivered reply frees its slot for the next frame
+            self._slots.release()
+
+
+@router.websocket("/stream")
+async def moderation_stream(websocket: WebSocket):
+    """
+    Moderate a stream of messages over one connection
+
+    Send one ModerateRequest JSON object per frame with an "id" field. Each
+    verdict comes back as {"id": ..., "result": ModerateResponse}, or
+    {"id": ..., "error": str}, in completion order rather than send order.
+    """
+    await websocket.accept()
+    stream_stats["connections"] += 1
+    stream_stats["open_connections"] += 1
+    try:
+        await ModerationStream(websocket).run()
+    finally:
+        stream_stats["open_connections"] -= 1
+
+
 @router.post("/filter/add-word")
 async def add_banned_word(word: str):
-    """Add a word to the banned list"""
-    content_filter.add_banned_word(word)
-    return {"message": f"Added '{word}' to banned words"}
+    """Add a word to the banned list (shared with every worker when rules live in Redis)"""
+    try:
+        if rule_sync:
+            await rule_sync.add_words([word])
+        else:
+            content_filter.add_banned_word(word)
+    except Exception as e:
+        logger.error(f"Failed to add banned word: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+    return {"message": f"Added '{word}' to banned words", "version": content_filter.version}
 
 
 @router.post("/filter/add-phrase")
 async def add_banned_phrase(phrase: str):
     """Add a phrase to the banned list"""
-    content_filter.add_phrase(phrase)
-    return {"message": f"Added '{phrase}' to banned phrases"}
+    try:
+        if rule_sync:
+            await rule_sync.add_phrases([phrase])
+        else:
+            content_filter.add_phrase(phrase)
+    except Exception as e:
+        logger.error(f"Failed to add banned phrase: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+    return {"message": f"Added '{phrase}' to banned phrases", "version": content_filter.version}
 
 
 @router.delete("/filter/remove-word")
 async def remove_banned_word(word: str):
     """Remove a word from the banned list"""
-    content_filter.remove_word(word)
-    return {"message": f"Removed '{word}' from banned words"}
+    try:
+        if rule_sync:
+            await rule_sync.remove_words([word])
+        else:
+            content_filter.remove_word(word)
+    except Exception as e:
+        logger.error(f"Failed to remove banned word: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+    return {"message": f"Removed '{word}' from banned words", "version": content_filter.version}
 
 
 @router.get("/filter/words")
 async def get_banned_words():
     """Get list of banned words"""
-    return {"banned_words": content_filter.get_banned_words()}
+    return {"banned_words": content_filter.get_banned_words(), "version": content_filter.version}
+
+
+@router.get("/policy/{platform}/{channel_id}")
+async def get_channel_policy(platform: str, channel_id: str):
+    """Get a channel's policy overrides"""
+    policy = await policy_registry.get(platform, channel_id)
+    return {"key": policy_registry.key(platform, channel_id), "version": policy.version, "overrides": policy.overrides}
+
+
+@router.put("/policy/{platform}/{channel_id}")
+async def set_channel_policy(platform: str, channel_id: str, request: ChannelPolicyRequest):
+    """Replace a channel's policy overrides (shared with every worker when policies live in Redis)"""
+    overrides = request.model_dump(exclude_none=True)
+    unknown = set(overrides.get("stages", [])) | set(overrides.get("skip_if_decided", []))
+    unknown -= set(moderation_pipeline.stage_names)
+    if unknown:
+        raise HTTPException(status_code=422, detail=f"Unknown moderation stages: {sorted(unknown)}")
+
+    try:
+        version = await policy_registry.set(platform, channel_id, overrides)
+    except Exception as e:
+        logger.error(f"Failed to set channel policy: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+    return {"key": policy_registry.key(platform, channel_id), "version": version, "overrides": overrides}
+
+
+@router.delete("/policy/{platform}/{channel_id}")
+async def reset_channel_policy(platform: str, channel_id: str):
+    """Drop a channel's overrides so it follows the service settings again"""
+    try:
+        version = await policy_registry.set(platform, channel_id, {})
+    except Exception as e:
+        logger.error(f"Failed to reset channel policy: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+    return {"key": policy_registry.key(platform, channel_id), "version": version}
 
 
 @router.get("/violations/{user_id}")
 async def get_user_violations(user_id: str):
     """Get violation count for a user"""
-    count = moderation_engine.get_user_violations(user_id)
+    count = await moderation_engine.get_user_violations(user_id)
     return {
         "user_id": user_id,
         "violation_count": count,
@@ -97,5 +344,18 @@ async def get_user_violations(user_id: str):
 @router.delete("/violations/{user_id}")
 async def clear_user_violations(user_id: str):
     """Clear violations for a user"""
-    moderation_engine.clear_user_violations(user_id)
+    await moderation_engine.clear_user_violations(user_id)
     return {"message": f"Cleared violations for user {user_id}"}
+
+
+@router.get("/metrics")
+async def get_metrics():
+    """Moderation pipeline metrics"""
+    return {
+        "stages": moderation_pipeline.get_metrics(),
+        "toxicity": toxicity_detector.get_metrics(),
+        "spam": spam_detector.get_metrics(),
+        "stream": stream_stats,
+        "rules": rule_sync.get_metrics() if rule_sync else {"version": content_filter.version},
+        "policies": policy_registry.get_metrics(),
+    }
@@ -0,0 +1 @@
+# Tests for auto-mod service
@@ -0,0 +1,73 @@
+"""
+Tests for spam feature extraction, against the regexes check_spam used before
+"""
+import re
+
+import pytest
+
+from src.moderation.features import extract_features
+
+LEGACY_EMOJI = r'[\U0001F600-\U0001F64F\U0001F300-\U0001F5FF\U0001F680-\U0001F6FF\U0001F1E0-\U0001F1FF]'
+LEGACY_SPAM_PATTERNS = [
+    r'(?i)(buy|sell|cheap|discount|offer|deal).*(now|today|limited)',
+    r'(?i)(click here|check out|visit|go to).*(link|website)',
+    r'(?i)(free|prize|winner|won|claim).*(money|gift|reward)',
+    r'(?i)(dm me|message me|add me).*(discord|telegram|whatsapp)',
+]
+
+MESSAGES = [
+    "",
+    "hello there",
+    "hhhhhhttps://evil.example/x",
+    "@@@@@@@@bob hi",
+    "!!!!!!!@bob https://a.example",
+    "https://example.com/@alice/status",
+    "see https://example.com/😀😀 now",
+    "😀😀😀😀😀😀😀 party",
+    "WOW THIS IS GREAT",
+    "ÉCOLE NAÏVE ÀÀÀÀÀÀ",
+    "buy cheap\nnow",
+    "buy cheap stuff now!!!",
+    "click here for the link",
+    "free money\nfree money",
+    "line one\n@carol\nhttp://x.y/zzzzzzzz",
+    "aaaaa aaaaa",
+    "@a@b@c https://x https://y",
+    "ﬀﬀﬀﬀﬀﬀ Straße",
+]
+
+
+def legacy_features(message: str):
+    """The multi-pass implementation check_spam used before extract_features"""
+    return (
+        sum(1 for c in message if c.isupper()) / max(len(message), 1),
+        len(re.findall(LEGACY_EMOJI, message)),
+        len(re.findall(r'@\w+', message)),
+        re.findall(r'https?://[^\s]+', message),
+        re.search(r'(.)\1{5,}', message) is not None,
+        any(re.search(pattern, message) for pattern in LEGACY_SPAM_PATTERNS),
+    )
+
+
+class TestExtractFeatures:
+    """Test extract_features parity with the legacy regexes"""
+
+    @pytest.mark.parametrize("message", MESSAGES)
+    def test_matches_legacy_regexes(self, message):
+        """Should report exactly what the legacy regexes found"""
+        f = extract_features(message)
+        caps, emojis, mentions, links, has_run, has_pattern = legacy_features(message)
+        assert f.caps_ratio == pytest.approx(caps)
+        assert f.emoji_count == emojis
+        assert f.mention_count == mentions
+        assert f.links == links
+        assert f.has_repeated_chars == has_run
+        assert f.has_spam_pattern == has_pattern
+
+    def test_run_does_not_hide_link(self):
+        """Should find a link that directly follows a run of its first character"""
+        assert extract_features("hhhhhhttps://evil.example/x").links == ["https://evil.example/x"]
+
+    def test_run_does_not_hide_mention(self):
+        """Should count a mention that directly follows a run of @"""
+        assert extract_features("@@@@@@@@bob hi").mention_count == 1
@@ -0,0 +1 @@
+"""Knowledge Service benchmarks"""
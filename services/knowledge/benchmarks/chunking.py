@@ -0,0 +1,191 @@
+"""
+Chunker benchmark: token-offset splitter vs the recursive character splitter
+
+Both chunkers split the same corpus; every chunk is then re-tokenized with
+the embedding model's tokenizer to measure how close its real size is to
+the budget the chunker was given. The character splitter is configured the
+way it was used before (CHUNK_TOKENS * 4 characters, token counts estimated
+as len / 4), so it targets the same nominal size.
+
+Reported per chunker: throughput (chunks/s, MB/s, best of --repeat runs),
+real tokens per chunk (mean, p5, p95, max), fill (real tokens / budget),
+the share of chunks over budget (truncated by the embedding model) or under
+half of it (wasted context), and the error of the stored tokenCount.
+
+The token splitter tokenizes every character, so it is several times
+slower than the character splitter (on the synthetic corpus with a BERT
+WordPiece tokenizer about 1.5 vs 7-9 MB/s); CHUNKER=characters stays the
+default and this benchmark is how to judge the trade on real documents.
+
+Usage (from services/knowledge):
+    python -m benchmarks.chunking [FILE ...] --tokenizer path/to/tokenizer.json
+        [--tokens 128] [--overlap 12] [--repeat 3] [--synthetic-mb 4]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from typing import Callable, Dict, List, Tuple
+
+import numpy as np
+
+# Chunker settings come from the command line, not the service's .env
+os.environ.setdefault("DATABASE_URL", "postgresql://benchmark")
+os.environ.setdefault("REDIS_URL", "redis://benchmark")
+os.environ.setdefault("CHROMA_HOST", "localhost")
+os.environ.setdefault("CHROMA_PORT", "8000")
+
+from langchain_text_splitters import RecursiveCharacterTextSplitter  # noqa: E402
+
+from src.rag.chunking import TokenSplitter, load_tokenizer  # noqa: E402
+
+# (content, stored tokenCount) per chunk
+Chunker = Callable[[str], List[Tuple[str, int]]]
+
+
+# Common English words, drawn Zipf-like so the corpus tokenizes like prose
+COMMON_WORDS = (
+    "the of and to a in is it you that he was for on are with as his they be at one have this from "
+    "or had by word but what some we can out other were all there when up use your how said an each "
+    "she which do their time if will way about many then them write would like so these her long make "
+    "thing see him two has look more day could go come did number sound no most people my over know "
+    "water than call first who may down side been now find any new work part take get place made live "
+    "where after back little only round man year came show every good me give our under name very "
+    "through just form sentence great think say help low line differ turn cause much mean before move "
+    "right boy old too same tell does set three want air well also play small end put home read hand "
+    "port large spell add even land here must big high such follow act why ask men change went light "
+    "kind off need house picture try us again animal point mother world near build self earth father "
+    "account billing invoice customer support channel server moderation configuration deployment "
+    "integration webhook permission subscription dashboard analytics notification"
+).split()
+
+
+def synthetic_corpus(megabytes: float, seed: int = 7) -> str:
+    """Markdown-ish prose with headings, lists, long paragraphs, identifiers and code."""
+    rng = random.Random(seed)
+    weights = [1 / (rank + 1) for rank in range(len(COMMON_WORDS))]
+    specials = ["SKU-4411-B", "@wave_bot", "v2.14.1", "https://example.com/docs", "user_id", "École", "naïve"]
+
+    def words(count: int) -> List[str]:
+        return rng.choices(COMMON_WORDS, weights, k=count)
+
+    def sentence() -> str:
+        tokens = words(rng.randint(6, 28))
+        if rng.random() < 0.3:
+            tokens.insert(rng.randrange(len(tokens)), rng.choice(specials))
+        return " ".join(tokens).capitalize() + rng.choice([".", ".", ".", "?", "!"])
+
+    parts = []
+    size = 0
+    while size < megabytes * 1_000_000:
+        kind = rng.random()
+        if kind < 0.1:
+            part = "## " + " ".join(words(rng.randint(2, 6))).title()
+        elif kind < 0.25:
+            part = "\n".join(f"- {sentence()}" for _ in range(rng.randint(2, 8)))
+        elif kind < 0.3:
+            part = "```\n" + "\n".join(
+                f"{rng.choice(COMMON_WORDS)}_{rng.choice(COMMON_WORDS)}({rng.randint(0, 999)})"
+                for _ in range(rng.randint(3, 15))
+            ) + "\n```"
+        else:
+            part = " ".join(sentence() for _ in range(rng.randint(1, 14)))
+        parts.append(part)
+        size += len(part) + 2
+    return "\n\n".join(parts)
+
+
+def character_chunker(tokens: int, overlap: int) -> Chunker:
+    splitter = RecursiveCharacterTextSplitter(
+        chunk_size=tokens * 4,
+        chunk_overlap=overlap * 4,
+        separators=["\n\n", "\n", " ", ""],
+    )
+
+    def chunk(text: str) -> List[Tuple[str, int]]:
+        return [(piece, len(piece) // 4) for piece in splitter.split_text(text)]
+    return chunk
+
+
+def token_chunker(tokenizer, tokens: int, overlap: int) -> Chunker:
+    splitter = TokenSplitter(tokenizer, tokens, overlap)
+
+    def chunk(text: str) -> List[Tuple[str, int]]:
+        return [(content, count) for _, content, count in splitter.split(text)]
+    return chunk
+
+
+def measure(name: str, chunker: Chunker, texts: List[str], tokenizer, budget: int, repeat: int) -> Dict:
+    best = float("inf")
+    chunks: List[Tuple[str, int]] = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        chunks = [chunk for text in texts for chunk in chunker(text)]
+        best = min(best, time.perf_counter() - started)
+
+    contents = [content for content, _ in chunks]
+    real = np.array([len(e.ids) for e in tokenizer.encode_batch(contents, add_special_tokens=False)])
+    stored = np.array([count for _, count in chunks])
+    megabytes = sum(len(text.encode()) for text in texts) / 1_000_000
+    return {
+        "chunker": name,
+        "chunks": len(chunks),
+        "chunks/s": len(chunks) / best,
+        "MB/s": megabytes / best,
+        "tokens mean": real.mean(),
+        "tokens p5": np.percentile(real, 5),
+        "tokens p95": np.percentile(real, 95),
+        "tokens max": real.max(),
+        "fill": (real / budget).mean(),
+        "over budget %": 100 * (real > budget).mean(),
+        "under half %": 100 * (real < budget / 2).mean(),
+        "tokenCount err %": 100 * (np.abs(stored - real) / np.maximum(real, 1)).mean(),
+    }
+
+
+def print_table(rows: List[Dict]):
+    columns = list(rows[0])
+    formatted = [
+        [f"{row[c]:.1f}" if isinstance(row[c], (float, np.floating)) else str(row[c]) for c in columns]
+        for row in rows
+    ]
+    widths = [max(len(c), *(len(r[i]) for r in formatted)) for i, c in enumerate(columns)]
+    print("  ".join(c.rjust(w) for c, w in zip(columns, widths, strict=True)))
+    for r in formatted:
+        print("  ".join(v.rjust(w) for v, w in zip(r, widths, strict=True)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare chunkers on throughput and size accuracy")
+    parser.add_argument("files", nargs="*", help="Text files to chunk (default: synthetic corpus)")
+    parser.add_argument("--tokenizer", required=True, help="Embedding model's tokenizer.json")
+    parser.add_argument("--tokens", type=int, default=128, help="Token budget per chunk")
+    parser.add_argument("--overlap", type=int, default=12, help="Overlap in tokens")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--synthetic-mb", type=float, default=4.0)
+    args = parser.parse_args()
+
+    try:
+        tokenizer = load_tokenizer(args.tokenizer)
+    except Exception as e:
+        sys.exit(f"Could not load tokenizer {args.tokenizer}: {e}")
+
+    if args.files:
+        texts = []
+        for path in args.files:
+            with open(path, encoding="utf-8", errors="replace") as f:
+                texts.append(f.read())
+    else:
+        texts = [synthetic_corpus(args.synthetic_mb)]
+    print(f"{len(texts)} texts, {sum(len(t) for t in texts) / 1_000_000:.1f}M chars, "
+          f"budget {args.tokens} tokens, overlap {args.overlap}\n")
+
+    print_table([
+        measure("characters", character_chunker(args.tokens, args.overlap), texts, tokenizer, args.tokens, args.repeat),
+        measure("tokens", token_chunker(tokenizer, args.tokens, args.overlap), texts, tokenizer, args.tokens, args.repeat),
+    ])
+
+
+if __name__ == "__main__":
+    main()
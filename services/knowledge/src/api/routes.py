@@ -1,13 +1,26 @@
-from typing import List, Optional
+import asyncio
+from typing import List, Literal, Optional
 
-from fastapi import APIRouter, BackgroundTasks, HTTPException
+from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
 
+from src.jobs.queue import get_ingestion_queue
 from src.main import prisma
 from src.rag.context import build_agent_context
-from src.rag.ingestion import ingest_document_pipeline
-from src.rag.retrieval import semantic_search
+from src.rag.embedding_cache import embedding_cache
+from src.rag.embeddings import embedding_service
+from src.rag.retrieval import KeywordIndexIncomplete, semantic_search
 from src.storage.chroma import get_or_create_collection, list_collections
+from src.storage.documents import (
+    create_document,
+    create_ingestion_job,
+    delete_vectors,
+    get_chunk_refs,
+    get_ingestion_job,
+    update_document_content,
+    update_document_status,
+    update_ingestion_job,
+)
 
 router = APIRouter()
 
@@ -22,12 +35,17 @@ class IngestRequest(BaseModel):
     mimeType: Optional[str] = None
     tags: Optional[List[str]] = []
 
+class DocumentUpdate(BaseModel):
+    content: str
+    title: Optional[str] = None
+
 class SearchRequest(BaseModel):
     query: str
     collectionId: str
     orgId: str
     nResults: int = 5
     minRelevance: float = 0.5
+    mode: Literal["vector", "keyword", "hybrid"] = "vector"
 
 class ContextRequest(BaseModel):
     orgId: str
@@ -48,10 +66,8 @@ class CollectionCreate(BaseModel):
 # --- Endpoints ---
 
 @router.post("/documents/ingest")
-async def ingest_document(req: IngestRequest, background_tasks: BackgroundTasks):
-    """Ingests a document to ChromaDB via background task"""
-    # Create the document synchronously as pending, so we return ID immediately
-    from src.storage.documents import create_document
+async def ingest_document(req: IngestRequest):
+    """Creates the document and queues it for ingestion by a worker"""
     doc = await create_document(
         org_id=req.orgId,
         title=req.title,
@@ -62,21 +78,16 @@ async def ingest_document(req: IngestRequest, background_tasks: BackgroundTasks)
         content=req.content,
         tags=req.tags
     )
+    job = await create_ingestion_job(req.orgId, doc.id, req.sourceType)
 
-    # Process RAG ingestion in background
-    background_tasks.add_task(
-        ingest_document_pipeline,
-        org_id=req.orgId,
-        title=req.title,
-        source_type=req.sourceType,
-        collection_id=req.collectionId,
-        content=req.content,
-        source_url=req.sourceUrl,
-        mime_type=req.mimeType,
-        tags=req.tags
-    )
+    try:
+        await get_ingestion_queue().enqueue(job.id)
+    except Exception as e:
+        await update_ingestion_job(job.id, status="failed", error=f"Could not queue job: {e}")
+        await update_document_status(doc.id, "failed")
+        raise HTTPException(status_code=503, detail="Ingestion queue unavailable") from e
 
-    return {"message": "Ingestion queued", "documentId": doc.id}
+    return {"message": "Ingestion queued", "documentId": doc.id, "jobId": job.id}
 
 @router.get("/documents")
 async def list_documents(orgId: str, limit: int = 50, skip: int = 0):
@@ -98,45 +109,72 @@ async def get_document(id: str):
         raise HTTPException(status_code=404, detail="Document not found")
     return doc
 
+@router.put("/documents/{id}")
+async def update_document(id: str, req: DocumentUpdate):
+    """Replaces a document's content; only chunks that changed are re-embedded"""
+    doc = await prisma.document.find_unique(where={"id": id})
+    if not doc:
+        raise HTTPException(status_code=404, detail="Document not found")
+
+    await update_document_content(doc.id, req.content, req.title)
+    job = await create_ingestion_job(doc.orgId, doc.id, doc.sourceType)
+
+    try:
+        await get_ingestion_queue().enqueue(job.id)
+    except Exception as e:
+        await update_ingestion_job(job.id, status="failed", error=f"Could not queue job: {e}")
+        await update_document_status(doc.id, "failed", doc.chunkCount)
+        raise HTTPException(status_code=503, detail="Ingestion queue unavailable") from e
+
+    return {"message": "Re-ingestion queued", "documentId": doc.id, "jobId": job.id}
+
 @router.delete("/documents/{id}")
 async def delete_document(id: str):
-    doc = await prisma.document.find_unique(where={"id": id}, include={"chunks": True})
+    doc = await prisma.document.find_unique(where={"id": id})
     if not doc:
         raise HTTPException(status_code=404, detail="Document not found")
+    chunks = await get_chunk_refs(id)
 
-    # Delete from chroma
-    if doc.chunks:
-        try:
-            from src.storage.chroma import get_collection
-            collection = get_collection(doc.collectionId)
-            ids_to_del = [chunk.chromaId for chunk in doc.chunks if chunk.chromaId]
-            if ids_to_del:
-                collection.delete(ids=ids_to_del)
-        except Exception:
-            pass # continue Prisma delete even if chroma missing
-
-    # Delete from Prisma (cascades chunks)
+    # Delete from Prisma first (cascades chunks): a job still ingesting the
+    # document sees it is gone and removes whatever it writes after this
     await prisma.document.delete(where={"id": id})
+
+    # Delete from chroma, including vectors whose rows were not stored yet
+    ids_to_del = {chunk.chromaId for chunk in chunks if chunk.chromaId}
+    try:
+        from src.storage.chroma import get_collection
+        collection = await asyncio.to_thread(get_collection, doc.collectionId)
+        ids_to_del.update((await asyncio.to_thread(collection.get, where={"doc_id": id}, include=[]))["ids"])
+    except Exception:
+        pass # continue even if chroma missing
+    await delete_vectors(doc.collectionId, list(ids_to_del))
     return {"message": "Deleted"}
 
 @router.post("/search")
 async def execute_search(req: SearchRequest):
-    results = await semantic_search(
-        query=req.query,
-        collection_id=req.collectionId,
-        org_id=req.orgId,
-        n_results=req.nResults,
-        min_relevance=req.minRelevance
-    )
+    try:
+        results = await semantic_search(
+            query=req.query,
+            collection_id=req.collectionId,
+            org_id=req.orgId,
+            n_results=req.nResults,
+            min_relevance=req.minRelevance,
+            mode=req.mode
+        )
+    except KeywordIndexIncomplete as e:
+        raise HTTPException(status_code=503, detail=str(e)) from e
     return {"results": results}
 
 @router.post("/context")
 async def get_context(req: ContextRequest):
-    context = await build_agent_context(
-        org_id=req.orgId,
-        agent_type=req.agentType,
-        query=req.query
-    )
+    try:
+        context = await build_agent_context(
+            org_id=req.orgId,
+            agent_type=req.agentType,
+            query=req.query
+        )
+    except KeywordIndexIncomplete as e:
+        raise HTTPException(status_code=503, detail=str(e)) from e
     return context
 
 @router.get("/collections")
@@ -183,6 +221,11 @@ async def upsert_context_rule(req: ContextRuleCreate):
         )
         return created
 
+@router.get("/embeddings/metrics")
+async def get_embedding_metrics():
+    """Embedding throughput per provider and cache hit rates"""
+    return {**embedding_service.get_metrics(), "cache": embedding_cache.get_metrics()}
+
 @router.get("/jobs")
 async def get_jobs(orgId: str, limit: int = 50):
     jobs = await prisma.ingestionjob.find_many(
@@ -191,3 +234,16 @@ async def get_jobs(orgId: str, limit: int = 50):
         order={"createdAt": "desc"}
     )
     return jobs
+
+@router.get("/jobs/queue")
+async def get_job_queue():
+    """Ingestion queue depth and live workers"""
+    return await get_ingestion_queue().stats()
+
+@router.get("/jobs/{id}")
+async def get_job(id: str):
+    """Job status, progress (0-1), attempts and last error"""
+    job = await get_ingestion_job(id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
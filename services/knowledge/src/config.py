@@ -13,7 +13,29 @@ class Settings(BaseSettings):
     openai_api_key: str | None = None
     openai_embedding_model: str = "text-embedding-3-small"
     ollama_base_url: str = "http://localhost:11434"
-    chunk_size: int = 512
+    ollama_embedding_model: str = "nomic-embed-text"
+    sentence_transformers_model: str = "all-MiniLM-L6-v2"
+    embedding_batch_size: int = 64  # Texts per provider request / encode batch
+    embedding_concurrency: int = 4  # Provider requests in flight at once
+    embedding_workers: int = 1  # Threads for local sentence-transformers encoding
+    embedding_timeout: float = 60.0
+    embedding_cache_size: int = 10000  # Vectors kept in the in-process LRU
+    embedding_cache_ttl: int = 604800  # Seconds a vector stays in Redis
+    embedding_cache_redis: bool = True
+    ingest_concurrency: int = 2  # Jobs each worker process runs at once
+    ingest_api_workers: int = 0  # Ingestion slots inside the API process (0 = enqueue only)
+    ingest_max_attempts: int = 3
+    ingest_retry_backoff: float = 30.0  # Seconds before the first retry, doubled each attempt
+    ingest_heartbeat_ttl: int = 30  # Seconds before a silent worker's jobs are requeued
+    ingest_window_size: int = 64  # Chunks embedded and upserted per step while streaming a document
+    keyword_index_dir: str = "./data/keyword-index"  # BM25 segments on local disk; API and workers must mount the same volume
+    keyword_index_max_segments: int = 16  # Segments per collection before merging
+    context_search_mode: str = "vector"  # vector | keyword | hybrid, for agent context retrieval
+    chunker: str = "characters"  # characters (recursive splitter) | tokens (embedding tokenizer, slower)
+    chunk_tokenizer: str = ""  # Local tokenizer.json of the embedding model (CHUNKER=tokens)
+    chunk_tokens: int = 128  # Tokens per chunk (CHUNKER=tokens)
+    chunk_overlap_tokens: int = 12
+    chunk_size: int = 512  # Characters per chunk (CHUNKER=characters)
     chunk_overlap: int = 50
     log_level: str = "INFO"
 
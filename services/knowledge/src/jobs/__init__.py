@@ -0,0 +1 @@
+# Ingestion jobs module
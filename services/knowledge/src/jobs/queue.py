@@ -0,0 +1,162 @@
+import logging
+from typing import Dict, List, Optional
+
+import redis.asyncio as redis
+
+import src.main as app_main
+
+logger = logging.getLogger(__name__)
+
+# Move jobs whose retry delay has passed back onto the queue (server time, so
+# every worker agrees). Returns how many were moved.
+PROMOTE_SCRIPT = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local due = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', now, 'LIMIT', 0, 100)
+for _, job in ipairs(due) do
+    redis.call('ZREM', KEYS[1], job)
+    redis.call('LPUSH', KEYS[2], job)
+end
+return #due
+"""
+
+# Take a job off a worker's processing list and schedule it ARGV[2] seconds out
+RETRY_SCRIPT = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+redis.call('LREM', KEYS[1], 1, ARGV[1])
+redis.call('ZADD', KEYS[2], now + tonumber(ARGV[2]), ARGV[1])
+return 1
+"""
+
+# Extend or release a document lock only while ARGV[1] still owns it
+REFRESH_LOCK_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('EXPIRE', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+UNLOCK_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+class IngestionQueue:
+    """
+    Durable ingestion queue in Redis (reliable-queue pattern).
+
+    Job IDs wait on a list; a worker claims one by atomically moving it to
+    its own processing list and removes it only once the job has finished.
+    Workers refresh a heartbeat key while alive, so jobs held by a worker
+    that died (crash, deploy, OOM) are moved back to the queue by whichever
+    worker notices first. Retries wait in a sorted set scored by due time.
+
+    A job holds a per-document lock while it runs (SET NX with a TTL its
+    worker's heartbeat refreshes), so two jobs for the same document never
+    diff and write its chunks at the same time.
+    """
+
+    def __init__(self, client: redis.Redis, prefix: str = "knowledge:ingest"):
+        self.redis = client
+        self.queue_key = f"{prefix}:queue"
+        self.delayed_key = f"{prefix}:delayed"
+        self.workers_key = f"{prefix}:workers"
+        self.prefix = prefix
+        self._promote = client.register_script(PROMOTE_SCRIPT)
+        self._retry = client.register_script(RETRY_SCRIPT)
+        self._refresh_lock = client.register_script(REFRESH_LOCK_SCRIPT)
+        self._unlock = client.register_script(UNLOCK_SCRIPT)
+
+    def processing_key(self, worker_id: str) -> str:
+        return f"{self.prefix}:processing:{worker_id}"
+
+    def heartbeat_key(self, worker_id: str) -> str:
+        return f"{self.prefix}:heartbeat:{worker_id}"
+
+    def lock_key(self, document_id: str) -> str:
+        return f"{self.prefix}:lock:{document_id}"
+
+    async def enqueue(self, job_id: str):
+        await self.redis.lpush(self.queue_key, job_id)
+
+    async def claim(self, worker_id: str, timeout: float = 5.0) -> Optional[str]:
+        """Blocks up to timeout seconds for the next job; None if there was none."""
+        await self._promote(keys=[self.delayed_key, self.queue_key])
+        return await self.redis.blmove(
+            self.queue_key, self.processing_key(worker_id), timeout, "RIGHT", "LEFT"
+        )
+
+    async def ack(self, worker_id: str, job_id: str):
+        """Job finished (completed or permanently failed)."""
+        await self.redis.lrem(self.processing_key(worker_id), 1, job_id)
+
+    async def retry(self, worker_id: str, job_id: str, delay: float):
+        await self._retry(keys=[self.processing_key(worker_id), self.delayed_key], args=[job_id, delay])
+
+    async def lock_document(self, document_id: str, owner: str, ttl: int) -> bool:
+        """False while another job holds the document."""
+        return bool(await self.redis.set(self.lock_key(document_id), owner, nx=True, ex=ttl))
+
+    async def refresh_lock(self, document_id: str, owner: str, ttl: int) -> bool:
+        """False if the lock expired (or was taken over) since it was acquired."""
+        return bool(await self._refresh_lock(keys=[self.lock_key(document_id)], args=[owner, ttl]))
+
+    async def unlock_document(self, document_id: str, owner: str):
+        await self._unlock(keys=[self.lock_key(document_id)], args=[owner])
+
+    async def heartbeat(self, worker_id: str, ttl: int):
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.set(self.heartbeat_key(worker_id), 1, ex=ttl)
+        pipe.sadd(self.workers_key, worker_id)
+        await pipe.execute()
+
+    async def recover(self) -> int:
+        """Requeues jobs held by workers whose heartbeat has expired."""
+        recovered = 0
+        for worker_id in await self.redis.smembers(self.workers_key):
+            if await self.redis.exists(self.heartbeat_key(worker_id)):
+                continue
+            processing = self.processing_key(worker_id)
+            while await self.redis.lmove(processing, self.queue_key, "RIGHT", "RIGHT"):
+                recovered += 1
+            await self.redis.srem(self.workers_key, worker_id)
+        if recovered:
+            logger.warning(f"Requeued {recovered} ingestion jobs from stopped workers")
+        return recovered
+
+    async def remove_worker(self, worker_id: str):
+        """Clean shutdown: hand unfinished jobs back and deregister."""
+        processing = self.processing_key(worker_id)
+        while await self.redis.lmove(processing, self.queue_key, "RIGHT", "RIGHT"):
+            pass
+        await self.redis.delete(self.heartbeat_key(worker_id))
+        await self.redis.srem(self.workers_key, worker_id)
+
+    async def stats(self) -> Dict[str, int]:
+        workers: List[str] = list(await self.redis.smembers(self.workers_key))
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.llen(self.queue_key)
+        pipe.zcard(self.delayed_key)
+        for worker_id in workers:
+            pipe.llen(self.processing_key(worker_id))
+        queued, delayed, *processing = await pipe.execute()
+        return {
+            "queued": queued,
+            "delayed": delayed,
+            "processing": sum(processing),
+            "workers": len(workers),
+        }
+
+_queue: Optional[IngestionQueue] = None
+
+def get_ingestion_queue() -> IngestionQueue:
+    """Queue bound to the process-wide Redis client (API or worker)."""
+    global _queue
+    if not app_main.redis_client:
+        raise RuntimeError("Redis client not initialized")
+    if _queue is None or _queue.redis is not app_main.redis_client:
+        _queue = IngestionQueue(app_main.redis_client)
+    return _queue
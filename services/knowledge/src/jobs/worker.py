@@ -0,0 +1,201 @@
+"""
+Ingestion worker: python -m src.jobs.worker
+
+Runs INGEST_CONCURRENCY jobs at a time off the Redis ingestion queue. Start
+as many worker processes as ingestion throughput needs; the API only
+enqueues (unless INGEST_API_WORKERS > 0).
+"""
+import asyncio
+import logging
+import os
+import signal
+import socket
+import uuid
+from typing import Dict, List, Optional, Set, Tuple
+
+# Loaded first: src.main wires up the routes and queue modules this one depends on
+import src.main as app_main
+from src.config import get_settings
+from src.jobs.queue import IngestionQueue, get_ingestion_queue
+from src.rag.chunking import get_chunk_tokenizer
+from src.rag.ingestion import DocumentDeleted, ingest_document_pipeline
+from src.storage.documents import get_ingestion_job, update_document_status, update_ingestion_job
+from src.storage.keyword_index import backfill
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+class IngestionWorker:
+    def __init__(self, queue: IngestionQueue, concurrency: int, worker_id: Optional[str] = None):
+        self.queue = queue
+        self.concurrency = concurrency
+        self.worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        self._tasks: List[asyncio.Task] = []
+        self._backfill: Optional[asyncio.Task] = None
+        # documentId -> (job holding its lock, task running that job)
+        self._locks: Dict[str, Tuple[str, asyncio.Task]] = {}
+        self._lost: Set[str] = set() # Jobs cancelled because their lock expired
+        self._stopping = False
+
+    async def start(self):
+        # A misconfigured chunker fails here, not in every job
+        get_chunk_tokenizer()
+        await self.queue.heartbeat(self.worker_id, settings.ingest_heartbeat_ttl)
+        await self.queue.recover()
+        self._tasks = [asyncio.create_task(self._heartbeat())]
+        self._tasks += [asyncio.create_task(self._consume()) for _ in range(self.concurrency)]
+        self._backfill = asyncio.create_task(self._backfill_keyword_index())
+        logger.info(f"Ingestion worker {self.worker_id} started ({self.concurrency} slots)")
+
+    async def stop(self):
+        """Lets running jobs finish, then hands anything unclaimed back to the queue."""
+        self._stopping = True
+        if self._backfill:
+            self._backfill.cancel()
+            await asyncio.gather(self._backfill, return_exceptions=True)
+        await asyncio.gather(*self._tasks[1:], return_exceptions=True)
+        self._tasks[0].cancel()
+        await asyncio.gather(self._tasks[0], return_exceptions=True)
+        await self.queue.remove_worker(self.worker_id)
+        logger.info(f"Ingestion worker {self.worker_id} stopped")
+
+    async def _heartbeat(self):
+        interval = max(settings.ingest_heartbeat_ttl / 3, 1)
+        while True:
+            try:
+                await self.queue.heartbeat(self.worker_id, settings.ingest_heartbeat_ttl)
+                for document_id, (job_id, run) in list(self._locks.items()):
+                    if not await self.queue.refresh_lock(document_id, job_id, settings.ingest_heartbeat_ttl):
+                        # Another job may hold the document now; two diffs must never interleave
+                        logger.warning(f"Ingestion job {job_id} lost its lock on document {document_id}, stopping it")
+                        self._lost.add(job_id)
+                        run.cancel()
+                await self.queue.recover()
+            except Exception as e:
+                logger.warning(f"Ingestion heartbeat failed: {e}")
+            await asyncio.sleep(interval)
+
+    async def _backfill_keyword_index(self):
+        # Documents indexed before the keyword index existed (or while it was
+        # on another volume) are not searchable by keyword until this runs
+        try:
+            await backfill()
+        except Exception as e:
+            logger.warning(f"Keyword index backfill failed, run python -m src.storage.keyword_index backfill: {e}")
+
+    async def _consume(self):
+        while not self._stopping:
+            try:
+                job_id = await self.queue.claim(self.worker_id, timeout=1.0)
+            except Exception as e:
+                logger.warning(f"Ingestion queue unavailable: {e}")
+                await asyncio.sleep(1.0)
+                continue
+            if not job_id:
+                continue
+            try:
+                await self.process(job_id)
+            except Exception as e:
+                # Job state could not be recorded (e.g. database down); try again later
+                logger.error(f"Ingestion job {job_id} could not be processed: {e}")
+                try:
+                    await self.queue.retry(self.worker_id, job_id, settings.ingest_retry_backoff)
+                except Exception:
+                    pass # Stays in this worker's processing list until it restarts
+
+    async def process(self, job_id: str):
+        job = await get_ingestion_job(job_id)
+        if not job or not job.documentId or job.status == "completed":
+            await self.queue.ack(self.worker_id, job_id)
+            return
+
+        # One job per document at a time: a second one (another PUT, or a
+        # requeued job whose worker is only slow) waits its turn
+        document_id = job.documentId
+        if not await self.queue.lock_document(document_id, job_id, settings.ingest_heartbeat_ttl):
+            logger.info(f"Document {document_id} is being ingested by another job; job {job_id} waits")
+            await self.queue.retry(self.worker_id, job_id, settings.ingest_retry_backoff)
+            return
+
+        run = asyncio.create_task(self._run(job))
+        self._locks[document_id] = (job_id, run)
+        try:
+            await run
+        except asyncio.CancelledError:
+            if job_id not in self._lost:
+                raise
+            self._lost.discard(job_id)
+            await update_ingestion_job(job_id, status="queued", error=f"Lost the lock on document {document_id}")
+            await self.queue.retry(self.worker_id, job_id, settings.ingest_retry_backoff)
+        finally:
+            self._locks.pop(document_id, None)
+            try:
+                await self.queue.unlock_document(document_id, job_id)
+            except Exception as e:
+                logger.warning(f"Could not release lock on document {document_id}, it expires on its own: {e}")
+
+    async def _run(self, job):
+        job_id = job.id
+        attempts = job.attempts + 1
+        await update_ingestion_job(job_id, status="running", attempts=attempts, progress=0.0, error=None)
+
+        async def progress(fraction: float):
+            await update_ingestion_job(job_id, progress=fraction)
+
+        try:
+            doc = await ingest_document_pipeline(job.documentId, progress=progress)
+        except DocumentDeleted as e:
+            logger.info(f"Ingestion job {job_id} dropped: {e}")
+            await update_ingestion_job(job_id, status="failed", error=str(e))
+            await self.queue.ack(self.worker_id, job_id)
+            return
+        except Exception as e:
+            logger.error(f"Ingestion job {job_id} failed (attempt {attempts}): {e}")
+            if attempts < settings.ingest_max_attempts:
+                delay = settings.ingest_retry_backoff * 2 ** (attempts - 1)
+                await update_ingestion_job(job_id, status="queued", error=str(e))
+                await update_document_status(job.documentId, "pending")
+                await self.queue.retry(self.worker_id, job_id, delay)
+            else:
+                await update_ingestion_job(job_id, status="failed", error=str(e))
+                await update_document_status(job.documentId, "failed")
+                await self.queue.ack(self.worker_id, job_id)
+            return
+
+        await update_ingestion_job(
+            job_id,
+            status="completed",
+            progress=1.0,
+            chunksCreated=doc.chunkCount if doc else 0,
+        )
+        await self.queue.ack(self.worker_id, job_id)
+
+async def main():
+    import chromadb
+    import redis.asyncio as redis
+
+    logging.basicConfig(level=settings.log_level)
+
+    await app_main.prisma.connect()
+    app_main.redis_client = redis.from_url(settings.redis_url, decode_responses=True)
+    app_main.chroma_client = chromadb.HttpClient(host=settings.chroma_host, port=settings.chroma_port)
+
+    worker = IngestionWorker(get_ingestion_queue(), settings.ingest_concurrency)
+    await worker.start()
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+    await stop.wait()
+
+    await worker.stop()
+    await app_main.prisma.disconnect()
+    await app_main.redis_client.aclose() # type: ignore
+    from src.rag.embedding_cache import embedding_cache
+    from src.rag.embeddings import embedding_service
+    await embedding_cache.close()
+    await embedding_service.close()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -8,14 +8,19 @@ from fastapi import FastAPI
 # Core Infra references
 from prisma import aioprisma
 
-from .api.routes import router as api_router
 from .config import get_settings
 
-# Initialize globals
+# Initialize globals (before importing the modules below, which reference them)
 prisma = aioprisma.Prisma()
 redis_client: redis.Redis | None = None
 chroma_client: chromadb.HttpClient | None = None
 
+from .api.routes import router as api_router  # noqa: E402
+from .jobs.queue import get_ingestion_queue  # noqa: E402
+from .jobs.worker import IngestionWorker  # noqa: E402
+from .rag.embedding_cache import embedding_cache  # noqa: E402
+from .rag.embeddings import embedding_service  # noqa: E402
+
 settings = get_settings()
 
 # Setup logging
@@ -39,13 +44,23 @@ async def lifespan(app: FastAPI):
     chroma_client = chromadb.HttpClient(host=settings.chroma_host, port=settings.chroma_port)
     chroma_client.heartbeat()
 
+    # Optional in-process ingestion slots (dedicated workers: python -m src.jobs.worker)
+    worker = None
+    if settings.ingest_api_workers > 0:
+        worker = IngestionWorker(get_ingestion_queue(), settings.ingest_api_workers)
+        await worker.start()
+
     yield
 
     # Disconnect
     logger.info("Disconnecting services...")
+    if worker:
+        await worker.stop()
     await prisma.disconnect()
     if redis_client:
         await redis_client.aclose() # type: ignore
+    await embedding_cache.close()
+    await embedding_service.close()
 
 app = FastAPI(
     title="Knowledge Service",
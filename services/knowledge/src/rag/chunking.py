@@ -1,34 +1,231 @@
-from typing import Any, Dict, List
+import logging
+import os
+import re
+from functools import lru_cache
+from itertools import islice
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
 
+import numpy as np
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 
 from src.config import get_settings
 
 settings = get_settings()
+logger = logging.getLogger(__name__)
+
+# Characters buffered before splitting; a window of several chunks so the
+# splitter still finds good boundaries
+BUFFER_CHUNKS = 8
+
+# Rough characters per token, only used to size the streaming buffer
+CHARS_PER_TOKEN = 4
+
+# Boundary strength of the gap before a token: paragraph, line, sentence, word, none
+PARAGRAPH, LINE, SENTENCE, WORD, NONE = 4, 3, 2, 1, 0
+_SPACES = np.array([ord(c) for c in " \t\n\r\x0b\x0c\xa0"], dtype=np.uint32)
+_SENTENCE_ENDS = np.array([ord(c) for c in ".!?"], dtype=np.uint32)
+# Tokenizer batches split where a blank line begins; no token spans that
+# point (byte-level BPE included), so offsets match tokenizing the whole text
+_PARAGRAPH_START = re.compile(r"(?<!\n)(?=\n\n)")
 
 def get_text_splitter() -> RecursiveCharacterTextSplitter:
     """Returns a configured RecursiveCharacterTextSplitter."""
     return RecursiveCharacterTextSplitter(
         chunk_size=settings.chunk_size,
         chunk_overlap=settings.chunk_overlap,
-        separators=["\n\n", "\n", " ", ""]
+        separators=["\n\n", "\n", " ", ""],
+        add_start_index=True
     )
 
+@lru_cache(maxsize=4)
+def load_tokenizer(path: str):
+    """
+    Loads a Hugging Face tokenizer.json once per process. Only local files:
+    nothing is downloaded at runtime, and a missing or unreadable file
+    raises instead of silently chunking another way.
+    """
+    from tokenizers import Tokenizer
+
+    if not path or not os.path.isfile(path):
+        raise ValueError(
+            "CHUNKER=tokens needs CHUNK_TOKENIZER to be the embedding model's tokenizer.json "
+            f"(baked into the image), not found: {path!r}"
+        )
+    tokenizer = Tokenizer.from_file(path)
+    # Chunks are sized here; the tokenizer must see the whole text
+    tokenizer.no_truncation()
+    tokenizer.no_padding()
+    return tokenizer
+
+def get_chunk_tokenizer():
+    """The tokenizer CHUNKER=tokens sizes chunks with; None for CHUNKER=characters."""
+    if settings.chunker != "tokens":
+        return None
+    if settings.ai_provider == "openai":
+        # OpenAI embedding models use tiktoken; no tokenizer.json matches them
+        raise ValueError("CHUNKER=tokens has no tokenizer for AI_PROVIDER=openai; use CHUNKER=characters")
+    return load_tokenizer(settings.chunk_tokenizer)
+
+def iter_text_blocks(text: str, block_size: int = 65536) -> Iterator[str]:
+    """Feeds an in-memory string to iter_chunks the way a file would be read."""
+    for start in range(0, len(text), block_size):
+        yield text[start:start + block_size]
+
+def iter_chunks(blocks: Iterable[str], metadata: Dict[str, Any] = None) -> Iterator[Dict[str, Any]]:
+    """
+    Streams chunks out of text read incrementally (file, HTTP body, ...).
+
+    Text is buffered only until it covers a few chunks; everything but the
+    last chunk is yielded and splitting resumes from that chunk's start, so
+    overlap is kept across buffer boundaries and memory stays bounded by
+    the buffer, not the document. CHUNKER=characters (default) uses the
+    recursive splitter, CHUNKER=tokens the embedding model's tokenizer.
+    """
+    tokenizer = get_chunk_tokenizer()
+    if tokenizer is not None:
+        splitter = TokenSplitter(tokenizer, settings.chunk_tokens, settings.chunk_overlap_tokens)
+        buffer_size = settings.chunk_tokens * CHARS_PER_TOKEN * BUFFER_CHUNKS
+        split = splitter.split
+    else:
+        splitter = get_text_splitter()
+        buffer_size = settings.chunk_size * BUFFER_CHUNKS
+        def split(text: str, final: bool) -> List[Tuple[int, str, int]]:
+            docs = splitter.create_documents([text])
+            # basic token estimate rule of thumb (4 chars per token roughly natively without tokenizer)
+            return [(doc.metadata["start_index"], doc.page_content, len(doc.page_content) // 4) for doc in docs]
+
+    buffer = ""
+    offset = 0 # Document position of buffer[0]
+    index = 0
+
+    for block in blocks:
+        buffer += block
+        if len(buffer) < buffer_size:
+            continue
+        pieces = split(buffer, False)
+        if len(pieces) < 2:
+            continue
+        for start, content, tokens in pieces[:-1]:
+            yield _chunk(index, content, tokens, offset + start, metadata)
+            index += 1
+        tail = pieces[-1][0]
+        buffer = buffer[tail:]
+        offset += tail
+
+    if buffer.strip():
+        for start, content, tokens in split(buffer, True):
+            yield _chunk(index, content, tokens, offset + start, metadata)
+            index += 1
+
+def _chunk(index: int, content: str, tokens: int, start: int, metadata: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    return {
+        "chunkIndex": index,
+        "content": content,
+        "metadata": dict(metadata or {}),
+        "tokenCount": tokens,
+        "startIndex": start
+    }
+
+class TokenSplitter:
+    """
+    Splits on token offsets in one pass: each chunk is at most chunk_tokens
+    tokens of the embedding model, ending at the strongest boundary
+    (paragraph > line > sentence > word) in the second half of its window,
+    and the next chunk starts overlap tokens earlier, on a word start.
+    """
+
+    def __init__(self, tokenizer, chunk_tokens: int, overlap_tokens: int):
+        if not 0 <= overlap_tokens < chunk_tokens:
+            raise ValueError("Chunk overlap must be smaller than the chunk size")
+        self.tokenizer = tokenizer
+        self.chunk_tokens = chunk_tokens
+        self.overlap_tokens = overlap_tokens
+
+    def split(self, text: str, final: bool = True) -> List[Tuple[int, str, int]]:
+        """(start offset, content, token count) per chunk."""
+        if not final:
+            # Never tokenize a word cut off by the end of the buffer
+            cut = max(text.rfind(" "), text.rfind("\n"))
+            if cut > 0:
+                text = text[:cut]
+        starts, ends = self._encode(text)
+        if not len(starts):
+            return []
+        strengths, has_text = self._boundaries(text, starts, ends)
+
+        chunks = []
+        n = len(starts)
+        start = 0
+        while True:
+            limit = start + self.chunk_tokens
+            if limit >= n:
+                end = n
+            else:
+                # Latest of the strongest boundaries in the second half of the window
+                window = strengths[start + self.chunk_tokens // 2 + 1:limit + 1][::-1]
+                end = limit - int(np.argmax(window))
+            # Trailing whitespace tokens (BPE newlines) belong to no chunk's text
+            last = end - 1
+            while last > start and not has_text[last]:
+                last -= 1
+            content = text[starts[start]:ends[last]]
+            if content.strip():
+                chunks.append((int(starts[start]), content, last + 1 - start))
+            if end == n:
+                return chunks
+
+            next_start = max(end - self.overlap_tokens, start + 1)
+            words = np.flatnonzero(strengths[next_start:end] >= WORD)
+            start = next_start + int(words[0]) if len(words) else next_start
+
+    def _encode(self, text: str) -> Tuple[np.ndarray, np.ndarray]:
+        """Token (start, end) character offsets; paragraphs are tokenized as one parallel batch."""
+        pieces = _PARAGRAPH_START.split(text)
+        encodings = self.tokenizer.encode_batch(pieces, add_special_tokens=False)
+        offsets = []
+        base = 0
+        for piece, encoding in zip(pieces, encodings, strict=True):
+            offsets.extend((base + start, base + end) for start, end in encoding.offsets)
+            base += len(piece)
+        if not offsets:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+        array = np.array(offsets, dtype=np.int64)
+        return array[:, 0], array[:, 1]
+
+    @staticmethod
+    def _boundaries(text: str, starts: np.ndarray, ends: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Strength of the gap before each token (index 0 starts the text), and which tokens hold text."""
+        chars = np.frombuffer(text.encode("utf-32-le"), dtype=np.uint32)
+        space = np.isin(chars, _SPACES)
+        newlines = np.concatenate(([0], np.cumsum(chars == ord("\n"))))
+        index = np.arange(len(chars))
+        # First text (non-space) position at or after each index, and the end
+        # of the text before it; byte-level BPE makes spaces and newlines
+        # part of tokens, so gaps are measured between text, not tokens
+        next_text = np.append(np.minimum.accumulate(np.where(space, len(chars), index)[::-1])[::-1], len(chars))
+        text_end = np.concatenate(([0], np.maximum.accumulate(np.where(space, 0, index + 1))))
+
+        text_start = np.minimum(next_text[starts], ends)
+        has_text = text_start < ends
+        text_start, run_start = text_start[1:], text_end[text_start[1:]]
+        lines = newlines[text_start] - newlines[run_start]
+        gap = text_start > run_start
+        sentence = np.isin(chars[np.maximum(run_start - 1, 0)], _SENTENCE_ENDS)
+
+        # Whitespace-only tokens never start a chunk
+        strengths = np.select(
+            [~has_text[1:], lines >= 2, lines == 1, gap & sentence, gap],
+            [NONE, PARAGRAPH, LINE, SENTENCE, WORD],
+            NONE
+        )
+        return np.concatenate(([PARAGRAPH], strengths)).astype(np.int8), has_text
+
+def iter_windows(chunks: Iterable[Dict[str, Any]], size: int) -> Iterator[List[Dict[str, Any]]]:
+    """Groups a chunk stream into lists of at most size chunks."""
+    chunks = iter(chunks)
+    while window := list(islice(chunks, size)):
+        yield window
+
 def chunk_text(text: str, metadata: Dict[str, Any] = None) -> List[Dict[str, Any]]:
     """Splits raw text into manageable chunks and attaches metadata."""
-    splitter = get_text_splitter()
-
-    # Langchain splitting
-    langchain_docs = splitter.create_documents([text], metadatas=[metadata] if metadata else None)
-
-    chunks = []
-    for i, doc in enumerate(langchain_docs):
-        # basic token estimate rule of thumb (4 chars per token roughly natively without tokenizer)
-        token_count_est = len(doc.page_content) // 4
-        chunks.append({
-            "chunkIndex": i,
-            "content": doc.page_content,
-            "metadata": doc.metadata,
-            "tokenCount": token_count_est
-        })
-    return chunks
+    return list(iter_chunks([text], metadata))
@@ -1,8 +1,11 @@
 from typing import Any, Dict
 
-from src.rag.retrieval import semantic_search
+from src.config import get_settings
+from src.rag.retrieval import multi_collection_search
 from src.storage.documents import get_context_rule_by_agent
 
+settings = get_settings()
+
 
 async def build_agent_context(org_id: str, agent_type: str, query: str) -> Dict[str, Any]:
     """
@@ -21,24 +24,16 @@ async def build_agent_context(org_id: str, agent_type: str, query: str) -> Dict[
     n_results = rule.maxChunks
     min_relevance = rule.minRelevance
 
-    # 2. Search collections
-    all_snippets = []
-    for collection_id in rule.collectionIds:
-        # We perform search on each mapped collection
-        snippets = await semantic_search(
-            query=query,
-            collection_id=collection_id,
-            org_id=org_id,
-            n_results=n_results,
-            min_relevance=min_relevance
-        )
-        all_snippets.extend(snippets)
-
-    # 3. Consolidate & Rerank (Simple relevance sort across collections)
-    all_snippets.sort(key=lambda x: x["relevance"], reverse=True)
-
-    # Truncate to max chunks globally across collections
-    final_snippets = all_snippets[:n_results]
+    # 2. Search every mapped collection concurrently with one query embedding,
+    # keeping the most relevant chunks globally across collections (CONTEXT_SEARCH_MODE)
+    final_snippets = await multi_collection_search(
+        query=query,
+        collection_ids=rule.collectionIds,
+        org_id=org_id,
+        n_results=n_results,
+        min_relevance=min_relevance,
+        mode=settings.context_search_mode
+    )
 
     return {
         "systemPrompt": rule.systemPrompt,
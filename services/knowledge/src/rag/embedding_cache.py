@@ -0,0 +1,163 @@
+import hashlib
+import logging
+import re
+import unicodedata
+from array import array
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+import redis.asyncio as redis
+
+from src.config import get_settings
+from src.rag.embeddings import EmbeddingService, embedding_service
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+_WHITESPACE = re.compile(r"\s+")
+
+def normalize_text(text: str) -> str:
+    """Whitespace and Unicode form differences never change an embedding's cache key."""
+    return _WHITESPACE.sub(" ", unicodedata.normalize("NFC", text)).strip()
+
+def encode_vector(vector: List[float]) -> bytes:
+    """Packs a vector as little-endian float32 (4 bytes per dimension)."""
+    packed = array("f", vector)
+    if packed.itemsize != 4:
+        raise RuntimeError("float32 arrays are required for the embedding cache")
+    return packed.tobytes()
+
+def decode_vector(data: bytes) -> List[float]:
+    packed = array("f")
+    packed.frombytes(data)
+    return packed.tolist()
+
+class EmbeddingCache:
+    """
+    Content-addressed embedding cache in front of the EmbeddingService.
+
+    Vectors are keyed by hash(model, normalized text), so re-ingested chunks
+    and repeated queries are never embedded twice. Lookups go to an
+    in-process LRU first, then to Redis (shared by every replica); only the
+    remaining misses reach the embedding provider.
+    """
+
+    def __init__(
+        self,
+        service: EmbeddingService,
+        max_size: int = 10000,
+        ttl: int = 604800,
+        use_redis: bool = True,
+    ):
+        self.service = service
+        self.max_size = max_size
+        self.ttl = ttl
+        self.use_redis = use_redis
+        self.local: OrderedDict[str, bytes] = OrderedDict()
+        self.redis: Optional[redis.Redis] = None
+        self.stats = {"memoryHits": 0, "redisHits": 0, "misses": 0, "redisErrors": 0}
+
+    def key(self, text: str) -> str:
+        digest = hashlib.blake2b(
+            f"{self.service.model_id}\0{normalize_text(text)}".encode(), digest_size=20
+        ).hexdigest()
+        return f"knowledge:emb:{digest}"
+
+    def _redis(self) -> Optional[redis.Redis]:
+        if not self.use_redis:
+            return None
+        if self.redis is None:
+            # Binary values, so not the decode_responses client from main
+            self.redis = redis.from_url(settings.redis_url)
+        return self.redis
+
+    async def get_embeddings(self, texts: List[str]) -> List[List[float]]:
+        """Same contract as EmbeddingService.get_embeddings, served from cache where possible."""
+        if not texts:
+            return []
+
+        keys = [self.key(text) for text in texts]
+        found: Dict[str, bytes] = {}
+        for key in keys:
+            if key in found:
+                continue
+            data = self.local.get(key)
+            if data is not None:
+                self.local.move_to_end(key)
+                found[key] = data
+                self.stats["memoryHits"] += 1
+
+        missing = list(dict.fromkeys(key for key in keys if key not in found))
+        if missing:
+            for key, data in zip(missing, await self._redis_get(missing), strict=True):
+                if data is not None:
+                    found[key] = data
+                    self._remember(key, data)
+                    self.stats["redisHits"] += 1
+
+        # One provider call for every distinct text no tier had
+        to_embed = {key: text for key, text in zip(keys, texts, strict=True) if key not in found}
+        if to_embed:
+            self.stats["misses"] += len(to_embed)
+            vectors = await self.service.get_embeddings(list(to_embed.values()))
+            fresh = {key: encode_vector(vector) for key, vector in zip(to_embed, vectors, strict=True)}
+            for key, data in fresh.items():
+                self._remember(key, data)
+            found.update(fresh)
+            await self._redis_set(fresh)
+
+        return [decode_vector(found[key]) for key in keys]
+
+    def _remember(self, key: str, data: bytes):
+        self.local[key] = data
+        self.local.move_to_end(key)
+        while len(self.local) > self.max_size:
+            self.local.popitem(last=False)
+
+    async def _redis_get(self, keys: List[str]) -> List[Optional[bytes]]:
+        client = self._redis()
+        if client is None:
+            return [None] * len(keys)
+        try:
+            return await client.mget(keys)
+        except Exception as e:
+            self.stats["redisErrors"] += 1
+            logger.warning(f"Embedding cache read from Redis failed: {e}")
+            return [None] * len(keys)
+
+    async def _redis_set(self, entries: Dict[str, bytes]):
+        client = self._redis()
+        if client is None or not entries:
+            return
+        try:
+            pipe = client.pipeline(transaction=False)
+            for key, data in entries.items():
+                pipe.set(key, data, ex=self.ttl)
+            await pipe.execute()
+        except Exception as e:
+            self.stats["redisErrors"] += 1
+            logger.warning(f"Embedding cache write to Redis failed: {e}")
+
+    def get_metrics(self) -> Dict[str, Any]:
+        hits = self.stats["memoryHits"] + self.stats["redisHits"]
+        lookups = hits + self.stats["misses"]
+        return {
+            **self.stats,
+            "size": len(self.local),
+            "maxSize": self.max_size,
+            "hitRate": round(hits / lookups, 4) if lookups else 0.0,
+            "memoryHitRate": round(self.stats["memoryHits"] / lookups, 4) if lookups else 0.0,
+        }
+
+    async def close(self):
+        if self.redis is not None:
+            await self.redis.aclose()
+            self.redis = None
+
+# Singleton instance
+embedding_cache = EmbeddingCache(
+    embedding_service,
+    max_size=settings.embedding_cache_size,
+    ttl=settings.embedding_cache_ttl,
+    use_redis=settings.embedding_cache_redis,
+)
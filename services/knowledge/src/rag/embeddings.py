@@ -1,57 +1,198 @@
-from typing import List
+import asyncio
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, Dict, List
 
 from openai import AsyncOpenAI
 
 from src.config import get_settings
 
 settings = get_settings()
+logger = logging.getLogger(__name__)
+
+class EmbeddingStats:
+    """
+    Throughput counters for one provider. seconds is wall time with at least
+    one call in flight, so concurrent callers are not counted twice.
+    """
+
+    def __init__(self):
+        self.texts = 0
+        self.requests = 0
+        self.errors = 0
+        self.seconds = 0.0
+        self.active = 0
+        self._busy_since = 0.0
+
+    def begin(self):
+        if not self.active:
+            self._busy_since = time.perf_counter()
+        self.active += 1
+
+    def end(self):
+        self.active -= 1
+        if not self.active:
+            self.seconds += time.perf_counter() - self._busy_since
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "texts": self.texts,
+            "requests": self.requests,
+            "errors": self.errors,
+            "seconds": round(self.seconds, 3),
+            "textsPerSecond": round(self.texts / self.seconds, 1) if self.seconds else 0.0,
+        }
 
 class EmbeddingService:
     def __init__(self):
         self.provider = settings.ai_provider
+        self.batch_size = settings.embedding_batch_size
         self.openai_client = None
+        self.ollama_client = None
+        self.model = None
+        self.executor: ThreadPoolExecutor | None = None
+        # Bounds in-flight provider requests across every caller
+        self.semaphore = asyncio.Semaphore(settings.embedding_concurrency)
+        self.stats: Dict[str, EmbeddingStats] = {}
+        self._ollama_legacy = False
 
         if self.provider == "openai":
             if not settings.openai_api_key:
                 raise ValueError("OPENAI_API_KEY is required when using openai provider")
             self.openai_client = AsyncOpenAI(api_key=settings.openai_api_key)
         elif self.provider == "ollama":
-            from httpx import AsyncClient
-            self.ollama_client = AsyncClient(base_url=settings.ollama_base_url)
+            from httpx import AsyncClient, Limits
+            self.ollama_client = AsyncClient(
+                base_url=settings.ollama_base_url,
+                limits=Limits(
+                    max_connections=settings.embedding_concurrency,
+                    max_keepalive_connections=settings.embedding_concurrency,
+                ),
+                timeout=settings.embedding_timeout,
+            )
         elif self.provider == "sentence-transformers":
             from sentence_transformers import SentenceTransformer
-            self.model = SentenceTransformer('all-MiniLM-L6-v2')
+            self.model = SentenceTransformer(settings.sentence_transformers_model)
+            # Dedicated threads so encoding never blocks the event loop or
+            # competes with other to_thread work
+            self.executor = ThreadPoolExecutor(
+                max_workers=settings.embedding_workers,
+                thread_name_prefix="embeddings",
+            )
         else:
             raise ValueError(f"Unsupported AI Provider: {self.provider}")
 
+    @property
+    def model_id(self) -> str:
+        """Provider and model that produced a vector (vectors from different models never mix)"""
+        models = {
+            "openai": settings.openai_embedding_model,
+            "ollama": settings.ollama_embedding_model,
+            "sentence-transformers": settings.sentence_transformers_model,
+        }
+        return f"{self.provider}:{models[self.provider]}"
+
     async def get_embeddings(self, texts: List[str]) -> List[List[float]]:
         if not texts:
             return []
 
-        if self.provider == "openai":
+        stats = self.stats.setdefault(self.provider, EmbeddingStats())
+        stats.begin()
+        try:
+            if self.provider == "sentence-transformers":
+                embeddings = await self._encode_local(texts)
+            else:
+                # Batches go out concurrently (bounded by the semaphore) and
+                # come back in input order
+                batches = [texts[i:i + self.batch_size] for i in range(0, len(texts), self.batch_size)]
+                embed = self._embed_openai if self.provider == "openai" else self._embed_ollama
+                results = await asyncio.gather(*(embed(batch) for batch in batches))
+                embeddings = [vector for batch in results for vector in batch]
+        except Exception:
+            stats.errors += 1
+            raise
+        finally:
+            stats.end()
+
+        stats.texts += len(texts)
+        return embeddings
+
+    async def _embed_openai(self, texts: List[str]) -> List[List[float]]:
+        async with self.semaphore:
+            self.stats[self.provider].requests += 1
             response = await self.openai_client.embeddings.create( # type: ignore
                 input=texts,
                 model=settings.openai_embedding_model
             )
-            return [data.embedding for data in response.data]
+        return [data.embedding for data in response.data]
 
-        elif self.provider == "ollama":
-            embeddings = []
-            for text in texts:
-                resp = await self.ollama_client.post("/api/embeddings", json={
-                    "model": "nomic-embed-text",  # Adjust model globally or locally
-                    "prompt": text
+    async def _embed_ollama(self, texts: List[str]) -> List[List[float]]:
+        if not self._ollama_legacy:
+            async with self.semaphore:
+                self.stats[self.provider].requests += 1
+                resp = await self.ollama_client.post("/api/embed", json={ # type: ignore
+                    "model": settings.ollama_embedding_model,
+                    "input": texts
                 })
+            if resp.status_code != 404 or not _route_missing(resp):
                 resp.raise_for_status()
-                data = resp.json()
-                embeddings.append(data["embedding"])
-            return embeddings
+                return resp.json()["embeddings"]
+            # Ollama before 0.2 only has the one-prompt endpoint
+            logger.warning("Ollama has no /api/embed, falling back to one request per text")
+            self._ollama_legacy = True
 
-        elif self.provider == "sentence-transformers":
-            # sentence-transformers is sync, blocking call warning in async
-            return self.model.encode(texts).tolist() # type: ignore
+        return list(await asyncio.gather(*(self._embed_ollama_one(text) for text in texts)))
+
+    async def _embed_ollama_one(self, text: str) -> List[float]:
+        async with self.semaphore:
+            self.stats[self.provider].requests += 1
+            resp = await self.ollama_client.post("/api/embeddings", json={ # type: ignore
+                "model": settings.ollama_embedding_model,
+                "prompt": text
+            })
+        resp.raise_for_status()
+        return resp.json()["embedding"]
+
+    async def _encode_local(self, texts: List[str]) -> List[List[float]]:
+        self.stats[self.provider].requests += 1
+        encode = partial(
+            self.model.encode, # type: ignore
+            texts,
+            batch_size=self.batch_size,
+            convert_to_numpy=True,
+            show_progress_bar=False,
+        )
+        vectors = await asyncio.get_running_loop().run_in_executor(self.executor, encode)
+        return vectors.tolist()
+
+    def get_metrics(self) -> Dict[str, Any]:
+        return {
+            "provider": self.provider,
+            "batchSize": self.batch_size,
+            "concurrency": settings.embedding_concurrency,
+            "providers": {name: stats.as_dict() for name, stats in self.stats.items()},
+        }
+
+    async def close(self):
+        if self.ollama_client:
+            await self.ollama_client.aclose()
+        if self.openai_client:
+            await self.openai_client.close()
+        if self.executor:
+            self.executor.shutdown(wait=False)
 
-        return []
+def _route_missing(resp) -> bool:
+    """
+    A 404 for an unknown route, not for an unknown model: Ollama answers a
+    missing model with a JSON error ("model ... not found, try pulling it
+    first"), a missing route with a plain-text page.
+    """
+    try:
+        return "error" not in resp.json()
+    except ValueError:
+        return True
 
 # Singleton instance
 embedding_service = EmbeddingService()
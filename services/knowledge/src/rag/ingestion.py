@@ -1,102 +1,180 @@
+import asyncio
+import hashlib
 import logging
-import uuid
-from typing import List, Optional
+import time
+from collections import defaultdict
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
 
+from src.config import get_settings
 from src.main import prisma
-from src.rag.chunking import chunk_text
+from src.rag.chunking import iter_chunks, iter_text_blocks, iter_windows
+from src.rag.embedding_cache import embedding_cache
 from src.rag.embeddings import embedding_service
 from src.storage.chroma import get_or_create_collection
-from src.storage.documents import create_document, store_document_chunks, update_document_status
-
+from src.storage.documents import (
+    delete_chunks,
+    delete_vectors,
+    document_exists,
+    get_chunk_refs,
+    get_document,
+    store_document_chunks,
+    update_chunk_indexes,
+    update_document_status,
+)
+from src.storage.keyword_index import keyword_index
+
+settings = get_settings()
 logger = logging.getLogger(__name__)
 
-async def ingest_document_pipeline(
-    org_id: str,
-    title: str,
-    source_type: str,
-    collection_id: str,
-    content: str,
-    source_url: Optional[str] = None,
-    mime_type: Optional[str] = None,
-    tags: Optional[List[str]] = None
-):
-    """
-    Orchestrates ingestion: 
-    1. Create Document (Pending)
-    2. Chunk Text
-    3. Generate Embeddings
-    4. Store in ChromaDB
-    5. Store chunks in Prisma (Indexed)
-    """
+# Called with the fraction of the document processed so far (0.0 - 1.0)
+ProgressCallback = Callable[[float], Awaitable[None]]
 
-    # 1. Create Document
-    doc = await create_document(
-        org_id=org_id,
-        title=title,
-        source_type=source_type,
-        collection_id=collection_id,
-        source_url=source_url,
-        mime_type=mime_type,
-        content=content,
-        tags=tags
-    )
+class DocumentDeleted(ValueError):
+    """The document was deleted while (or before) it was being ingested."""
 
-    await update_document_status(doc.id, "processing")
+def chunk_hash(content: str) -> str:
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
 
-    try:
-        # 2. Chunk text
-        chunks = chunk_text(content, metadata={"doc_id": doc.id, "org_id": org_id})
+class ChunkMatcher:
+    """
+    Matches freshly split chunks against a document's stored DocumentChunk
+    rows by content hash, one window at a time. Repeated chunks match stored
+    copies in document order; rows never matched by the end were removed.
+    """
 
-        if not chunks:
-            await update_document_status(doc.id, "failed", 0)
-            return doc
+    def __init__(self, doc_id: str, existing: list):
+        self.doc_id = doc_id
+        self.pool = defaultdict(list)
+        for row in sorted(existing, key=lambda r: r.chunkIndex):
+            # Rows stored before hashing never match and are replaced
+            self.pool[row.contentHash or None].append(row)
+        self.taken = {row.chromaId for row in existing}
+
+    def match(self, chunks: List[Dict]) -> Tuple[List[Tuple[object, Dict]], List[Dict]]:
+        """Returns (kept, added): stored rows still valid, and chunks that need embedding."""
+        kept, added = [], []
+        for chunk in chunks:
+            rows = self.pool.get(chunk["contentHash"])
+            if rows:
+                kept.append((rows.pop(0), chunk))
+            else:
+                chunk["chromaId"] = self._chroma_id(chunk["contentHash"])
+                added.append(chunk)
+        return kept, added
+
+    def removed(self) -> list:
+        return [row for rows in self.pool.values() for row in rows]
+
+    def _chroma_id(self, content_hash: str) -> str:
+        # Deterministic (document, content hash, occurrence), so a retried job
+        # upserts over what a failed attempt wrote instead of duplicating it
+        occurrence = 0
+        while f"{self.doc_id}:{content_hash[:32]}:{occurrence}" in self.taken:
+            occurrence += 1
+        chroma_id = f"{self.doc_id}:{content_hash[:32]}:{occurrence}"
+        self.taken.add(chroma_id)
+        return chroma_id
+
+async def ingest_document_pipeline(document_id: str, progress: Optional[ProgressCallback] = None):
+    """
+    Orchestrates (re-)ingestion of an existing (pending) Document. Chunks
+    are streamed out of the content and handled INGEST_WINDOW_SIZE at a time:
+    1. Hash each chunk and match it against the stored chunks
+    2. Generate embeddings for new or changed chunks only
+    3. Upsert them into ChromaDB and the keyword index (searchable from here
+       on), renumber moved ones
+    4. Store the window's chunks in Prisma
+    Chunks that no longer appear are deleted at the end (Indexed).
+
+    Raises on failure; the caller (ingestion worker) decides whether to retry.
+    Raises DocumentDeleted, after removing the vectors this run wrote, if the
+    document is deleted mid-way (the DELETE route only sees stored rows).
+    """
+    async def report(fraction: float):
+        if progress:
+            await progress(fraction)
 
-        # 3. Embed chunks
-        texts = [c["content"] for c in chunks]
-        embeddings = await embedding_service.get_embeddings(texts)
+    doc = await get_document(document_id)
+    if not doc:
+        raise DocumentDeleted(f"Document {document_id} not found")
 
-        # 4. Store in Chroma
-        collection = get_or_create_collection(collection_id)
+    await update_document_status(doc.id, "processing")
 
-        ids = [str(uuid.uuid4()) for _ in chunks]
-        metadatas = [{"doc_id": doc.id, "org_id": org_id, "chunk_index": c["chunkIndex"]} for c in chunks]
+    content = doc.content or ""
+    # Chroma's client is blocking HTTP; keep it off the event loop (API requests, lock heartbeats)
+    collection = await asyncio.to_thread(get_or_create_collection, doc.collectionId)
+    matcher = ChunkMatcher(doc.id, await get_chunk_refs(doc.id))
+    chunks = iter_chunks(iter_text_blocks(content), metadata={"doc_id": doc.id, "org_id": doc.orgId})
 
-        collection.add(
-            ids=ids,
-            embeddings=embeddings,
-            metadatas=metadatas,
-            documents=texts
+    total = unchanged = embedded = 0
+    embed_seconds = 0.0
+    written: List[str] = [] # chromaIds this run upserted
+    try:
+        for window in iter_windows(chunks, settings.ingest_window_size):
+            # 1. Diff against what the last ingestion (or a failed attempt) stored
+            for c in window:
+                c["contentHash"] = chunk_hash(c["content"])
+            kept, added = matcher.match(window)
+            moved = [(row, c) for row, c in kept if row.chunkIndex != c["chunkIndex"]]
+
+            # 2. Embed new chunks
+            if added:
+                texts = [c["content"] for c in added]
+                started = time.perf_counter()
+                embeddings = await embedding_cache.get_embeddings(texts)
+                embed_seconds += time.perf_counter() - started
+
+                # 3. Store in Chroma, unless the document was deleted meanwhile
+                if not await document_exists(doc.id):
+                    raise DocumentDeleted(f"Document {doc.id} was deleted during ingestion")
+                written += [c["chromaId"] for c in added]
+                await asyncio.to_thread(
+                    collection.upsert,
+                    ids=[c["chromaId"] for c in added],
+                    embeddings=embeddings,
+                    metadatas=[{"doc_id": doc.id, "org_id": doc.orgId, "chunk_index": c["chunkIndex"]} for c in added],
+                    documents=texts
+                )
+                await keyword_index.add(doc.collectionId, [(c["chromaId"], doc.orgId, c["content"]) for c in added])
+            if moved:
+                await asyncio.to_thread(
+                    collection.update,
+                    ids=[row.chromaId for row, _ in moved],
+                    metadatas=[{"doc_id": doc.id, "org_id": doc.orgId, "chunk_index": c["chunkIndex"]} for _, c in moved]
+                )
+
+            # 4. Store in Prisma
+            await store_document_chunks(doc.id, added)
+            await update_chunk_indexes([{"id": row.id, "chunkIndex": c["chunkIndex"]} for row, c in moved])
+
+            total += len(window)
+            unchanged += len(kept)
+            embedded += len(added)
+            if content:
+                await report(min(0.95, (window[-1]["startIndex"] + len(window[-1]["content"])) / len(content)))
+
+        removed = matcher.removed()
+        await delete_chunks(doc.collectionId, removed)
+        await update_document_status(doc.id, "indexed", total)
+    except Exception as e:
+        # A DELETE that raced this run removed the rows it could see; vectors
+        # written after that (or whose rows were refused) would be orphaned
+        if await document_exists(doc.id):
+            raise
+        await delete_vectors(doc.collectionId, written)
+        if isinstance(e, DocumentDeleted):
+            raise
+        raise DocumentDeleted(f"Document {doc.id} was deleted during ingestion") from e
+
+    await report(1.0)
+
+    logger.info(
+        f"Doc {doc.id}: {unchanged} chunks unchanged, {embedded} new, {len(removed)} removed"
+    )
+    if embedded:
+        logger.info(
+            f"Embedded {embedded} chunks for doc {doc.id} via {embedding_service.provider} "
+            f"in {embed_seconds:.2f}s ({embedded / embed_seconds if embed_seconds else 0:.1f} chunks/s)"
         )
 
-        # 5. Store in Prisma
-        prisma_chunks = []
-        for i, c in enumerate(chunks):
-            c["chromaId"] = ids[i]
-            prisma_chunks.append(c)
-
-        await store_document_chunks(doc.id, prisma_chunks)
-        await update_document_status(doc.id, "indexed", len(chunks))
-
-        # Create IngestionJob record
-        await prisma.ingestionjob.create(data={
-            "orgId": org_id,
-            "documentId": doc.id,
-            "sourceType": source_type,
-            "status": "completed",
-            "chunksCreated": len(chunks)
-        })
-
-        return await prisma.document.find_unique(where={"id": doc.id})
-
-    except Exception as e:
-        logger.error(f"Ingestion failed for doc {doc.id}: {e}")
-        await update_document_status(doc.id, "failed", 0)
-
-        await prisma.ingestionjob.create(data={
-            "orgId": org_id,
-            "documentId": doc.id,
-            "sourceType": source_type,
-            "status": "failed",
-            "chunksCreated": 0
-        })
-        raise e
+    return await prisma.document.find_unique(where={"id": doc.id})
@@ -1,40 +1,70 @@
-from typing import Any, Dict, List
+import asyncio
+import heapq
+import time
+from itertools import chain
+from typing import Any, Dict, List, Literal
 
-from src.rag.embeddings import embedding_service
+from src.rag.embedding_cache import embedding_cache
 from src.storage.chroma import get_collection
+from src.storage.documents import count_indexed_chunks
+from src.storage.keyword_index import keyword_index
 
+# vector: Chroma similarity only; keyword: BM25 only; hybrid: both, fused by rank
+SearchMode = Literal["vector", "keyword", "hybrid"]
+
+# Reciprocal rank fusion constant (Cormack et al.); dampens the weight of top ranks
+RRF_K = 60
+# Each ranker contributes this many times n_results candidates to the fusion
+HYBRID_CANDIDATES = 4
+# Seconds a collection's keyword index is trusted after it was found complete
+KEYWORD_INDEX_CHECK_INTERVAL = 60
+
+_keyword_index_checked: Dict[str, float] = {}
 
-async def semantic_search(
-    query: str,
-    collection_id: str,
-    org_id: str,
-    n_results: int = 5,
-    min_relevance: float = 0.0
-) -> List[Dict[str, Any]]:
-    """
-    Searches for semantically similar chunks based on a text query.
-    """
-    # 1. Embed query
-    query_embeddings = await embedding_service.get_embeddings([query])
-    if not query_embeddings:
-        return []
 
-    embedding = query_embeddings[0]
+class KeywordIndexIncomplete(RuntimeError):
+    """The collection's keyword index lacks chunks Postgres has indexed (not on the shared volume, or never backfilled)."""
 
-    # 2. Query collection
+
+async def embed_query(query: str) -> List[float] | None:
+    """Embeds a query once so it can be reused across collections."""
+    query_embeddings = await embedding_cache.get_embeddings([query])
+    return query_embeddings[0] if query_embeddings else None
+
+
+def _query_collection(
+    embedding: List[float],
+    collection_id: str,
+    org_id: str,
+    n_results: int,
+) -> Dict[str, Any] | None:
+    """Blocking Chroma lookup + query (run in a worker thread)."""
     try:
         collection = get_collection(collection_id)
     except Exception:
         # Collection might not exist yet
-        return []
+        return None
 
-    results = collection.query(
+    return collection.query(
         query_embeddings=[embedding],
         n_results=n_results,
         where={"org_id": org_id}, # Filter via metadata
         include=["metadatas", "documents", "distances"]
     )
 
+
+async def search_collection(
+    embedding: List[float],
+    collection_id: str,
+    org_id: str,
+    n_results: int = 5,
+    min_relevance: float = 0.0
+) -> List[Dict[str, Any]]:
+    """
+    Searches one collection with an already computed query embedding.
+    """
+    results = await asyncio.to_thread(_query_collection, embedding, collection_id, org_id, n_results)
+
     # Extract matches
     matches = []
     if not results or not results["ids"]:
@@ -53,6 +83,7 @@ async def semantic_search(
         if similarity >= min_relevance:
             matches.append({
                 "chromaId": ids[i],
+                "collectionId": collection_id,
                 "content": documents[i],
                 "metadata": metadatas[i],
                 "relevance": similarity,
@@ -62,3 +93,185 @@ async def semantic_search(
     # Sort matches by relevance
     matches.sort(key=lambda x: x["relevance"], reverse=True)
     return matches
+
+
+def _get_chunks(collection_id: str, ids: List[str]) -> Dict[str, Dict[str, Any]]:
+    """Blocking Chroma fetch of stored chunk text/metadata by id (run in a worker thread)."""
+    try:
+        collection = get_collection(collection_id)
+    except Exception:
+        return {}
+
+    results = collection.get(ids=ids, include=["metadatas", "documents"])
+    documents = results.get("documents") or [""]*len(results["ids"])
+    metadatas = results.get("metadatas") or [{}]*len(results["ids"])
+    return {
+        chroma_id: {"content": documents[i], "metadata": metadatas[i]}
+        for i, chroma_id in enumerate(results["ids"])
+    }
+
+
+async def ensure_keyword_index(collection_id: str):
+    """
+    Raises KeywordIndexIncomplete rather than let keyword or hybrid search
+    silently miss chunks, e.g. when this process does not see the volume
+    the workers write to. A complete index is re-checked once a minute.
+    """
+    checked = _keyword_index_checked.get(collection_id)
+    if checked is not None and time.monotonic() - checked < KEYWORD_INDEX_CHECK_INTERVAL:
+        return
+    for _ in range(2):
+        # Counted again before failing: a document finishing or being deleted
+        # between the two counts can make them disagree for a moment
+        expected = await count_indexed_chunks(collection_id)
+        live = await keyword_index.live_count(collection_id)
+        if live >= expected:
+            break
+    else:
+        raise KeywordIndexIncomplete(
+            f"Keyword index for {collection_id} has {live} of {expected} indexed chunks; "
+            "check that KEYWORD_INDEX_DIR is the volume the ingestion workers write to, "
+            "or run python -m src.storage.keyword_index backfill"
+        )
+    _keyword_index_checked[collection_id] = time.monotonic()
+
+
+async def keyword_search(
+    query: str,
+    collection_id: str,
+    org_id: str,
+    n_results: int = 5
+) -> List[Dict[str, Any]]:
+    """
+    BM25 search over the collection's keyword index (exact names, SKUs, handles).
+    """
+    await ensure_keyword_index(collection_id)
+    hits = await keyword_index.search(collection_id, query, org_id, n_results)
+    if not hits:
+        return []
+
+    chunks = await asyncio.to_thread(_get_chunks, collection_id, [chroma_id for chroma_id, _ in hits])
+    return [
+        {
+            "chromaId": chroma_id,
+            "collectionId": collection_id,
+            **chunks[chroma_id],
+            "relevance": score,
+            "keywordScore": score
+        }
+        for chroma_id, score in hits
+        if chroma_id in chunks # Index can briefly trail a Chroma delete
+    ]
+
+
+def reciprocal_rank_fusion(rankings: List[List[str]], k: int = RRF_K) -> Dict[str, float]:
+    """Sum of 1 / (k + rank) over every ranking an id appears in."""
+    scores: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, chroma_id in enumerate(ranking, start=1):
+            scores[chroma_id] = scores.get(chroma_id, 0.0) + 1.0 / (k + rank)
+    return scores
+
+
+async def hybrid_search(
+    query: str,
+    embedding: List[float],
+    collection_id: str,
+    org_id: str,
+    n_results: int = 5,
+    min_relevance: float = 0.0
+) -> List[Dict[str, Any]]:
+    """
+    Vector and BM25 rankings fused with reciprocal rank fusion.
+
+    min_relevance only filters the vector candidates; a keyword hit is an
+    exact term match and is kept on its rank. "relevance" is the fused score.
+    """
+    await ensure_keyword_index(collection_id)
+    candidates = n_results * HYBRID_CANDIDATES
+    vector, keyword = await asyncio.gather(
+        search_collection(embedding, collection_id, org_id, candidates, min_relevance),
+        keyword_index.search(collection_id, query, org_id, candidates)
+    )
+    fused = reciprocal_rank_fusion([[m["chromaId"] for m in vector], [chroma_id for chroma_id, _ in keyword]])
+    top = heapq.nlargest(n_results, fused, key=fused.get)
+
+    by_id = {m["chromaId"]: m for m in vector}
+    vector_relevance = {m["chromaId"]: m["relevance"] for m in vector}
+    keyword_scores = dict(keyword)
+    missing = [chroma_id for chroma_id in top if chroma_id not in by_id]
+    if missing:
+        by_id.update({
+            chroma_id: {"chromaId": chroma_id, "collectionId": collection_id, **chunk}
+            for chroma_id, chunk in (await asyncio.to_thread(_get_chunks, collection_id, missing)).items()
+        })
+
+    matches = []
+    for chroma_id in top:
+        if chroma_id not in by_id:
+            continue
+        matches.append({
+            **by_id[chroma_id],
+            "relevance": fused[chroma_id],
+            "vectorRelevance": vector_relevance.get(chroma_id),
+            "keywordScore": keyword_scores.get(chroma_id)
+        })
+    return matches
+
+
+async def _search(
+    mode: SearchMode,
+    query: str,
+    embedding: List[float] | None,
+    collection_id: str,
+    org_id: str,
+    n_results: int,
+    min_relevance: float
+) -> List[Dict[str, Any]]:
+    if mode == "keyword":
+        return await keyword_search(query, collection_id, org_id, n_results)
+    if embedding is None:
+        return []
+    if mode == "hybrid":
+        return await hybrid_search(query, embedding, collection_id, org_id, n_results, min_relevance)
+    return await search_collection(embedding, collection_id, org_id, n_results, min_relevance)
+
+
+async def semantic_search(
+    query: str,
+    collection_id: str,
+    org_id: str,
+    n_results: int = 5,
+    min_relevance: float = 0.0,
+    mode: SearchMode = "vector"
+) -> List[Dict[str, Any]]:
+    """
+    Searches for chunks matching a text query (by similarity, keywords or both).
+    """
+    embedding = await embed_query(query) if mode != "keyword" else None
+    return await _search(mode, query, embedding, collection_id, org_id, n_results, min_relevance)
+
+
+async def multi_collection_search(
+    query: str,
+    collection_ids: List[str],
+    org_id: str,
+    n_results: int = 5,
+    min_relevance: float = 0.0,
+    mode: SearchMode = "vector"
+) -> List[Dict[str, Any]]:
+    """
+    Searches several collections with one query embedding.
+
+    Collections are queried concurrently, so latency is one embedding plus
+    the slowest collection; the best n_results across all of them are kept.
+    """
+    if not collection_ids:
+        return []
+    embedding = await embed_query(query) if mode != "keyword" else None
+
+    per_collection = await asyncio.gather(*(
+        _search(mode, query, embedding, collection_id, org_id, n_results, min_relevance)
+        for collection_id in dict.fromkeys(collection_ids)
+    ))
+    return heapq.nlargest(n_results, chain.from_iterable(per_collection), key=lambda x: x["relevance"])
@@ -1,8 +1,17 @@
-from typing import List, Optional
+import asyncio
+from typing import AsyncIterator, List, NamedTuple, Optional, Tuple
 
 from src.main import prisma
 
 
+class ChunkRef(NamedTuple):
+    """A stored chunk without its text: all re-ingestion needs to diff and clean up."""
+    id: str
+    chunkIndex: int
+    contentHash: str
+    chromaId: str
+
+
 async def create_document(
     org_id: str,
     title: str,
@@ -29,12 +38,51 @@ async def create_document(
     )
 
 async def get_document(doc_id: str):
-    """Retrieves a document by ID including its chunks."""
-    return await prisma.document.find_unique(
-        where={"id": doc_id},
-        include={"chunks": True}
+    """Retrieves a document by ID (without its chunks)."""
+    return await prisma.document.find_unique(where={"id": doc_id})
+
+async def get_chunk_refs(doc_id: str) -> List[ChunkRef]:
+    """A document's stored chunks, minus their content (Prisma Python cannot select fields)."""
+    rows = await prisma.query_raw(
+        'SELECT "id", "chunkIndex", "contentHash", "chromaId" FROM "DocumentChunk" WHERE "documentId" = $1',
+        doc_id
+    )
+    return [ChunkRef(**row) for row in rows]
+
+async def list_document_collections() -> List[str]:
+    """Every collection that holds at least one document."""
+    rows = await prisma.query_raw('SELECT DISTINCT "collectionId" FROM "Document"')
+    return [row["collectionId"] for row in rows]
+
+async def count_indexed_chunks(collection_id: str) -> int:
+    """Chunks of a collection's fully indexed documents."""
+    return await prisma.documentchunk.count(
+        where={"document": {"is": {"collectionId": collection_id, "status": "indexed"}}}
     )
 
+async def iter_collection_chunks(
+    collection_id: str,
+    window: int,
+    indexed_only: bool = False
+) -> AsyncIterator[List[Tuple[str, str, str]]]:
+    """(chromaId, orgId, content) of a collection's stored chunks, window rows at a time."""
+    status = """AND d."status" = 'indexed' """ if indexed_only else ""
+    last = ""
+    while True:
+        rows = await prisma.query_raw(
+            'SELECT c."id", c."chromaId", c."content", d."orgId" FROM "DocumentChunk" c '
+            'JOIN "Document" d ON d."id" = c."documentId" '
+            f'WHERE d."collectionId" = $1 {status}AND c."id" > $2 ORDER BY c."id" LIMIT $3',
+            collection_id, last, window
+        )
+        if not rows:
+            return
+        yield [(row["chromaId"], row["orgId"], row["content"]) for row in rows if row["chromaId"]]
+        last = rows[-1]["id"]
+
+async def document_exists(doc_id: str) -> bool:
+    return await prisma.document.count(where={"id": doc_id}) > 0
+
 async def update_document_status(doc_id: str, status: str, chunk_count: int = 0):
     """Updates document ingestion pipeline status."""
     return await prisma.document.update(
@@ -48,14 +96,17 @@ async def update_document_status(doc_id: str, status: str, chunk_count: int = 0)
 async def store_document_chunks(doc_id: str, chunks_data: List[dict]):
     """Stores multiple chunks in the DocumentChunk table."""
     # chunks_data is expected to be a list of dicts:
-    # {"chunkIndex": int, "content": str, "tokenCount": int, "chromaId": str}
+    # {"chunkIndex": int, "content": str, "tokenCount": int, "chromaId": str, "contentHash": str}
+    if not chunks_data:
+        return 0
     create_data = [
         {
             "documentId": doc_id,
             "chunkIndex": chunk["chunkIndex"],
             "content": chunk["content"],
             "tokenCount": chunk["tokenCount"],
-            "chromaId": chunk["chromaId"]
+            "chromaId": chunk["chromaId"],
+            "contentHash": chunk["contentHash"]
         }
         for chunk in chunks_data
     ]
@@ -66,6 +117,49 @@ async def store_document_chunks(doc_id: str, chunks_data: List[dict]):
         data=create_data # type: ignore
     )
 
+def _delete_from_chroma(collection_id: str, chroma_ids: List[str]):
+    """Blocking Chroma delete (run in a worker thread)."""
+    from src.storage.chroma import get_collection
+
+    try:
+        get_collection(collection_id).delete(ids=chroma_ids)
+    except Exception:
+        pass # Collection may already be gone
+
+async def delete_vectors(collection_id: str, chroma_ids: List[str]):
+    """Removes vectors from ChromaDB and their keyword index entries."""
+    from src.storage.keyword_index import keyword_index
+
+    if not chroma_ids:
+        return
+    await asyncio.to_thread(_delete_from_chroma, collection_id, chroma_ids)
+    await keyword_index.delete(collection_id, chroma_ids)
+
+async def delete_chunks(collection_id: str, chunks: list):
+    """Removes chunk rows, their vectors in ChromaDB and their keyword index entries (document row is kept)."""
+    if not chunks:
+        return
+    await delete_vectors(collection_id, [chunk.chromaId for chunk in chunks if chunk.chromaId])
+    await prisma.documentchunk.delete_many(where={"id": {"in": [chunk.id for chunk in chunks]}})
+
+async def update_chunk_indexes(moved: List[dict]):
+    """Renumbers kept chunks ({"id": str, "chunkIndex": int}) in one batch."""
+    if not moved:
+        return
+    async with prisma.batch_() as batcher:
+        for chunk in moved:
+            batcher.documentchunk.update(
+                where={"id": chunk["id"]},
+                data={"chunkIndex": chunk["chunkIndex"]}
+            )
+
+async def update_document_content(doc_id: str, content: str, title: Optional[str] = None):
+    """Replaces a document's content and marks it pending re-ingestion."""
+    data = {"content": content, "status": "pending"}
+    if title:
+        data["title"] = title
+    return await prisma.document.update(where={"id": doc_id}, data=data) # type: ignore
+
 async def delete_document(doc_id: str):
     """Deletes a document and cascades to chunks (managed by schema Cascade)."""
     return await prisma.document.delete(
@@ -90,3 +184,25 @@ async def get_context_rule_by_agent(org_id: str, agent_type: str):
             }
         )
     return rule
+
+# --- Ingestion Job Helpers ---
+async def create_ingestion_job(org_id: str, document_id: str, source_type: str):
+    """Creates a queued IngestionJob for a document."""
+    return await prisma.ingestionjob.create(
+        data={
+            "orgId": org_id,
+            "documentId": document_id,
+            "sourceType": source_type,
+            "status": "queued",
+        }
+    )
+
+async def get_ingestion_job(job_id: str):
+    return await prisma.ingestionjob.find_unique(where={"id": job_id})
+
+async def update_ingestion_job(job_id: str, **data):
+    """Updates job fields (status, progress, attempts, error, chunksCreated)."""
+    return await prisma.ingestionjob.update(
+        where={"id": job_id},
+        data=data # type: ignore
+    )
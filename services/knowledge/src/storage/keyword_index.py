@@ -0,0 +1,582 @@
+"""
+Per-collection BM25 keyword index, stored next to ChromaDB.
+
+Each collection is a directory of immutable segment files plus a MANIFEST
+listing the live segments (by sequence number) and deleted chunk ids; a
+deletion hides a chunk in every segment written at or before it.
+Ingestion appends one segment per window; deletions are applied when
+segments are merged, and the manifest keeps only the ones that still hide
+a chunk. Segments are memory-mapped, so searching reads only the postings
+of the query terms and every process (API, ingestion workers) shares the
+page cache. Writers serialize on a lock file; readers never lock and pick
+up a new MANIFEST on their next query.
+
+The directory is local disk, not a service: the API and every ingestion
+worker must mount the same KEYWORD_INDEX_DIR (one shared volume, on a
+filesystem with working flock). Searches refuse to run on a collection
+whose index holds fewer chunks than Postgres has indexed (retrieval raises
+KeywordIndexIncomplete); workers backfill missing chunks when they start,
+and `rebuild` re-indexes everything into a staging directory that is
+swapped in per collection under its lock.
+
+Segment layout (little-endian):
+    header      magic, version, n_docs, n_terms, n_postings, keys_len
+    term_hashes uint64[n_terms] sorted (blake2b of the term)
+    offsets     uint64[n_terms + 1] into the postings
+    post_docs   uint32[n_postings]
+    post_tfs    uint16[n_postings]
+    doc_lens    uint32[n_docs]
+    keys        JSON {"ids": [chromaId, ...], "orgs": [orgId, ...], "docOrgs": [int, ...]}
+"""
+import argparse
+import asyncio
+import fcntl
+import hashlib
+import json
+import logging
+import mmap
+import os
+import re
+import struct
+import threading
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from src.config import get_settings
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+MAGIC = b"BM25"
+VERSION = 1
+HEADER = struct.Struct("<4sIIIQQ")
+
+# BM25 parameters
+K1 = 1.2
+B = 0.75
+
+# Deleted chunks, as a share of all indexed chunks, that trigger merging every segment
+DELETED_MERGE_RATIO = 0.25
+
+# Words, plus identifiers joined by - _ . / @ (SKUs, handles, versions) kept whole
+_TOKEN = re.compile(r"\w+(?:[-_./@]\w+)*")
+# Collection names as Chroma allows them: alphanumeric first, so "." and ".."
+# (or the hidden staging directories) can never be joined under the root
+_SAFE_NAME = re.compile(r"[A-Za-z0-9][A-Za-z0-9._-]*")
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased terms; compound identifiers also yield their parts."""
+    tokens = []
+    for match in _TOKEN.finditer(text.lower()):
+        token = match.group()
+        tokens.append(token)
+        if not token.isalnum():
+            tokens.extend(part for part in re.split(r"[-_./@]", token) if part)
+    return tokens
+
+def term_hash(term: str) -> int:
+    return int.from_bytes(hashlib.blake2b(term.encode(), digest_size=8).digest(), "little")
+
+class Segment:
+    """One immutable, memory-mapped segment file."""
+
+    def __init__(self, path: str, seq: int):
+        self.path = path
+        self.seq = seq
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, n_docs, n_terms, n_postings, keys_len = HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"Not a keyword index segment: {path}")
+
+        offset = HEADER.size
+        def view(dtype, count):
+            nonlocal offset
+            array = np.frombuffer(self._mmap, dtype=dtype, count=count, offset=offset)
+            offset += array.nbytes
+            return array
+
+        self.n_docs = n_docs
+        self.term_hashes = view("<u8", n_terms)
+        self.offsets = view("<u8", n_terms + 1)
+        self.post_docs = view("<u4", n_postings)
+        self.post_tfs = view("<u2", n_postings)
+        self.doc_lens = view("<u4", n_docs)
+        keys = json.loads(self._mmap[offset:offset + keys_len])
+        self.ids: List[str] = keys["ids"]
+        self.orgs: List[str] = keys["orgs"]
+        self.doc_orgs = np.asarray(keys["docOrgs"], dtype=np.uint16)
+        self._positions: Optional[Dict[str, int]] = None
+
+    def postings(self, hashed: int) -> Tuple[np.ndarray, np.ndarray]:
+        i = int(np.searchsorted(self.term_hashes, hashed))
+        if i == len(self.term_hashes) or self.term_hashes[i] != hashed:
+            return self.post_docs[:0], self.post_tfs[:0]
+        start, end = int(self.offsets[i]), int(self.offsets[i + 1])
+        return self.post_docs[start:end], self.post_tfs[start:end]
+
+    @property
+    def positions(self) -> Dict[str, int]:
+        """chromaId -> doc number, built on first use (deletions only)."""
+        if self._positions is None:
+            self._positions = {chroma_id: doc for doc, chroma_id in enumerate(self.ids)}
+        return self._positions
+
+    def org_code(self, org_id: str) -> Optional[int]:
+        return self.orgs.index(org_id) if org_id in self.orgs else None
+
+def term_counts(text: str) -> Counter:
+    """{term hash: tf} for a chunk, the form segments are written from."""
+    return Counter(term_hash(term) for term in tokenize(text))
+
+def write_segment(path: str, docs: List[Tuple[str, str, Counter]]):
+    """Writes (chromaId, orgId, term_counts) docs as a segment, atomically."""
+    orgs = list(dict.fromkeys(org for _, org, _ in docs))
+    org_codes = {org: i for i, org in enumerate(orgs)}
+
+    postings: Dict[int, List[Tuple[int, int]]] = {}
+    doc_lens = np.zeros(len(docs), dtype="<u4")
+    for doc, (_, _, counts) in enumerate(docs):
+        doc_lens[doc] = sum(counts.values())
+        for hashed, tf in counts.items():
+            postings.setdefault(hashed, []).append((doc, min(tf, 65535)))
+
+    term_hashes = np.array(sorted(postings), dtype="<u8")
+    offsets = np.zeros(len(term_hashes) + 1, dtype="<u8")
+    post_docs, post_tfs = [], []
+    for i, hashed in enumerate(term_hashes.tolist()):
+        entries = postings[hashed]
+        offsets[i + 1] = offsets[i] + len(entries)
+        post_docs.extend(doc for doc, _ in entries)
+        post_tfs.extend(tf for _, tf in entries)
+
+    keys = json.dumps({
+        "ids": [chroma_id for chroma_id, _, _ in docs],
+        "orgs": orgs,
+        "docOrgs": [org_codes[org] for _, org, _ in docs],
+    }).encode()
+
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, len(docs), len(term_hashes), len(post_docs), len(keys)))
+        f.write(term_hashes.tobytes())
+        f.write(offsets.tobytes())
+        f.write(np.asarray(post_docs, dtype="<u4").tobytes())
+        f.write(np.asarray(post_tfs, dtype="<u2").tobytes())
+        f.write(doc_lens.tobytes())
+        f.write(keys)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+class CollectionIndex:
+    """Reader/writer for one collection's directory."""
+
+    def __init__(self, path: str, max_segments: int):
+        self.path = path
+        self.max_segments = max_segments
+        self.manifest_path = os.path.join(path, "MANIFEST")
+        self._signature = None
+        self._loaded: Dict[str, Segment] = {}
+        # Threads of one process share the mappings (to_thread callers)
+        self._mutex = threading.RLock()
+        # (segments, live masks, live chunk count, average chunk length), swapped whole
+        self.state: Tuple[List[Segment], List[np.ndarray], int, float] = ([], [], 0, 0.0)
+
+    # --- Manifest ---
+    def _read_manifest(self) -> dict:
+        try:
+            with open(self.manifest_path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            # segments: [{"seq": int, "file": str}] oldest first; deleted: {chromaId: seq};
+            # rebuild: seq reserved by an unfinished rebuild (absent otherwise)
+            return {"seq": 0, "segments": [], "deleted": {}}
+
+    def _write_manifest(self, manifest: dict):
+        tmp = f"{self.manifest_path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(manifest, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.manifest_path)
+
+    @contextmanager
+    def _locked(self):
+        os.makedirs(self.path, exist_ok=True)
+        with self._mutex, open(os.path.join(self.path, "LOCK"), "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield self._read_manifest()
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _segment_file(self, seq: int) -> str:
+        # Unique per write: a merged segment reuses its newest input's seq
+        return f"seg-{seq:010d}-{uuid.uuid4().hex[:8]}.bin"
+
+    def _open(self, entry: dict) -> Segment:
+        segment = self._loaded.get(entry["file"])
+        if segment is None:
+            segment = Segment(os.path.join(self.path, entry["file"]), entry["seq"])
+            self._loaded[entry["file"]] = segment
+        return segment
+
+    # --- Reads ---
+    def refresh(self):
+        """Reloads the segment list if another process changed the MANIFEST."""
+        with self._mutex:
+            self._refresh()
+
+    def _refresh(self):
+        try:
+            stat = os.stat(self.manifest_path)
+            signature = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        except FileNotFoundError:
+            signature = None
+        if signature == self._signature:
+            return
+
+        for _ in range(3):
+            manifest = self._read_manifest()
+            try:
+                segments = [self._open(entry) for entry in manifest["segments"]]
+                break
+            except FileNotFoundError:
+                continue # Merged away since the MANIFEST was read; read the new one
+        else:
+            raise RuntimeError(f"Keyword index {self.path} keeps changing under the reader")
+        self._loaded = {os.path.basename(segment.path): segment for segment in segments}
+
+        lives = [np.ones(segment.n_docs, dtype=bool) for segment in segments]
+        for chroma_id, seq in manifest["deleted"].items():
+            for segment, live in zip(segments, lives, strict=True):
+                if segment.seq > seq:
+                    break
+                doc = segment.positions.get(chroma_id)
+                if doc is not None:
+                    live[doc] = False
+        n_live = int(sum(live.sum() for live in lives))
+        total_len = sum(int(seg.doc_lens[live].sum()) for seg, live in zip(segments, lives, strict=True))
+        self.state = (segments, lives, n_live, total_len / n_live if n_live else 0.0)
+        self._signature = signature
+
+    def live_count(self) -> int:
+        """Chunks currently searchable (every org)."""
+        self.refresh()
+        return self.state[2]
+
+    def search(self, query: str, org_id: str, n_results: int) -> List[Tuple[str, float]]:
+        """Top (chromaId, BM25 score) pairs for the org's chunks."""
+        self.refresh()
+        segments, lives, n_live, avg_len = self.state
+        terms = list(dict.fromkeys(term_hash(term) for term in tokenize(query)))
+        if not terms or not n_live:
+            return []
+
+        postings = [[segment.postings(hashed) for hashed in terms] for segment in segments]
+        # Document frequency over live chunks only, consistent with n_live
+        df = np.array([
+            sum(np.count_nonzero(live[p[i][0]]) for live, p in zip(lives, postings, strict=True))
+            for i in range(len(terms))
+        ], dtype=np.float64)
+        idf = np.log1p((n_live - df + 0.5) / (df + 0.5))
+
+        hits: List[Tuple[float, str]] = []
+        for segment, live, segment_postings in zip(segments, lives, postings, strict=True):
+            org = segment.org_code(org_id)
+            if org is None:
+                continue
+            # Work only on the postings of the query terms, never the whole segment
+            docs = np.concatenate([docs for docs, _ in segment_postings])
+            if not len(docs):
+                continue
+            tf = np.concatenate([tfs for _, tfs in segment_postings]).astype(np.float32)
+            weight = np.repeat(idf, [len(d) for d, _ in segment_postings]).astype(np.float32)
+            norm = K1 * (1 - B + B * segment.doc_lens[docs] / avg_len)
+            unique, inverse = np.unique(docs, return_inverse=True)
+            scores = np.bincount(inverse, weights=weight * tf * (K1 + 1) / (tf + norm))
+
+            keep = live[unique] & (segment.doc_orgs[unique] == org)
+            unique, scores = unique[keep], scores[keep]
+            if len(unique) > n_results:
+                top = np.argpartition(scores, -n_results)[-n_results:]
+                unique, scores = unique[top], scores[top]
+            hits.extend((float(score), segment.ids[doc]) for doc, score in zip(unique.tolist(), scores.tolist(), strict=True))
+
+        hits.sort(reverse=True)
+        return [(chroma_id, score) for score, chroma_id in hits[:n_results]]
+
+    # --- Writes ---
+    def add(self, chunks: Iterable[Tuple[str, str, str]], only_missing: bool = False) -> int:
+        """
+        Indexes (chromaId, orgId, text) chunks; re-adding an id replaces it.
+        only_missing skips ids that already have a live copy (backfill), so
+        it never overwrites what ingestion wrote meanwhile. Returns chunks written.
+        """
+        docs = [(chroma_id, org_id, term_counts(text)) for chroma_id, org_id, text in chunks]
+        if not docs:
+            return 0
+        with self._locked() as manifest:
+            seq = manifest["seq"] + 1
+            segments = [self._open(entry) for entry in manifest["segments"]]
+            if only_missing:
+                docs = [doc for doc in docs if not self._is_live(segments, manifest["deleted"], doc[0])]
+                if not docs:
+                    return 0
+            # Older copies (an earlier attempt, a re-ingest) stop counting
+            for chroma_id, _, _ in docs:
+                if any(chroma_id in segment.positions for segment in segments):
+                    manifest["deleted"][chroma_id] = seq - 1
+            entry = {"seq": seq, "file": self._segment_file(seq)}
+            write_segment(os.path.join(self.path, entry["file"]), docs)
+            manifest["seq"] = seq
+            manifest["segments"].append(entry)
+            self._merge(manifest)
+            self._write_manifest(manifest)
+        return len(docs)
+
+    @staticmethod
+    def _is_live(segments: List[Segment], deleted: Dict[str, int], chroma_id: str) -> bool:
+        hidden = deleted.get(chroma_id, -1)
+        return any(segment.seq > hidden and chroma_id in segment.positions for segment in segments)
+
+    def delete(self, chroma_ids: Iterable[str]):
+        chroma_ids = list(chroma_ids)
+        if not chroma_ids:
+            return
+        with self._locked() as manifest:
+            segments = [self._open(entry) for entry in manifest["segments"]]
+            for chroma_id in chroma_ids:
+                # Ids no segment holds need no entry, unless a pending rebuild may write them
+                if "rebuild" in manifest or any(chroma_id in segment.positions for segment in segments):
+                    manifest["deleted"][chroma_id] = manifest["seq"]
+            self._merge(manifest)
+            self._write_manifest(manifest)
+
+    # --- Rebuild ---
+    def begin_rebuild(self) -> int:
+        """
+        Reserves the seq a rebuilt copy of the collection is swapped in at.
+        Writes from here on get later seqs, so swap() can keep them.
+        """
+        with self._locked() as manifest:
+            manifest["seq"] += 1
+            manifest["rebuild"] = manifest["seq"]
+            self._write_manifest(manifest)
+            return manifest["seq"]
+
+    def swap(self, staged: "CollectionIndex", seq: int):
+        """
+        Replaces every segment older than seq with staged's segments (built
+        from Postgres after begin_rebuild returned seq). Segments and
+        deletions written since begin_rebuild are kept and still win.
+        """
+        with self._locked() as manifest:
+            if manifest.get("rebuild") != seq:
+                raise RuntimeError(f"Another rebuild of {self.path} started meanwhile")
+            old = [entry for entry in manifest["segments"] if entry["seq"] < seq]
+            newer = [entry for entry in manifest["segments"] if entry["seq"] > seq]
+
+            rebuilt = []
+            for entry in staged._read_manifest()["segments"]:
+                name = self._segment_file(seq)
+                os.replace(os.path.join(staged.path, entry["file"]), os.path.join(self.path, name))
+                rebuilt.append({"seq": seq, "file": name})
+
+            # Deletions before the rebuild only applied to the replaced segments;
+            # chunks rewritten since must hide their rebuilt copy
+            deleted = {chroma_id: at for chroma_id, at in manifest["deleted"].items() if at >= seq}
+            for entry in newer:
+                for chroma_id in self._open(entry).ids:
+                    deleted.setdefault(chroma_id, seq)
+
+            manifest["segments"] = rebuilt + newer
+            manifest["deleted"] = deleted
+            del manifest["rebuild"]
+            self._prune_deleted(manifest, [self._open(entry) for entry in manifest["segments"]])
+            for entry in old:
+                os.remove(os.path.join(self.path, entry["file"]))
+                self._loaded.pop(entry["file"], None)
+            self._merge(manifest)
+            self._write_manifest(manifest)
+
+    def _merge(self, manifest: dict):
+        """
+        Size-tiered merging: once there are more than max_segments, the
+        newest segments are merged with older ones no bigger than them, so
+        each chunk is rewritten O(log n) times. Once deletions pass
+        DELETED_MERGE_RATIO of the indexed chunks everything is merged, so
+        deleted chunks never pile up. While a rebuild is pending, segments
+        it will replace are left alone.
+        """
+        entries = manifest["segments"]
+        floor = 0
+        if "rebuild" in manifest:
+            floor = next((i for i, entry in enumerate(entries) if entry["seq"] > manifest["rebuild"]), len(entries))
+        if floor == len(entries):
+            return
+        segments = [self._open(entry) for entry in entries]
+        # Not while a rebuild is pending: its deletions cannot be pruned until it swaps in
+        full = "rebuild" not in manifest and (
+            len(manifest["deleted"]) > DELETED_MERGE_RATIO * sum(segment.n_docs for segment in segments)
+        )
+        if not full and len(entries) - floor <= self.max_segments:
+            return
+        start = len(segments) - 1
+        total = segments[start].n_docs
+        while start > floor and (full or segments[start - 1].n_docs <= total or start == len(segments) - 1):
+            start -= 1
+            total += segments[start].n_docs
+
+        deleted = manifest["deleted"]
+        docs = []
+        for segment in segments[start:]:
+            hashes_by_doc = self._doc_terms(segment)
+            for doc, chroma_id in enumerate(segment.ids):
+                if deleted.get(chroma_id, -1) >= segment.seq:
+                    continue
+                docs.append((chroma_id, segment.orgs[segment.doc_orgs[doc]], hashes_by_doc[doc]))
+
+        merged = {"seq": segments[-1].seq, "file": self._segment_file(segments[-1].seq)}
+        write_segment(os.path.join(self.path, merged["file"]), docs)
+        for segment in segments[start:]:
+            # Readers still holding the old MANIFEST keep their mapping
+            os.remove(segment.path)
+            self._loaded.pop(os.path.basename(segment.path), None)
+
+        manifest["segments"] = entries[:start] + [merged]
+        self._prune_deleted(manifest, segments[:start] + [self._open(merged)])
+        logger.info(f"Merged {len(segments) - start} keyword index segments in {self.path} ({len(docs)} chunks)")
+
+    @staticmethod
+    def _prune_deleted(manifest: dict, segments: List[Segment]):
+        """Drops deletion entries that no longer hide a chunk in any segment."""
+        rebuild = manifest.get("rebuild")
+        manifest["deleted"] = {
+            chroma_id: seq for chroma_id, seq in manifest["deleted"].items()
+            if (rebuild is not None and seq >= rebuild)
+            or any(segment.seq <= seq and chroma_id in segment.positions for segment in segments)
+        }
+
+    @staticmethod
+    def _doc_terms(segment: Segment) -> List[Counter]:
+        """Inverts a segment back to per-chunk {term hash: tf} counts."""
+        counts: List[Counter] = [Counter() for _ in range(segment.n_docs)]
+        offsets = segment.offsets.tolist()
+        docs = segment.post_docs.tolist()
+        tfs = segment.post_tfs.tolist()
+        for i, hashed in enumerate(segment.term_hashes.tolist()):
+            for j in range(offsets[i], offsets[i + 1]):
+                counts[docs[j]][hashed] = tfs[j]
+        return counts
+
+class KeywordIndex:
+    """Process-wide access to every collection's BM25 index."""
+
+    def __init__(self, root: str, max_segments: int = 16):
+        self.root = root
+        self.max_segments = max_segments
+        self._collections: Dict[str, CollectionIndex] = {}
+
+    def collection(self, collection_id: str) -> CollectionIndex:
+        if not _SAFE_NAME.fullmatch(collection_id):
+            raise ValueError(f"Invalid collection name: {collection_id}")
+        if collection_id not in self._collections:
+            self._collections[collection_id] = CollectionIndex(
+                os.path.join(self.root, collection_id), self.max_segments
+            )
+        return self._collections[collection_id]
+
+    async def add(self, collection_id: str, chunks: List[Tuple[str, str, str]], only_missing: bool = False) -> int:
+        return await asyncio.to_thread(self.collection(collection_id).add, chunks, only_missing)
+
+    async def delete(self, collection_id: str, chroma_ids: List[str]):
+        await asyncio.to_thread(self.collection(collection_id).delete, chroma_ids)
+
+    async def search(self, collection_id: str, query: str, org_id: str, n_results: int) -> List[Tuple[str, float]]:
+        return await asyncio.to_thread(self.collection(collection_id).search, query, org_id, n_results)
+
+    async def live_count(self, collection_id: str) -> int:
+        return await asyncio.to_thread(self.collection(collection_id).live_count)
+
+# Singleton instance
+keyword_index = KeywordIndex(settings.keyword_index_dir, settings.keyword_index_max_segments)
+
+# Chunks read from Postgres per step by backfill and rebuild
+REBUILD_WINDOW = 1024
+
+async def backfill() -> int:
+    """
+    Indexes chunks of indexed documents that a collection's index lacks
+    (documents ingested before the keyword index existed, a lost volume).
+    Collections whose index already covers Postgres are skipped, and ids
+    with a live copy are never overwritten. Returns the chunks added.
+    """
+    from src.storage.documents import (
+        count_indexed_chunks,
+        iter_collection_chunks,
+        list_document_collections,
+    )
+
+    added = 0
+    for collection_id in await list_document_collections():
+        if not _SAFE_NAME.fullmatch(collection_id):
+            continue
+        expected = await count_indexed_chunks(collection_id)
+        if await keyword_index.live_count(collection_id) >= expected:
+            continue
+        logger.info(f"Backfilling keyword index for {collection_id} ({expected} indexed chunks)")
+        async for chunks in iter_collection_chunks(collection_id, REBUILD_WINDOW, indexed_only=True):
+            added += await keyword_index.add(collection_id, chunks, only_missing=True)
+    if added:
+        logger.info(f"Backfilled {added} chunks into the keyword index")
+    return added
+
+async def rebuild():
+    """
+    Re-indexes every collection from its stored chunks. Each collection is
+    built in a staging directory under KEYWORD_INDEX_DIR (same filesystem,
+    so files move in with a rename) and swapped in under the collection's
+    lock; searches and ingestion keep running on the old copy meanwhile.
+    """
+    import shutil
+
+    from src.storage.documents import iter_collection_chunks, list_document_collections
+
+    collections = set(await list_document_collections())
+    if os.path.isdir(keyword_index.root):
+        collections.update(os.listdir(keyword_index.root))
+    staging = os.path.join(keyword_index.root, f".rebuild-{uuid.uuid4().hex[:8]}")
+    try:
+        for collection_id in sorted(name for name in collections if _SAFE_NAME.fullmatch(name)):
+            index = keyword_index.collection(collection_id)
+            seq = await asyncio.to_thread(index.begin_rebuild)
+            staged = CollectionIndex(os.path.join(staging, collection_id), index.max_segments)
+            count = 0
+            async for chunks in iter_collection_chunks(collection_id, REBUILD_WINDOW):
+                count += await asyncio.to_thread(staged.add, chunks)
+            await asyncio.to_thread(index.swap, staged, seq)
+            logger.info(f"Rebuilt keyword index for {collection_id} ({count} chunks)")
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+
+async def _run(command: str):
+    from src.main import prisma
+
+    await prisma.connect()
+    try:
+        await (rebuild() if command == "rebuild" else backfill())
+    finally:
+        await prisma.disconnect()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Keyword (BM25) index maintenance")
+    parser.add_argument("command", choices=["backfill", "rebuild"])
+    args = parser.parse_args()
+    logging.basicConfig(level=settings.log_level)
+    asyncio.run(_run(args.command))
@@ -0,0 +1,163 @@
+"""
+Tests for the BM25 keyword index, checked against a brute-force BM25
+"""
+import json
+import math
+import os
+import random
+from collections import Counter
+
+import pytest
+
+# The index reads settings at import; no service is contacted
+os.environ.setdefault("DATABASE_URL", "postgresql://test")
+os.environ.setdefault("REDIS_URL", "redis://test")
+os.environ.setdefault("CHROMA_HOST", "localhost")
+os.environ.setdefault("CHROMA_PORT", "8000")
+
+from src.storage.keyword_index import (  # noqa: E402
+    DELETED_MERGE_RATIO,
+    K1,
+    B,
+    CollectionIndex,
+    KeywordIndex,
+    tokenize,
+)
+
+WORDS = "alpha beta gamma delta epsilon zeta eta theta iota kappa lambda SKU-4411-B @wave_bot v2.14".split()
+ORGS = ["org-a", "org-b"]
+
+
+def brute_force(docs: dict, query: str, org_id: str) -> dict:
+    """BM25 over the live chunks, the way the index defines it."""
+    counts = {chroma_id: Counter(tokenize(text)) for chroma_id, (_, text) in docs.items()}
+    n = len(docs)
+    avg_len = sum(sum(c.values()) for c in counts.values()) / n
+    scores = {}
+    for term in dict.fromkeys(tokenize(query)):
+        df = sum(1 for c in counts.values() if term in c)
+        idf = math.log1p((n - df + 0.5) / (df + 0.5))
+        for chroma_id, (org, _) in docs.items():
+            tf = counts[chroma_id][term]
+            if tf and org == org_id:
+                norm = K1 * (1 - B + B * sum(counts[chroma_id].values()) / avg_len)
+                scores[chroma_id] = scores.get(chroma_id, 0.0) + idf * tf * (K1 + 1) / (tf + norm)
+    return scores
+
+
+class TestKeywordIndex:
+    """Search results after random adds, deletes and re-adds"""
+
+    @pytest.fixture
+    def index(self, tmp_path):
+        return CollectionIndex(str(tmp_path / "collection"), max_segments=3)
+
+    def _text(self, rng: random.Random) -> str:
+        return " ".join(rng.choices(WORDS, k=rng.randint(1, 12)))
+
+    def test_matches_brute_force(self, index):
+        """Should score every live chunk exactly like brute-force BM25, whatever was deleted or merged"""
+        rng = random.Random(7)
+        docs = {}
+        next_id = 0
+        for step in range(200):
+            op = rng.random()
+            if op < 0.5 or not docs:
+                window = {}
+                for _ in range(rng.randint(1, 6)):
+                    if docs and rng.random() < 0.2:
+                        chroma_id = rng.choice(list(docs)) # Re-ingested chunk
+                    else:
+                        chroma_id, next_id = f"chunk-{next_id}", next_id + 1
+                    window[chroma_id] = (chroma_id, rng.choice(ORGS), self._text(rng))
+                window = list(window.values()) # Ingestion never writes an id twice in one window
+                index.add(window)
+                docs.update({chroma_id: (org, text) for chroma_id, org, text in window})
+            else:
+                gone = rng.sample(list(docs), min(len(docs), rng.randint(1, 4)))
+                index.delete(gone + ["never-indexed"])
+                for chroma_id in gone:
+                    del docs[chroma_id]
+
+            if step % 10 == 0 and docs:
+                assert index.live_count() == len(docs)
+                for query in ["alpha", "gamma theta", "sku-4411-b", "wave_bot kappa v2.14", "missing"]:
+                    for org_id in ORGS:
+                        expected = brute_force(docs, query, org_id)
+                        hits = dict(index.search(query, org_id, n_results=len(docs)))
+                        assert hits.keys() == expected.keys()
+                        for chroma_id, score in expected.items():
+                            assert hits[chroma_id] == pytest.approx(score, rel=1e-4)
+
+    def test_deletions_do_not_pile_up(self, index):
+        """Should keep the deletion list below DELETED_MERGE_RATIO of the indexed chunks"""
+        rng = random.Random(3)
+        live = []
+        for batch in range(60):
+            window = [(f"chunk-{batch}-{i}", "org-a", self._text(rng)) for i in range(5)]
+            index.add(window)
+            live += [chroma_id for chroma_id, _, _ in window]
+            gone = rng.sample(live, 3)
+            index.delete(gone)
+            live = [chroma_id for chroma_id in live if chroma_id not in gone]
+
+            with open(index.manifest_path) as f:
+                manifest = json.load(f)
+            indexed = sum(index._open(entry).n_docs for entry in manifest["segments"])
+            assert len(manifest["deleted"]) <= DELETED_MERGE_RATIO * indexed
+        assert index.live_count() == len(live)
+
+    def test_deleting_unknown_ids_records_nothing(self, index):
+        """Should not tombstone ids that no segment holds"""
+        index.add([("chunk-1", "org-a", "alpha beta")])
+        index.delete(["chunk-2", "chunk-3"])
+        with open(index.manifest_path) as f:
+            assert json.load(f)["deleted"] == {}
+
+    def test_rebuild_keeps_concurrent_writes(self, index, tmp_path):
+        """Should swap in a rebuilt copy without losing chunks written or deleted while it ran"""
+        rng = random.Random(11)
+        docs = {}
+        for batch in range(8):
+            window = [(f"old-{batch}-{i}", "org-a", self._text(rng)) for i in range(4)]
+            index.add(window)
+            docs.update({chroma_id: (org, text) for chroma_id, org, text in window})
+
+        seq = index.begin_rebuild()
+        snapshot = dict(docs)
+        for batch in range(5):
+            window = [(f"new-{batch}-{i}", "org-a", self._text(rng)) for i in range(4)]
+            window.append((f"old-{batch}-0", "org-a", self._text(rng))) # Re-ingested meanwhile
+            index.add(window)
+            docs.update({chroma_id: (org, text) for chroma_id, org, text in window})
+        index.delete(["old-6-1", "new-2-2"])
+        del docs["old-6-1"], docs["new-2-2"]
+
+        staged = CollectionIndex(str(tmp_path / "staging"), max_segments=3)
+        items = list(snapshot.items())
+        for i in range(0, len(items), 5):
+            staged.add([(chroma_id, org, text) for chroma_id, (org, text) in items[i:i + 5]])
+        index.swap(staged, seq)
+
+        assert index.live_count() == len(docs)
+        for query in ["alpha", "delta iota", "sku-4411-b"]:
+            expected = brute_force(docs, query, "org-a")
+            hits = dict(index.search(query, "org-a", n_results=len(docs)))
+            assert hits.keys() == expected.keys()
+            for chroma_id, score in expected.items():
+                assert hits[chroma_id] == pytest.approx(score, rel=1e-4)
+
+
+class TestCollectionNames:
+    """Collection names that map to directories under the index root"""
+
+    @pytest.mark.parametrize("name", [".", "..", ".rebuild-1", "../escape", "a/b", ""])
+    def test_rejects_names_outside_the_root(self, tmp_path, name):
+        """Should refuse names that are not a plain directory under the root"""
+        with pytest.raises(ValueError):
+            KeywordIndex(str(tmp_path)).collection(name)
+
+    def test_accepts_chroma_names(self, tmp_path):
+        """Should accept the names Chroma gives collections"""
+        index = KeywordIndex(str(tmp_path)).collection("org-a_docs.v2")
+        assert index.path == str(tmp_path / "org-a_docs.v2")